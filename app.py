@@ -12,6 +12,8 @@ Each Shiny app has two parts:
 from shiny import App, ui
 import shinyswatch
 from shiny import App, ui, render
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
 
 
 from quantity_server import get_quantity_server_functions
@@ -22,7 +24,13 @@ from quantity_ui_outputs import get_quantity_outputs
 from orders_server import get_orders_server_functions
 from orders_ui_inputs import get_orders_inputs
 from orders_ui_outputs import get_orders_outputs
+from records_server import get_records_server_functions
+from records_ui_inputs import get_records_inputs
+from records_ui_outputs import get_records_outputs
+from util_cache import filter_cache
+from util_datasets import get_dataset_stats
 from util_logger import setup_logger
+from util_metrics import metrics_endpoint, timed
 
 logger, logname = setup_logger(__name__)
 
@@ -81,6 +89,14 @@ app_ui = ui.page_navbar(
             get_quantity_outputs(),
         ),
     ),
+
+    ui.nav(
+        "Records",
+        ui.layout_sidebar(
+            get_records_inputs(),
+            get_records_outputs(),
+        ),
+    ),
    
     ui.nav(ui.a("About", href="https://github.com/curt2023")),
     ui.nav(ui.a("GitHub", href="https://github.com/curt2023/cintel-07-final")),
@@ -88,6 +104,8 @@ app_ui = ui.page_navbar(
     ui.nav(ui.a("Examples", href="https://shinylive.io/py/examples/")),
     ui.nav(ui.a("Widgets", href="https://shiny.rstudio.com/py/docs/ipywidgets.html")),
     title=ui.h1("Hyde Labs Production Dashboard"),
+    # The Orders and Material Breakdown servers wait for their tab to be shown.
+    id="NAV_TAB",
 )
 
 
@@ -95,6 +113,7 @@ def server(input, output, session):
     """Define functions to create UI outputs."""
     @output
     @render.text
+    @timed
     def welcome_output():
         user = input.name_input()
         welcome_string = f"{user} is viewing operational reports. "
@@ -102,6 +121,7 @@ def server(input, output, session):
 
     @output
     @render.text
+    @timed
     def color_output():
         answer = input.color_input()
         count = len(answer)
@@ -111,8 +131,19 @@ def server(input, output, session):
     logger.info("Starting server...")
     get_orders_server_functions(input, output, session)
     get_quantity_server_functions(input, output, session)
+    get_records_server_functions(input, output, session)
+    logger.info(f"Dataset cache stats: {get_dataset_stats()}")
+    logger.info(f"Filter cache stats: {filter_cache.stats()}")
+
 
 
+# shiny_app = App(app_ui, server, debug=True)
+shiny_app = App(app_ui, server)
 
-# app = App(app_ui, server, debug=True)
-app = App(app_ui, server)
+# Serve Prometheus metrics at /metrics next to the Shiny app (see util_metrics.py).
+app = Starlette(
+    routes=[
+        Route("/metrics", metrics_endpoint),
+        Mount("/", app=shiny_app),
+    ]
+)
@@ -0,0 +1,27 @@
+"""
+Purpose: Measure the per-event data work at production scale.
+
+The sample workbooks hold about a hundred orders and a few thousand quantity
+rows, which is too small to show what a filter change costs. This package
+generates tables with the same columns at any size (seeded, so every run sees
+the same data) and times the steps a session repeats:
+
+    load      read the workbook and prepare it (sizes up to --load-max-rows);
+              the *_arrow variants memory-map an Arrow file instead (any size)
+    prepare   derive columns and sort (prepare_orders / prepare_quantity)
+    filter    the Orders date range and the Material Breakdown filters
+    table     cut out, sort and render one table page to HTML
+    figure    build each Plotly chart and serialize it to JSON
+
+Run from the repository root:
+
+    python -m benchmarks run                      # 10k and 1m rows
+    python -m benchmarks run --sizes 10k 1m 10m --out after.json
+    python -m benchmarks compare before.json after.json
+    python -m benchmarks generate --rows 1m --out /tmp/bench-data
+    python -m benchmarks load --sessions 1 5 10 25   # see benchmarks/load.py
+
+Results are written as JSON (benchmarks/results/<commit>.json by default) so
+two commits can be compared.
+
+"""
@@ -0,0 +1,96 @@
+"""
+Purpose: Command line for the benchmark suite (see benchmarks/__init__.py).
+
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.bench import (
+    BENCHMARKS,
+    LOAD_MAX_ROWS,
+    compare_results,
+    print_comparison,
+    run_benchmarks,
+    save_results,
+)
+from benchmarks.generate import DEFAULT_SEED, parse_size, write_workbooks
+from benchmarks.load import run_load_test
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run benchmarks and save JSON results")
+    run.add_argument("--sizes", nargs="+", default=["10k", "1m"],
+                     help="row counts, e.g. 10k 1m 10m")
+    run.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS),
+                     help="run just these benchmarks")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run.add_argument("--load-max-rows", type=int, default=LOAD_MAX_ROWS,
+                     help="skip the workbook load benchmarks above this size")
+    run.add_argument("--out", help="results file (default benchmarks/results/<commit>.json)")
+
+    compare = commands.add_parser("compare", help="compare two results files")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.add_argument("--threshold", type=float, default=0.10,
+                         help="relative change reported as slower/faster")
+    compare.add_argument("--fail-on-regression", action="store_true",
+                         help="exit 1 if anything got slower")
+
+    generate = commands.add_parser("generate", help="write generated workbooks")
+    generate.add_argument("--rows", default="10k")
+    generate.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    generate.add_argument("--out", required=True, help="folder to write into")
+
+    load = commands.add_parser("load", help="concurrent websocket sessions")
+    load.add_argument("--sessions", nargs="+", type=int, default=[1, 5, 10, 25],
+                      help="session counts to try, one fresh server each")
+    load.add_argument("--actions", type=int, default=20, help="actions per session")
+    load.add_argument("--think", type=float, default=0.5,
+                      help="max pause between actions, seconds")
+    load.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    load.add_argument("--port", type=int, default=8765)
+    load.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE",
+                      help="environment for the server, e.g. CINTEL_FILTER_DELAY_SECONDS=0")
+    load.add_argument("--workers", type=int, default=1,
+                      help="serve with util_workers.py and this many workers")
+    load.add_argument("--out", help="write the results as JSON")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        document = run_benchmarks(
+            args.sizes, args.only, args.repeat, args.seed, args.load_max_rows
+        )
+        print(f"Results written to {save_results(document, args.out)}")
+    elif args.command == "compare":
+        with open(args.before) as file:
+            before = json.load(file)
+        with open(args.after) as file:
+            after = json.load(file)
+        rows = compare_results(before, after, args.threshold)
+        print_comparison(rows, before, after)
+        if args.fail_on_regression and any(row[5] == "slower" for row in rows):
+            return 1
+    elif args.command == "load":
+        env = dict(item.split("=", 1) for item in args.env)
+        document = run_load_test(
+            args.sessions, args.actions, args.think, args.seed, args.port, env,
+            args.workers,
+        )
+        if args.out:
+            with open(args.out, "w") as file:
+                json.dump(document, file, indent=2)
+            print(f"Results written to {args.out}")
+    elif args.command == "generate":
+        for path in write_workbooks(parse_size(args.rows), args.out, args.seed):
+            print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
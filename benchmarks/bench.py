@@ -0,0 +1,404 @@
+"""
+Purpose: Time the app's data steps on generated tables and compare runs.
+
+Each benchmark is a function that takes the prepared context for one size and
+returns the callable to time. Setup (generating data, writing workbooks,
+building inputs) is never part of the timing. Every callable runs up to
+--repeat times, stopping early once it has used TIME_BUDGET_SECONDS, and the
+min, median and mean are recorded.
+
+"""
+import datetime
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import (
+    DEFAULT_SEED,
+    generate_orders,
+    generate_quantity,
+    parse_size,
+    write_workbooks,
+)
+from orders_ui_inputs import DEFAULT_DATE_RANGE
+from quantity_server import QUANTITY_MATERIALS
+from quantity_ui_inputs import DEFAULT_QUANTITY_MAX, DEFAULT_TIME_RANGE
+from util_tables import DEFAULT_PAGE_SIZE, render_page_html
+
+RESULTS_FOLDER = pathlib.Path(__file__).parent.joinpath("results")
+TIME_BUDGET_SECONDS = 10.0
+LOAD_MAX_ROWS = 100_000
+
+# The inputs a session starts with come from the UI modules, so the benchmarks
+# always time what the app renders (see *_ui_inputs.py and util_tables.py).
+PAGE_SIZE = int(DEFAULT_PAGE_SIZE)
+DEFAULT_QUANTITY_INPUTS = (*DEFAULT_TIME_RANGE, DEFAULT_QUANTITY_MAX, QUANTITY_MATERIALS)
+
+BENCHMARKS = {}
+
+
+def benchmark(fn):
+    """Register a benchmark under its function name."""
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def build_context(rows, seed=DEFAULT_SEED, load_max_rows=LOAD_MAX_ROWS, folder=None):
+    """Generate and prepare everything the benchmarks need for one size."""
+    from orders_server import get_date_bounds, prepare_orders
+    from quantity_server import build_quantity_filters, prepare_quantity, select_quantity_rows
+    from util_filters import FilteredView
+
+    context = {"rows": rows}
+    context["orders_raw"] = generate_orders(rows, seed)
+    context["quantity_raw"] = generate_quantity(rows, seed)
+    context["orders"] = prepare_orders(context["orders_raw"])
+    context["quantity"] = prepare_quantity(context["quantity_raw"])
+    context["quantity_filters"] = build_quantity_filters(context["quantity"])
+
+    # Views of the shared frames, as the sessions keep them (util_filters.FilteredView).
+    lo, hi = get_date_bounds(context["orders"], *DEFAULT_DATE_RANGE)
+    context["orders_filtered"] = FilteredView(context["orders"], slice(lo, hi))
+    context["quantity_filtered"] = FilteredView(
+        context["quantity"],
+        select_quantity_rows(context["quantity_filters"], *DEFAULT_QUANTITY_INPUTS),
+    )
+
+    # Excel holds about a million rows at most, and writing that many takes minutes.
+    if folder is not None and rows <= load_max_rows:
+        context["workbooks"] = write_workbooks(rows, folder, seed)
+    if folder is not None:
+        context["arrow_files"] = write_arrow_files(context, folder)
+    return context
+
+
+def write_arrow_files(context, folder):
+    """Write the raw tables as Arrow files, like data/app_data.py does."""
+    import pyarrow as pa
+
+    paths = []
+    for name in ("orders", "quantity"):
+        path = pathlib.Path(folder, f"{name}.arrow")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df = context[f"{name}_raw"].drop(columns=["Unnamed: 0"])
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        paths.append(path)
+    return paths
+
+
+@benchmark
+def load_orders(context):
+    from orders_server import prepare_orders
+
+    if "workbooks" not in context:
+        return None
+    path = context["workbooks"][0]
+    return lambda: prepare_orders(pd.read_excel(path))
+
+
+@benchmark
+def load_quantity(context):
+    from quantity_server import prepare_quantity
+
+    if "workbooks" not in context:
+        return None
+    path = context["workbooks"][1]
+    return lambda: prepare_quantity(pd.read_excel(path))
+
+
+@benchmark
+def load_orders_arrow(context):
+    from orders_server import ORDERS_COLUMNS, prepare_orders
+    from util_datasets import read_data_file
+
+    if "arrow_files" not in context:
+        return None
+    path = context["arrow_files"][0]
+    return lambda: prepare_orders(read_data_file(path, ORDERS_COLUMNS))
+
+
+@benchmark
+def load_quantity_arrow(context):
+    from quantity_server import QUANTITY_COLUMNS, prepare_quantity
+    from util_datasets import read_data_file
+
+    if "arrow_files" not in context:
+        return None
+    path = context["arrow_files"][1]
+    return lambda: prepare_quantity(read_data_file(path, QUANTITY_COLUMNS))
+
+
+@benchmark
+def prepare_orders(context):
+    from orders_server import prepare_orders
+
+    return lambda: prepare_orders(context["orders_raw"])
+
+
+@benchmark
+def filter_orders(context):
+    from orders_server import get_date_bounds
+    from util_filters import FilteredView
+
+    def select():
+        lo, hi = get_date_bounds(context["orders"], *DEFAULT_DATE_RANGE)
+        return FilteredView(context["orders"], slice(lo, hi))
+
+    return select
+
+
+@benchmark
+def filter_quantity_index(context):
+    from quantity_server import build_quantity_filters
+
+    return lambda: build_quantity_filters(context["quantity"])
+
+
+@benchmark
+def filter_quantity(context):
+    from quantity_server import select_quantity_rows
+    from util_filters import FilteredView
+
+    filters = context["quantity_filters"]
+    return lambda: FilteredView(
+        context["quantity"], select_quantity_rows(filters, *DEFAULT_QUANTITY_INPUTS)
+    )
+
+
+@benchmark
+def rollup_orders(context):
+    from util_rollups import OrdersCube
+
+    cube = OrdersCube.from_frame(context["orders"])
+
+    def query():
+        cube.kpis(*DEFAULT_DATE_RANGE)
+        return cube.by_year_and_department(*DEFAULT_DATE_RANGE)
+
+    return query
+
+
+@benchmark
+def rollup_quantity(context):
+    from util_rollups import QuantityCube
+
+    cube = QuantityCube.from_frame(context["quantity"])
+
+    def query():
+        cube.kpis(*DEFAULT_TIME_RANGE, QUANTITY_MATERIALS)
+        return cube.by_size_and_material(*DEFAULT_TIME_RANGE, QUANTITY_MATERIALS)
+
+    return query
+
+
+@benchmark
+def trend_orders_append(context):
+    from util_analytics import OrdersTrend
+
+    trend = OrdersTrend.from_frame(context["orders"])
+    # More rows for the newest month, as when orders stream in.
+    row = context["orders"].tail(1)
+    return lambda: trend.with_rows(row)
+
+
+@benchmark
+def trend_orders_query(context):
+    from util_analytics import OrdersTrend
+
+    trend = OrdersTrend.from_frame(context["orders"])
+
+    def query():
+        trend.seasonality(*DEFAULT_DATE_RANGE)
+        return trend.frame(*DEFAULT_DATE_RANGE)
+
+    return query
+
+
+@benchmark
+def table_orders_page(context):
+    from util_tables import get_page
+
+    def render():
+        page_df, _, _ = get_page(context["orders_filtered"], 1, PAGE_SIZE)
+        return render_page_html(page_df.drop(columns=["Date"]))
+
+    return render
+
+
+@benchmark
+def table_orders_sorted(context):
+    from util_tables import get_page
+
+    def render():
+        page_df, _, _ = get_page(
+            context["orders_filtered"], 1, PAGE_SIZE, "Number of Orders", True
+        )
+        return render_page_html(page_df.drop(columns=["Date"]))
+
+    return render
+
+
+@benchmark
+def table_quantity_sorted(context):
+    from util_tables import get_page
+
+    def render():
+        page_df, _, _ = get_page(
+            context["quantity_filtered"], 1, PAGE_SIZE, "order_size_units", False
+        )
+        return render_page_html(page_df)
+
+    return render
+
+
+@benchmark
+def figure_orders(context):
+    from orders_server import build_orders_traces
+    from util_charts import create_figure_widget, update_figure
+
+    # One widget per chart for the session, patched on every change (as in the app).
+    scatter = create_figure_widget(x="Year", y="Number of Orders", legend_title="Month")
+    line = create_figure_widget(x="year-mon", y="Number of Orders")
+
+    def update():
+        (traces, dropped), (line_traces, line_dropped) = build_orders_traces(
+            context["orders_filtered"]
+        )
+        update_figure(scatter, traces, "Orders Scatter Chart (Plotly)", dropped)
+        update_figure(line, line_traces, "Orders Line Chart (Plotly)", line_dropped)
+        return scatter.to_plotly_json(), line.to_plotly_json()
+
+    return update
+
+
+@benchmark
+def figure_quantity(context):
+    from quantity_server import build_quantity_traces
+    from util_charts import create_figure_widget, update_figure
+
+    widget = create_figure_widget(
+        x="order_size_units", y="time_to_complete_hrs", legend_title="material"
+    )
+
+    def update():
+        traces, dropped = build_quantity_traces(context["quantity_filtered"])
+        update_figure(widget, traces, "Quantity Plot (Plotly)", dropped)
+        return widget.to_plotly_json()
+
+    return update
+
+
+def time_callable(fn, repeat, budget=TIME_BUDGET_SECONDS):
+    """Return the list of run times in seconds (at least one run)."""
+    timings = []
+    spent = 0.0
+    while len(timings) < repeat and (not timings or spent < budget):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+    return timings
+
+
+def get_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(sizes, names=None, repeat=5, seed=DEFAULT_SEED,
+                   load_max_rows=LOAD_MAX_ROWS, echo=print):
+    """Run the selected benchmarks at each size and return the results document."""
+    names = names or list(BENCHMARKS)
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            rows = parse_size(size)
+            context = build_context(rows, seed, load_max_rows, pathlib.Path(folder, size))
+            for name in names:
+                fn = BENCHMARKS[name](context)
+                if fn is None:
+                    continue
+                timings = time_callable(fn, repeat)
+                result = {
+                    "benchmark": name,
+                    "size": size,
+                    "rows": rows,
+                    "runs": len(timings),
+                    "min": min(timings),
+                    "median": statistics.median(timings),
+                    "mean": statistics.fmean(timings),
+                }
+                results.append(result)
+                echo(f"{name:<24} {size:>5}  median {result['median'] * 1000:10.2f} ms"
+                     f"  ({result['runs']} runs)")
+    return {
+        "commit": get_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def save_results(document, path=None):
+    """Write a results document; by default to benchmarks/results/<commit>.json."""
+    if path is None:
+        RESULTS_FOLDER.mkdir(exist_ok=True)
+        path = RESULTS_FOLDER.joinpath(f"{document['commit']}.json")
+    path = pathlib.Path(path)
+    path.write_text(json.dumps(document, indent=2))
+    return path
+
+
+def compare_results(before, after, threshold=0.10):
+    """Return rows of (benchmark, size, before s, after s, ratio, status).
+    A benchmark regresses when its median grows by more than threshold.
+    """
+    old = {(r["benchmark"], r["size"]): r for r in before["results"]}
+    rows = []
+    for result in after["results"]:
+        previous = old.get((result["benchmark"], result["size"]))
+        if previous is None:
+            continue
+        ratio = result["median"] / previous["median"] if previous["median"] else 1.0
+        if ratio > 1 + threshold:
+            status = "slower"
+        elif ratio < 1 - threshold:
+            status = "faster"
+        else:
+            status = ""
+        rows.append(
+            (result["benchmark"], result["size"], previous["median"],
+             result["median"], ratio, status)
+        )
+    return rows
+
+
+def print_comparison(rows, before, after):
+    print(f"before: {before['commit']} ({before['created']})")
+    print(f"after:  {after['commit']} ({after['created']})")
+    print(f"{'benchmark':<24} {'size':>5} {'before ms':>11} {'after ms':>11} {'ratio':>7}")
+    for name, size, old, new, ratio, status in rows:
+        print(f"{name:<24} {size:>5} {old * 1000:11.2f} {new * 1000:11.2f} "
+              f"{ratio:7.2f} {status}")
@@ -0,0 +1,80 @@
+"""
+Purpose: Generate orders and quantity tables with the production schema.
+
+The columns and value ranges match data/orders.xlsx and data/quantity.xlsx,
+including the leftover "Unnamed: 0" index column, so the frames can go
+through the app's prepare functions unchanged. The same seed always gives the
+same rows.
+
+"""
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+DEFAULT_SEED = 2023
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+          "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+DEPARTMENTS = ["EUCS", "Aerobes", "Anaerobes", "Fungal"]
+MATERIALS = ["MedicineA", "MedicineB", "MedicineC"]
+FIRST_YEAR = 2015
+LAST_YEAR = 2023
+
+
+def parse_size(size):
+    """Return a row count for "10k", "1m", "10m" or a plain number."""
+    size = str(size).lower()
+    if size in SIZES:
+        return SIZES[size]
+    return int(size.replace("_", ""))
+
+
+def generate_orders(rows, seed=DEFAULT_SEED):
+    """Return a frame like orders.xlsx: Year, Month, Department, Number of Orders."""
+    rng = np.random.default_rng(seed)
+    month_count = (LAST_YEAR - FIRST_YEAR + 1) * 12
+    # Spread the rows evenly over the months, in date order like the workbook.
+    month_index = np.sort(rng.integers(0, month_count, rows))
+    return pd.DataFrame(
+        {
+            "Unnamed: 0": np.arange(rows),
+            "Year": FIRST_YEAR + month_index // 12,
+            "Month": np.array(MONTHS, dtype=object)[month_index % 12],
+            "Department": np.array(DEPARTMENTS, dtype=object)[
+                rng.integers(0, len(DEPARTMENTS), rows)
+            ],
+            "Number of Orders": rng.integers(1, 70, rows),
+        }
+    )
+
+
+def generate_quantity(rows, seed=DEFAULT_SEED):
+    """Return a frame like quantity.xlsx: material, time_to_complete_hrs, order_size_units."""
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame(
+        {
+            "Unnamed: 0": np.arange(rows),
+            "material": np.array(MATERIALS, dtype=object)[
+                rng.integers(0, len(MATERIALS), rows)
+            ],
+            "time_to_complete_hrs": rng.integers(1, 11, rows),
+            "order_size_units": rng.integers(10_000, 95_000, rows),
+        }
+    )
+
+
+def write_workbooks(rows, folder, seed=DEFAULT_SEED):
+    """Write orders.xlsx and quantity.xlsx with the given row count into folder.
+    @returns: the paths written.
+    """
+    folder = pathlib.Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, generate in (("orders", generate_orders), ("quantity", generate_quantity)):
+        path = folder.joinpath(f"{name}.xlsx")
+        generate(rows, seed).drop(columns=["Unnamed: 0"]).to_excel(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,382 @@
+"""
+Purpose: Find out how many operators one app process can serve.
+
+Starts app.py under uvicorn on localhost, then for each session count N opens N
+simulated browser sessions over the Shiny websocket. Each session replays a
+seeded sequence of what operators do: changing the Orders date range, dragging
+the time slider (several updates in quick succession), toggling material
+checkboxes, paging tables and switching tabs.
+
+For each N it reports:
+
+    p50/p95/p99 output latency  time from sending an input to each output it
+                                changes arriving (debounce delay included)
+    sessions/sec                how fast N sessions got their first render
+    actions/sec                 completed input actions across all sessions
+    RSS per session             (peak RSS - idle RSS after warm-up) / N
+
+With --workers N the app is served by util_workers.py instead: N worker
+processes behind its proxy. Memory is then the proportional set size (PSS)
+summed over the parent and workers, so pages shared between processes (the
+shared datasets, libraries) are counted once rather than once per worker.
+Every simulated session comes from 127.0.0.1, so each one sends an
+X-Forwarded-For address of its own to be spread over the workers.
+
+A fresh server is started for every N, so one level's memory doesn't carry
+over into the next. Run from the repository root:
+
+    python -m benchmarks load --sessions 1 5 10 25 --actions 20
+    python -m benchmarks load --sessions 10 --env CINTEL_FILTER_DELAY_SECONDS=0
+    python -m benchmarks load --sessions 25 --workers 4
+
+"""
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.bench import get_commit
+from orders_ui_inputs import DEFAULT_DATE_RANGE
+from quantity_ui_inputs import DEFAULT_QUANTITY_MAX, DEFAULT_TIME_RANGE
+from util_exports import EXPORT_FORMATS
+from util_tables import DEFAULT_PAGE_SIZE
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Outputs created inside orders_charts / quantity_charts after the page loads.
+DYNAMIC_OUTPUTS = [
+    "orders_output_widget1",
+    "orders_output_widget2",
+    "orders_output_widget3",
+    "orders_output_widget4",
+    "quantity_output_widget1",
+    "quantity_output_widget2",
+]
+
+TAB_FOR_PREFIX = {"ORDERS": "Orders", "QUANTITY": "Material Breakdown", "RECORDS": "Records"}
+
+# A column each table can be sorted by (see the *_ui_outputs.py modules).
+SORT_COLUMN_FOR_PREFIX = {
+    "ORDERS": "Number of Orders",
+    "QUANTITY": "order_size_units",
+    "RECORDS": "Errors",
+}
+
+
+def get_table_inputs(prefix):
+    """The page, sort and export inputs of one tab's table, at their defaults."""
+    return {
+        f"{prefix}_TABLE_PAGE": 1,
+        f"{prefix}_TABLE_PAGE_SIZE": DEFAULT_PAGE_SIZE,
+        f"{prefix}_TABLE_SORT": "",
+        f"{prefix}_TABLE_DESC": False,
+        f"{prefix}_EXPORT_FORMAT": next(iter(EXPORT_FORMATS)),
+    }
+
+
+# The inputs a browser sends when the page first loads, taken from the defaults
+# the UI modules use (*_ui_inputs.py, util_tables, util_exports).
+INITIAL_INPUTS = {
+    "NAV_TAB": "Orders",
+    "ORDERS_DATE_RANGE:shiny.date": [str(day) for day in DEFAULT_DATE_RANGE],
+    "TIME_RANGE": list(DEFAULT_TIME_RANGE),
+    "QUANTITY_MAX": DEFAULT_QUANTITY_MAX,
+    "MEDICINE_A": True,
+    "MEDICINE_B": True,
+    "MEDICINE_C": True,
+    "RECORDS_DEPARTMENTS": None,  # an empty multiple selectize sends null
+    "RECORDS_MATERIALS": None,
+    "RECORDS_EMPLOYEE": "",
+    "RECORDS_ERRORS_MIN": 0,
+}
+for prefix in TAB_FOR_PREFIX:
+    INITIAL_INPUTS.update(get_table_inputs(prefix))
+
+DRAG_STEP_SECONDS = 0.05
+SETTLE_SECONDS = 0.5
+ACTION_TIMEOUT_SECONDS = 30.0
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _read_proc_kib(path, field):
+    try:
+        with open(path) as file:
+            for line in file:
+                if line.startswith(field):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def get_child_pids(pid):
+    """The process IDs of all descendants of a process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as file:
+            children = [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+    return children + [grandchild for child in children for grandchild in get_child_pids(child)]
+
+
+def get_rss_bytes(pid, tree=False):
+    """Resident memory of a process, read from /proc (Linux only). With tree=True,
+    the PSS of the process and all its descendants, so shared pages count once."""
+    if not tree:
+        return _read_proc_kib(f"/proc/{pid}/status", "VmRSS:")
+    return sum(
+        _read_proc_kib(f"/proc/{each}/smaps_rollup", "Pss:")
+        for each in [pid] + get_child_pids(pid)
+    )
+
+
+# Each action returns (name, tab it needs, list of input updates to send in order).
+
+def change_date_range(rng, state):
+    start = rng.randint(2015, 2022)
+    end = rng.randint(start, 2023)
+    return "date_range", "Orders", [
+        {"ORDERS_DATE_RANGE:shiny.date": [f"{start}-01-01", f"{end}-12-31"]}
+    ]
+
+
+def drag_time_slider(rng, state):
+    low, high = state.get("TIME_RANGE", [2, 10])
+    target = rng.randint(1, 9)
+    step = 1 if target >= low else -1
+    positions = list(range(low + step, target + step, step)) or [target]
+    updates = [{"TIME_RANGE": [value, max(value, high)]} for value in positions]
+    return "slider_drag", "Material Breakdown", updates
+
+
+def toggle_material(rng, state):
+    name = rng.choice(["MEDICINE_A", "MEDICINE_B", "MEDICINE_C"])
+    return "checkbox", "Material Breakdown", [{name: not state.get(name, True)}]
+
+
+def change_page(rng, state):
+    prefix = rng.choice(list(TAB_FOR_PREFIX))
+    update = {f"{prefix}_TABLE_PAGE": rng.randint(1, 3)}
+    if rng.random() < 0.3:
+        update[f"{prefix}_TABLE_SORT"] = rng.choice(["", SORT_COLUMN_FOR_PREFIX[prefix]])
+    return "table_page", TAB_FOR_PREFIX[prefix], [update]
+
+
+ACTIONS = [change_date_range, drag_time_slider, toggle_material, change_page]
+
+
+def get_output_ids(port):
+    """Read the output IDs from the app page, plus the ones rendered later."""
+    html = urllib.request.urlopen(f"http://127.0.0.1:{port}/").read().decode()
+    ids = re.findall(r'id="([^"]+)"[^>]*class="[^"]*shiny-[a-z-]*output', html)
+    ids += re.findall(r'class="[^"]*shiny-[a-z-]*output[^"]*"[^>]*id="([^"]+)"', html)
+    return sorted(set(ids)) + DYNAMIC_OUTPUTS
+
+
+class SimulatedSession:
+    """One browser tab: sends inputs and times the outputs that come back."""
+
+    def __init__(self, port, output_ids, seed):
+        self.port = port
+        self.output_ids = output_ids
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.state = {}
+        self.latencies = []  # (output id, seconds)
+        self.actions = 0
+        self.errors = 0
+
+    async def _receive_until_quiet(self, ws, sent_at):
+        """Record the first arrival of each output until the server goes quiet."""
+        seen = set()
+        deadline = time.perf_counter() + ACTION_TIMEOUT_SECONDS
+        while time.perf_counter() < deadline:
+            try:
+                message = await asyncio.wait_for(ws.recv(), SETTLE_SECONDS)
+            except asyncio.TimeoutError:
+                break
+            now = time.perf_counter()
+            data = json.loads(message)
+            names = list(data.get("values") or {})
+            if "custom" in data:
+                names.append("widget_update")
+            if data.get("errors"):
+                self.errors += len(data["errors"])
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    self.latencies.append((name, now - sent_at))
+        return seen
+
+    async def _send(self, ws, updates):
+        sent_at = time.perf_counter()
+        for i, update in enumerate(updates):
+            if i:
+                await asyncio.sleep(DRAG_STEP_SECONDS)
+            # Latency counts from the last input of a drag, like a user would see it.
+            sent_at = time.perf_counter()
+            await ws.send(json.dumps({"method": "update", "data": update}))
+            self.state.update(update)
+        return sent_at
+
+    async def open(self, ws):
+        data = dict(INITIAL_INPUTS)
+        for output_id in self.output_ids:
+            data[f".clientdata_output_{output_id}_hidden"] = False
+        self.state.update(data)
+        sent_at = time.perf_counter()
+        await ws.send(json.dumps({"method": "init", "data": data}))
+        await self._receive_until_quiet(ws, sent_at)
+
+    async def run(self, actions, think_seconds, started):
+        import websockets
+
+        url = f"ws://127.0.0.1:{self.port}/websocket/"
+        # Pinned to a worker by this address when serving with util_workers.py.
+        headers = {"X-Forwarded-For": f"10.0.{self.seed // 256 % 256}.{self.seed % 256}"}
+        async with websockets.connect(
+            url, max_size=None, additional_headers=headers
+        ) as ws:
+            await self.open(ws)
+            started.append(time.perf_counter())
+            for _ in range(actions):
+                name, tab, updates = self.rng.choice(ACTIONS)(self.rng, self.state)
+                if self.state.get("NAV_TAB") != tab:
+                    sent_at = await self._send(ws, [{"NAV_TAB": tab}])
+                    await self._receive_until_quiet(ws, sent_at)
+                sent_at = await self._send(ws, updates)
+                await self._receive_until_quiet(ws, sent_at)
+                self.actions += 1
+                await asyncio.sleep(self.rng.uniform(0, think_seconds))
+
+
+def start_server(port, env=None, workers=1):
+    """Start app.py under uvicorn (or util_workers.py) and wait until it answers."""
+    if workers > 1:
+        command = [sys.executable, "util_workers.py", "--workers", str(workers),
+                   "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+                   "--log-level", "warning"]
+    process = subprocess.Popen(
+        command,
+        cwd=APP_FOLDER,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"app did not start on port {port}")
+
+
+async def _sample_rss(pid, tree, peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], get_rss_bytes(pid, tree))
+        await asyncio.sleep(0.2)
+
+
+async def run_level(port, server_pid, sessions, actions, think_seconds, seed, workers=1):
+    """Run one session count against a running server and return its summary."""
+    output_ids = get_output_ids(port)
+    tree = workers > 1
+
+    # Warm up: the first session loads the datasets and imports the chart code.
+    # With several workers, one session per worker.
+    await asyncio.gather(*(
+        SimulatedSession(port, output_ids, seed - i).run(2, 0, [])
+        for i in range(workers)
+    ))
+    idle_rss = get_rss_bytes(server_pid, tree)
+
+    peak = [idle_rss]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(server_pid, tree, peak, stop))
+
+    clients = [SimulatedSession(port, output_ids, seed + i + 1) for i in range(sessions)]
+    started = []
+    begin = time.perf_counter()
+    await asyncio.gather(*(c.run(actions, think_seconds, started) for c in clients))
+    elapsed = time.perf_counter() - begin
+    stop.set()
+    await sampler
+
+    latencies = [seconds for c in clients for _, seconds in c.latencies]
+    by_output = {}
+    for c in clients:
+        for name, seconds in c.latencies:
+            by_output.setdefault(name, []).append(seconds)
+    ramp_seconds = (max(started) - begin) if started else elapsed
+
+    return {
+        "sessions": sessions,
+        "workers": workers,
+        "actions": sum(c.actions for c in clients),
+        "errors": sum(c.errors for c in clients),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "sessions_per_second": sessions / ramp_seconds if ramp_seconds else 0.0,
+        "actions_per_second": sum(c.actions for c in clients) / elapsed,
+        "idle_rss_bytes": idle_rss,
+        "peak_rss_bytes": peak[0],
+        "rss_per_session_bytes": (peak[0] - idle_rss) / sessions,
+        "outputs": {
+            name: {"count": len(values), "p50": percentile(values, 50),
+                   "p95": percentile(values, 95), "mean": statistics.fmean(values)}
+            for name, values in sorted(by_output.items())
+        },
+    }
+
+
+def run_load_test(session_counts, actions=20, think_seconds=0.5, seed=2023,
+                  port=8765, env=None, workers=1, echo=print):
+    """Run every session count against a fresh server; return the results document."""
+    levels = []
+    for sessions in session_counts:
+        process = start_server(port, env, workers)
+        try:
+            level = asyncio.run(
+                run_level(port, process.pid, sessions, actions, think_seconds, seed, workers)
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        levels.append(level)
+        echo(
+            f"{sessions:>4} sessions  p50 {level['p50'] * 1000:7.1f} ms"
+            f"  p95 {level['p95'] * 1000:7.1f} ms  p99 {level['p99'] * 1000:7.1f} ms"
+            f"  {level['sessions_per_second']:6.1f} sessions/s"
+            f"  {level['actions_per_second']:6.1f} actions/s"
+            f"  {level['rss_per_session_bytes'] / 2**20:6.1f} MiB/session"
+            f"  errors {level['errors']}"
+        )
+    return {
+        "commit": get_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "actions_per_session": actions,
+        "think_seconds": think_seconds,
+        "seed": seed,
+        "workers": workers,
+        "env": env or {},
+        "levels": levels,
+    }
@@ -1,30 +1,48 @@
 """
-Purpose: Use Python to generate local data files in this folder.
+Purpose: Convert the data files in this folder to a columnar format the app can memory-map.
 
-To create data files,
-   modify the code to import the dataset in the format you want.
-   Uncomment those lines and run this script in the terminal with `python app_data.py`.
+Parsing a workbook reads every cell of every column, every time the app starts.
+This script converts each workbook (*.xlsx) and CSV file (*.csv) in this folder
+to an uncompressed Arrow IPC (Feather v2) file in data/columnar/. The app
+memory-maps those files and reads only the columns it uses (see
+util_datasets.get_source_path), so load time and memory follow the columns
+actually used, not the size of the workbook.
 
-After creating the data files, you can comment out code you don't need to re-run.
-In VS Code, you can select many lines, and use CTRL + / to comment out all of them.
+Run it after any data file changes (the deploy workflow runs it before deploying):
 
-CSV files can be easily reviewed in VS Code.
+    python data/app_data.py            convert the sources that changed
+    python data/app_data.py --force    convert every source again
+    python data/app_data.py --check    exit 1 if any conversion is missing or out of date
+    python data/app_data.py --list     show each source, its rows and columns
 
-@imports pathlib to manage directories and file paths
-@imports seaborn as sns to load datasets into Pandas DataFrames (df)
-@imports pandas as pd to write DataFrames (df) to Excel and CSV files
-@imports bokeh.sampledata to load sample datasets into Pandas DataFrames (df)
+Only sources whose content changed are converted again: data/columnar/manifest.json
+keeps a SHA-256 hash of each source with the schema and column statistics
+(nulls, min/max for numbers and dates, distinct values for text) of its
+conversion. The same metadata is stored in the schema of each Arrow file.
 
-mtcars.csv was copied from the Shiny example at:
-https://shinylive.io/py/examples/#read-local-csv
+Sources in QUERY_SOURCES (read with SQL by util_query.py rather than loaded
+into pandas) also get a Parquet copy, data/columnar/<name>.parquet, written in
+row groups with min/max statistics, so a query reads only the row groups and
+columns it needs.
 
+The workbook index column ("Unnamed: 0") is not converted.
+
+@imports pyarrow to write Arrow IPC and Parquet files
+@imports pandas as pd to read workbooks and CSV files
 
 """
 
+import argparse
+import datetime
+import hashlib
+import json
+import os
 import pathlib
-import pandas as pd
-import seaborn as sns
+import sys
 
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from util_logger import setup_logger
 
@@ -32,22 +50,207 @@ logger, logname = setup_logger(__name__)
 
 # Get a path object representing this data folder.
 data_folder = pathlib.Path(__file__).parent
+columnar_folder = data_folder.joinpath("columnar")
+manifest_path = columnar_folder.joinpath("manifest.json")
+
+SOURCE_PATTERNS = ["*.xlsx", "*.csv"]
+DROP_COLUMNS = ["Unnamed: 0"]
+TOP_VALUES = 10
+
+QUERY_SOURCES = ["records.xlsx"]
+PARQUET_ROW_GROUP_ROWS = 122_880
+
+
+def get_sources():
+    """Return the workbooks and CSV files to convert, skipping live-mode drop files."""
+    sources = []
+    for pattern in SOURCE_PATTERNS:
+        sources += [
+            path for path in data_folder.glob(pattern)
+            if not path.stem.endswith("_stream") and not path.name.startswith("~$")
+        ]
+    return sorted(sources)
+
+
+def get_output_path(source):
+    return columnar_folder.joinpath(source.stem + ".arrow")
+
+
+def get_parquet_path(source):
+    return columnar_folder.joinpath(source.stem + ".parquet")
+
+
+def get_output_paths(source):
+    """Return every file converting this source writes."""
+    paths = [get_output_path(source)]
+    if source.name in QUERY_SOURCES:
+        paths.append(get_parquet_path(source))
+    return paths
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_source(source):
+    """Read a workbook or CSV file into a DataFrame without its index column."""
+    if source.suffix == ".csv":
+        df = pd.read_csv(source)
+    else:
+        df = pd.read_excel(source)
+    return df.drop(columns=DROP_COLUMNS, errors="ignore")
+
+
+def _to_json_value(value):
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def get_column_stats(series):
+    """Return null count, and min/max (numbers, dates) or distinct values (text)."""
+    stats = {"nulls": int(series.isna().sum())}
+    values = series.dropna()
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        if len(values):
+            stats["min"] = _to_json_value(values.min())
+            stats["max"] = _to_json_value(values.max())
+    else:
+        counts = values.astype(str).value_counts()
+        stats["distinct"] = int(len(counts))
+        stats["top"] = {str(key): int(count) for key, count in counts.head(TOP_VALUES).items()}
+    return stats
+
+
+def convert(source, digest):
+    """Write the Arrow (and Parquet) files for one source and return its manifest entry."""
+    df = read_source(source)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    entry = {
+        "source": source.name,
+        "sha256": digest,
+        "output": get_output_path(source).name,
+        "rows": len(df),
+        "schema": {field.name: str(field.type) for field in table.schema},
+        "stats": {name: get_column_stats(df[name]) for name in df.columns},
+        "converted": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"cintel": json.dumps(entry).encode(),
+    })
+
+    # Write next to the target, then swap it in, so a running app never maps a half-written file.
+    output = get_output_path(source)
+    partial = output.with_suffix(".arrow.partial")
+    with pa.OSFile(str(partial), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, output)
+
+    if source.name in QUERY_SOURCES:
+        parquet = get_parquet_path(source)
+        partial = parquet.with_suffix(".parquet.partial")
+        pq.write_table(
+            table, partial, row_group_size=PARQUET_ROW_GROUP_ROWS,
+            compression="zstd", write_statistics=True,
+        )
+        os.replace(partial, parquet)
+        entry["parquet"] = parquet.name
+    return entry
+
+
+def load_manifest():
+    try:
+        with open(manifest_path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest):
+    partial = manifest_path.with_suffix(".json.partial")
+    with open(partial, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(partial, manifest_path)
+
+
+def is_current(source, digest, manifest):
+    """True if the source was converted from this exact content and the output still exists."""
+    entry = manifest.get(source.name)
+    return (
+        entry is not None
+        and entry["sha256"] == digest
+        and all(path.exists() for path in get_output_paths(source))
+    )
+
+
+def run(force=False):
+    """Convert every source that changed; return the names converted."""
+    columnar_folder.mkdir(exist_ok=True)
+    manifest = load_manifest()
+    converted = []
+    for source in get_sources():
+        digest = hash_file(source)
+        if not force and is_current(source, digest, manifest):
+            # The content is unchanged, but the app compares modification times.
+            for path in get_output_paths(source):
+                os.utime(path)
+            logger.info(f"{source.name} is unchanged")
+            continue
+        manifest[source.name] = convert(source, digest)
+        converted.append(source.name)
+        logger.info(f"Converted {source.name} ({manifest[source.name]['rows']} rows)")
+
+    # Forget sources that were removed.
+    sources = {source.name for source in get_sources()}
+    for name in [name for name in manifest if name not in sources]:
+        for path in get_output_paths(data_folder.joinpath(name)):
+            path.unlink(missing_ok=True)
+        del manifest[name]
+    save_manifest(manifest)
+    return converted
+
+
+def check():
+    """Return the names of sources whose conversion is missing or out of date."""
+    manifest = load_manifest()
+    return [
+        source.name for source in get_sources()
+        if not is_current(source, hash_file(source), manifest)
+    ]
 
-penguins_df = sns.load_dataset("penguins")
-penguins_df.to_excel(data_folder.joinpath("penguins.xlsx"))
-penguins_df.to_csv(data_folder.joinpath("penguins.csv"))
 
-mtcars_df = pd.read_csv(data_folder.joinpath("mtcars.csv"))
-mtcars_df.to_excel(data_folder.joinpath("mtcars.xlsx"))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert data files to Arrow.")
+    parser.add_argument("--force", action="store_true", help="convert every source again")
+    parser.add_argument("--check", action="store_true",
+                        help="exit 1 if any conversion is missing or out of date")
+    parser.add_argument("--list", action="store_true", help="show the converted sources")
+    args = parser.parse_args(argv)
 
-records_df = pd.read_excel(r"C:\Users\ctrog\Desktop\Records.xlsx")
-records_df.to_excel(data_folder.joinpath("records.xlsx"))
+    if args.check:
+        stale = check()
+        for name in stale:
+            print(f"Out of date: {name}")
+        return 1 if stale else 0
+    if args.list:
+        for name, entry in sorted(load_manifest().items()):
+            columns = ", ".join(f"{column}: {kind}" for column, kind in entry["schema"].items())
+            print(f"{name} -> {entry['output']}  {entry['rows']} rows  ({columns})")
+        return 0
 
-orders_df = pd.read_excel(r"C:\Users\ctrog\Desktop\Orders.xlsx")
-orders_df.to_excel(data_folder.joinpath("orders.xlsx"))
+    converted = run(force=args.force)
+    print(f"Converted {len(converted)} file(s): {', '.join(converted) or 'none changed'}")
+    return 0
 
-quantity_df = pd.read_excel(r"C:\Users\ctrog\Desktop\Quantity.xlsx")
-quantity_df.to_excel(data_folder.joinpath("quantity.xlsx"))
 
-# url="https://webpath/to/your/data.csv"
-# df=pd.read_csv(url)
+if __name__ == "__main__":
+    sys.exit(main())
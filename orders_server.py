@@ -13,110 +13,441 @@ This example uses dates - arguably the most complex UI input type.
  - This example is a good starting point - there are many examples online.
 
 """
-import pathlib
-from shiny import render, reactive
+from shiny import render, reactive, req
+import numpy as np
 import pandas as pd
 from shiny import ui
-from shinywidgets import render_widget
-import plotly.express as px
 
+from orders_ui_inputs import DEFAULT_DATE_RANGE
+from util_analytics import TREND_WINDOW_MONTHS, OrdersTrend, format_change
+from util_cache import filter_cache
+from util_charts import (
+    build_bar_traces,
+    build_line_traces,
+    build_scatter_traces,
+    build_trend_traces,
+    create_figure_widget,
+    update_figure,
+)
+from util_datasets import compact_frame
+from util_executor import OffloadedTask
+from util_exports import (
+    get_export_filename,
+    get_export_media_type,
+    iter_view_chunks,
+    stream_export,
+)
+from util_filters import FilteredView
 from util_logger import setup_logger
+from util_metrics import timed
+from util_reactive import lazy, rate_limit, tab_active
+from util_refresh import DatasetFeed
+from util_rollups import OrdersCube, get_kpi_row
+from util_snapshots import Snapshot, get_snapshot, put_snapshot
+from util_streaming import register_stream
+from util_tables import (
+    DEFAULT_TABLE_INPUTS,
+    get_page,
+    read_table_inputs,
+    register_table_pager,
+    render_page_html,
+)
 
 logger, logname = setup_logger(__name__)
 
 
-def get_orders_server_functions(input, output, session):
-    """Define functions to create UI outputs."""
+# The columns the Orders tab uses; nothing else is read from the data file.
+ORDERS_COLUMNS = ["Year", "Month", "Department", "Number of Orders"]
+
 
-    p = pathlib.Path(__file__).parent.joinpath("data").joinpath("orders.xlsx")
-    # logger.info(f"Reading data from {p}")
-    original_df = pd.read_excel(p)
+def prepare_orders(df):
+    """Add derived columns once, when the workbook is first loaded.
+    The rows come back sorted by Date so range filters can binary search it."""
+
+    # first, drop the unnamed index column (streamed rows don't have one)
+    # axis=1 means drop a column, axis=0 means drop a row
+    df = df.drop(columns=["Unnamed: 0"], errors="ignore")
 
     # create new field with year as a string and month together
-    original_df["year-mon"] = (
-        original_df["Year"].astype(str) + "-" + original_df["Month"]
+    df["year-mon"] = df["Year"].astype(str) + "-" + df["Month"]
+
+    # Parse each date string once here instead of on every filter change.
+    # Some month names carry trailing spaces in the workbook (e.g. "May ").
+    month_string = df["Month"].astype(str).str.strip()
+    df["Date"] = pd.to_datetime(
+        df["Year"].astype(str) + "-" + month_string, format="%Y-%b"
     )
-    total_count = len(original_df)
 
-    reactive_df = reactive.Value()
+    # A stable sort keeps the workbook order for rows in the same month.
+    df = df.sort_values("Date", kind="stable", ignore_index=True)
+    return compact_frame(df, category_columns=["Month", "Department", "year-mon"])
+
+
+# Live mode: rows appended to data/orders_stream.jsonl are added as they arrive.
+register_stream(
+    "orders.xlsx", prepare=prepare_orders, sort_by="Date", columns=ORDERS_COLUMNS
+)
+
+
+def get_date_bounds(df, input_min, input_max):
+    """Return (lo, hi) so that df.iloc[lo:hi] holds input_min <= Date <= input_max.
+    Requires df sorted by Date (see prepare_orders), so this is two binary
+    searches rather than a comparison against every row."""
+    dates = df["Date"].to_numpy()
+    lo = dates.searchsorted(np.datetime64(input_min), side="left")
+    hi = dates.searchsorted(np.datetime64(input_max), side="right")
+    return int(lo), int(hi)
+
+
+def build_orders_traces(view):
+    """Return the (traces, dropped) pairs for both Orders charts; runs on the executor pool.
+    Long histories are downsampled (LTTB) so the line keeps its shape."""
+    df = view.frame(["Year", "Month", "year-mon", "Number of Orders"])
+    return (
+        build_scatter_traces(df, x="Year", y="Number of Orders", color="Month"),
+        build_line_traces(df, x="year-mon", y="Number of Orders"),
+    )
+
+
+def build_orders_snapshot(df):
+    """Select the default date range, build its charts and render its first
+    table page, for every new session to reuse (see util_snapshots).
+    Runs on the executor pool."""
+    lo, hi = get_date_bounds(df, *DEFAULT_DATE_RANGE)
+    view = FilteredView(df, slice(lo, hi))
+    page_df, _, _ = get_page(view, *DEFAULT_TABLE_INPUTS)
+    return Snapshot(
+        view,
+        build_orders_traces(view),
+        render_page_html(page_df.drop(columns=["Date"])),
+    )
+
+
+# Reloading, streamed rows, the rollup, the trend and the default snapshot are done
+# once per process, then every session is told the new version (see util_refresh).
+orders_feed = DatasetFeed(
+    "orders.xlsx",
+    prepare_orders,
+    ORDERS_COLUMNS,
+    artifacts={"rollup": OrdersCube.from_frame, "trend": OrdersTrend.from_frame},
+    snapshot=lambda state: build_orders_snapshot(state.frame()),
+)
+
+
+def get_orders_server_functions(input, output, session):
+    """Define functions to create UI outputs."""
+
+    # Nothing below loads, filters or draws until the tab is first shown.
+    orders_active = tab_active(input, "Orders")
+
+    # Shared across sessions; set again when orders_feed has new data. The frame,
+    # version, rollup and trend below all come from this one DatasetState.
+    orders_state = orders_feed.subscribe(session, orders_active)
+
+    @reactive.Calc
+    def orders_data():
+        req(orders_state())
+        return orders_state().frame()
+
+    # The filtered rows, as a view of the shared frame (see util_filters.FilteredView).
+    reactive_view = reactive.Value()
+
+    # Built by the first session at the default range after each data change.
+    snapshot_job = OffloadedTask("orders_snapshot_build")
+
+    @rate_limit()
+    @reactive.Calc
+    def orders_date_range():
+        """The date range, passed on only once the user stops adjusting it."""
+        return input.ORDERS_DATE_RANGE()
 
     @reactive.Effect
-    @reactive.event(input.ORDERS_DATE_RANGE)
+    @reactive.event(orders_date_range, orders_data)
+    @timed("orders_filter")
     def _():
         """Reactive effect to update the filtered dataframe when inputs change.
         It doesn't need a name, because no one calls it directly."""
 
         # logger.info("UI inputs changed. Updating flights reactive df")
 
-        df = original_df.copy()
+        original_df = orders_data()
+        input_range = orders_date_range()
+        input_min = input_range[0]
+        input_max = input_range[1]
+        version = orders_state().version
+
+        # New sessions start at the default range: reuse its snapshot.
+        if tuple(input_range) == DEFAULT_DATE_RANGE:
+            snapshot = get_snapshot("orders.xlsx", version=version)
+            if snapshot is not None:
+                snapshot_job.cancel()
+                reactive_view.set(snapshot.view)
+                return
 
-        # first, drop the unnamed index column
-        # axis=1 means drop a column, axis=0 means drop a row
-        df = df.drop(df.columns[0], axis=1)
+            def show_snapshot(snapshot):
+                put_snapshot("orders.xlsx", version, snapshot)
+                reactive_view.set(snapshot.view)
 
-        # Create a new column using pd.to_datetime() method for filtering
-        year_string = df["Year"].astype(str)
-        month_string = df["Month"].astype(str)
-        df["Date"] = pd.to_datetime(year_string + "-" + month_string)
+            snapshot_job.submit(
+                build_orders_snapshot, original_df,
+                then=show_snapshot, key=("orders_snapshot", version),
+            )
+            return
+        snapshot_job.cancel()
 
-        # Convert datetime to just the date, no time (datetime objects have both)
-        df["Date"] = df["Date"].dt.date
+        # Sessions with the same inputs share the result through filter_cache.
+        key = ("orders.xlsx", version, str(input_min), str(input_max))
+        lo, hi = filter_cache.get_or_compute(
+            key, lambda: get_date_bounds(original_df, input_min, input_max)
+        )
+        reactive_view.set(FilteredView(original_df, slice(lo, hi), key=key))
 
-        input_range = input.ORDERS_DATE_RANGE()
-        input_min = input_range[0]
-        input_max = input_range[1]
-        df = df[(df["Date"] >= input_min) & (df["Date"] <= input_max)]
+    @reactive.Calc
+    def orders_rollup():
+        """Orders per month and department, kept up to date as rows stream in."""
+        req(orders_state())
+        return orders_state().artifacts["rollup"]
 
-        # logger.debug(f"filtered flights df: {df}")
-        reactive_df.set(df)
+    @output
+    @render.ui
+    @timed
+    def orders_kpis():
+        input_min, input_max = orders_date_range()
+        kpis = orders_rollup().kpis(input_min, input_max)
+        return get_kpi_row(
+            [
+                ("Total orders", f"{kpis['total_orders']:,}"),
+                ("Orders per month", f"{kpis['average_per_month']:,.1f}"),
+                ("Busiest month", kpis["busiest_month"] or "-"),
+                ("Top department", kpis["top_department"] or "-"),
+            ]
+        )
+
+    @reactive.Calc
+    def orders_trend():
+        """Orders per month with moving statistics, updated in place as rows stream in."""
+        req(orders_state())
+        return orders_state().artifacts["trend"]
+
+    @reactive.Calc
+    def orders_trend_frame():
+        """One row per month in the date range; no rows are touched."""
+        input_min, input_max = orders_date_range()
+        return orders_trend().frame(input_min, input_max)
+
+    @output
+    @render.ui
+    @timed
+    def orders_trend_kpis():
+        df = orders_trend_frame()
+        req(len(df))
+        latest = df.iloc[-1]
+        return get_kpi_row(
+            [
+                ("Latest month", f"{latest['Period']}: {latest['Orders']:,.0f}"),
+                (f"{TREND_WINDOW_MONTHS}-month average", f"{latest['Moving average']:,.1f}"),
+                ("Change on a year earlier",
+                 format_change(latest["YoY change"], latest["YoY %"])),
+                ("Anomalous months", f"{int(df['Anomaly'].sum())}"),
+            ]
+        )
+
+    @output
+    @render.table
+    @timed
+    def orders_seasonality_table():
+        input_min, input_max = orders_date_range()
+        return orders_trend().seasonality(input_min, input_max).round(2)
+
+    @output
+    @render.table
+    @timed
+    def orders_anomaly_table():
+        df = orders_trend_frame()
+        return df[df["Anomaly"]].drop(columns=["Anomaly"]).round(2)
 
     @output
     @render.text
+    @timed
     def orders_record_count_string():
         # logger.debug("Triggered: flights_filter_record_count_string")
-        filtered_count = len(reactive_df.get())
+        filtered_count = len(reactive_view.get())
+        total_count = len(orders_data())
         message = f"Showing {filtered_count} of {total_count} records"
         # logger.debug(f"filter message: {message}")
         return message
 
+    register_table_pager(input, "ORDERS", reactive_view)
+
+    # The filtered rows as a file, streamed in chunks (see util_exports).
+    @session.download(
+        filename=lambda: get_export_filename("orders", input.ORDERS_EXPORT_FORMAT()),
+        media_type=lambda: get_export_media_type(input.ORDERS_EXPORT_FORMAT()),
+    )
+    def orders_export():
+        chunks = iter_view_chunks(reactive_view.get(), ORDERS_COLUMNS)
+        return stream_export(chunks, input.ORDERS_EXPORT_FORMAT(), "orders_export")
+
+    @reactive.Calc
+    def orders_table_page():
+        """Sort (if asked) and cut out the page of rows the table shows."""
+        page, page_size, sort_by, descending = read_table_inputs(input, "ORDERS")
+        return get_page(reactive_view.get(), page, page_size, sort_by, descending)
+
     @output
-    @render.table
-    def orders_filtered_table():
-        filtered_df = reactive_df.get()
-        filtered_df.drop(columns=["Date"], inplace=True)
-        return filtered_df
+    @render.text
+    @timed
+    def orders_table_page_string():
+        _, page, page_count = orders_table_page()
+        return f"Page {page} of {page_count}"
 
     @output
-    @render_widget
-    def orders_output_widget1():
-        df = reactive_df.get()
-        px_plot = px.scatter(
-            df,
+    @render.ui
+    @timed
+    def orders_filtered_table():
+        snapshot = get_snapshot("orders.xlsx", reactive_view.get())
+        if snapshot is not None and read_table_inputs(input, "ORDERS") == DEFAULT_TABLE_INPUTS:
+            return ui.HTML(snapshot.table_html)
+        page_df, _, _ = orders_table_page()
+        # Date is only used for filtering; Year and Month are shown instead.
+        return ui.HTML(render_page_html(page_df.drop(columns=["Date"])))
+
+    # One widget per chart for the whole session, built when first needed;
+    # filter changes only patch the trace data (see update_figure).
+    scatter_widget = lazy(
+        lambda: create_figure_widget(
+            x="Year", y="Number of Orders", legend_title="Month"
+        )
+    )
+    line_widget = lazy(
+        lambda: create_figure_widget(
+            x="year-mon",
+            y="Number of Orders",
+            labels={"year-mon": "Year-Mon", "Number of Orders": "Orders"},
+        )
+    )
+
+    summary_widget = lazy(
+        lambda: create_figure_widget(
             x="Year",
             y="Number of Orders",
-            title="Orders Scatter Chart (Plotly Express)",
-            color="Month",
+            legend_title="Department",
+            barmode="stack",
+        )
+    )
+
+    @reactive.Effect
+    @timed("orders_summary_update")
+    def _():
+        """Redraw the summary from the rollup; no rows are touched."""
+        input_min, input_max = orders_date_range()
+        table = orders_rollup().by_year_and_department(input_min, input_max)
+        update_figure(
+            summary_widget(), build_bar_traces(table), "Orders per Year by Department"
+        )
+
+    trend_widget = lazy(
+        lambda: create_figure_widget(
+            x="Period",
+            y="Orders",
+            labels={"Period": "Month", "Orders": "Orders per Month"},
+        )
+    )
+
+    @reactive.Effect
+    @timed("orders_trend_update")
+    def _():
+        """Redraw the monthly trend from util_analytics; no rows are touched."""
+        traces = build_trend_traces(
+            orders_trend_frame(), "Period", "Orders", "Moving average", "Anomaly"
+        )
+        update_figure(
+            trend_widget(),
+            traces,
+            f"Orders per Month, {TREND_WINDOW_MONTHS}-Month Moving Average and Anomalies",
+        )
+
+    # Trace building runs off the event loop (see util_executor).
+    charts_job = OffloadedTask("orders_charts_build")
+
+    def show_charts(result):
+        (traces, dropped), (line_traces, line_dropped) = result
+        update_figure(scatter_widget(), traces, "Orders Scatter Chart (Plotly)", dropped)
+        update_figure(line_widget(), line_traces, "Orders Line Chart (Plotly)", line_dropped)
+
+    @reactive.Effect
+    @timed("orders_charts_update")
+    def _():
+        """Patch both charts with the filtered rows in one batched update each."""
+        view = reactive_view.get()
+        snapshot = get_snapshot("orders.xlsx", view)
+        if snapshot is not None:
+            charts_job.cancel()
+            show_charts(snapshot.charts)
+            return
+        # Sessions showing the same rows share one build.
+        key = None if view.key is None else ("orders_charts", view.key)
+        charts_job.submit(build_orders_traces, view, then=show_charts, key=key)
+
+    @lazy
+    def register_chart_outputs():
+        """Define the widget outputs. Done on first render of orders_charts so
+        shinywidgets (and ipywidgets/IPython) are not imported with the app."""
+        from shinywidgets import render_widget
+
+        @output(id="orders_output_widget1")
+        @render_widget
+        @timed
+        def orders_output_widget1():
+            return scatter_widget()
+
+        @output(id="orders_output_widget2")
+        @render_widget
+        @timed
+        def orders_output_widget2():
+            return line_widget()
+
+        @output(id="orders_output_widget3")
+        @render_widget
+        @timed
+        def orders_output_widget3():
+            return summary_widget()
+
+        @output(id="orders_output_widget4")
+        @render_widget
+        @timed
+        def orders_output_widget4():
+            return trend_widget()
+
+        return (
+            orders_output_widget1,
+            orders_output_widget2,
+            orders_output_widget3,
+            orders_output_widget4,
         )
-        return px_plot
 
     @output
-    @render_widget
-    def orders_output_widget2():
-        df = reactive_df.get()
+    @render.ui
+    @timed
+    def orders_charts():
+        from shinywidgets import output_widget
 
-        px_plot = px.line(
-            df,
-            x="year-mon",
-            y="Number of Orders",
-            title="Orders Line Chart (Plotly Express)",
-            labels={"year-mon": "Year-Mon", "Number of Orders": "Orders"},
+        register_chart_outputs()
+        return ui.TagList(
+            output_widget("orders_output_widget3"),
+            output_widget("orders_output_widget4"),
+            output_widget("orders_output_widget1"),
+            output_widget("orders_output_widget2"),
         )
-        return px_plot
 
     # return a list of function names for use in reactive outputs
     return [
+        orders_kpis,
+        orders_trend_kpis,
+        orders_seasonality_table,
+        orders_anomaly_table,
         orders_record_count_string,
+        orders_table_page_string,
         orders_filtered_table,
-        orders_output_widget1,
-        orders_output_widget2,
+        orders_charts,
     ]
\ No newline at end of file
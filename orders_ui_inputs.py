@@ -14,6 +14,9 @@ Function ref at: https://shiny.rstudio.com/py/api/ui.update_date_range.html
 from datetime import date
 from shiny import ui
 
+# The date range every session starts with (see util_snapshots).
+DEFAULT_DATE_RANGE = (date(2015, 1, 1), date(2023, 12, 31))
+
 def get_orders_inputs():
     return ui.panel_sidebar(
         ui.h2("Order Interaction"),
@@ -21,8 +24,8 @@ def get_orders_inputs():
         ui.input_date_range(
             "ORDERS_DATE_RANGE",
             "Enter Date Range",
-            start=date(2015, 1, 1),
-            end=date(2023, 12, 31),
+            start=DEFAULT_DATE_RANGE[0],
+            end=DEFAULT_DATE_RANGE[1],
         ),
         ui.tags.hr(),
         ui.p("🕒 Please be patient. Outputs may take a few seconds to load."),
@@ -2,24 +2,49 @@
 Purpose: Display output for Flights dataset.
 
 @imports shiny.ui as ui
-@imports shinywidgets.output_widget for interactive charts
+
+The interactive charts are placed by the server (orders_charts), so shinywidgets
+is only imported once a chart is first shown.
 """
 
 from shiny import ui
-from shinywidgets import output_widget
+
+from util_exports import get_export_controls
+from util_tables import get_scrollable_table, get_table_controls
+
+ORDERS_TABLE_COLUMNS = ["Year", "Month", "Department", "Number of Orders", "year-mon"]
 
 def get_orders_outputs():
     return ui.panel_main(
         ui.h2("Timeline of Orders"),
         ui.tags.hr(),
         ui.tags.section(
+            ui.h3("Orders Summary"),
+            ui.output_ui("orders_kpis"),
             ui.h3("Filtered Orders: Charts"),
-            output_widget("orders_output_widget1"),
-            output_widget("orders_output_widget2"),
+            ui.output_ui("orders_charts"),
+            ui.tags.hr(),
+            ui.h3("Trends and Anomalies"),
+            ui.output_ui("orders_trend_kpis"),
+            ui.row(
+                ui.column(
+                    6,
+                    ui.h4("Seasonality"),
+                    ui.output_table("orders_seasonality_table"),
+                ),
+                ui.column(
+                    6,
+                    ui.h4("Anomalous Months"),
+                    ui.output_table("orders_anomaly_table"),
+                ),
+            ),
             ui.tags.hr(),
             ui.h3("Filtered Orders Table"),
             ui.output_text("orders_record_count_string"),
-            ui.output_table("orders_filtered_table"),
+            get_table_controls("ORDERS", ORDERS_TABLE_COLUMNS),
+            ui.output_text("orders_table_page_string"),
+            get_scrollable_table("orders_filtered_table", "ORDERS"),
+            get_export_controls("ORDERS", "orders_export"),
             ui.tags.hr(),
         ),
     )
\ No newline at end of file
@@ -8,61 +8,163 @@ Matching the IDs in the UI Sidebar and function/output names in the UI Main Pane
 to this server code is critical. They are case sensitive and must match exactly.
 
 """
-import pathlib
-
-from shiny import render, reactive
-import pandas as pd
-from shinywidgets import render_widget
-import plotly.express as px
+from shiny import render, reactive, req
+from shiny import ui
 
+from quantity_ui_inputs import DEFAULT_QUANTITY_MAX, DEFAULT_TIME_RANGE
+from util_cache import filter_cache
+from util_charts import (
+    build_bar_traces,
+    build_scatter_traces,
+    create_figure_widget,
+    update_figure,
+)
+from util_datasets import compact_frame
+from util_executor import OffloadedTask
+from util_exports import (
+    get_export_filename,
+    get_export_media_type,
+    iter_view_chunks,
+    stream_export,
+)
+from util_filters import FilteredView, FilterEngine
 from util_logger import setup_logger
+from util_metrics import timed
+from util_reactive import lazy, rate_limit, tab_active
+from util_refresh import DatasetFeed
+from util_rollups import QuantityCube, get_kpi_row
+from util_snapshots import Snapshot, get_snapshot, put_snapshot
+from util_streaming import register_stream
+from util_tables import (
+    DEFAULT_TABLE_INPUTS,
+    get_page,
+    read_table_inputs,
+    register_table_pager,
+    render_page_html,
+)
 
 logger, logname = setup_logger(__name__)
 
 
-def get_quantity_server_functions(input, output, session):
-    """Define functions to create UI outputs."""
+# The columns the Material Breakdown tab uses; nothing else is read from the data file.
+QUANTITY_COLUMNS = ["material", "time_to_complete_hrs", "order_size_units"]
 
-    p = pathlib.Path(__file__).parent.joinpath("data").joinpath("quantity.xlsx")
-    # logger.info(f"Reading data from {p}")
-    original_df = pd.read_excel(p)
-    total_count = len(original_df)
+# Shown when every material checkbox is cleared, as when all are checked.
+QUANTITY_MATERIALS = ["MedicineA", "MedicineB", "MedicineC"]
 
-    # Create a reactive value to hold the filtered pandas dataframe
-    reactive_df = reactive.Value()
 
-    # Create a reactive effect to set the reactive value when inputs change
-    # List all the inputs that should trigger this update
+def prepare_quantity(df):
+    """Drop the unnamed index column left over from writing the workbook."""
+    df = df.drop(columns=["Unnamed: 0"], errors="ignore")
+    return compact_frame(df, category_columns=["material"])
 
-    @reactive.Effect
-    @reactive.event(
-        input.TIME_RANGE,
-        input.QUANTITY_MAX,
-        input.MEDICINE_A,
-        input.MEDICINE_B,
-        input.MEDICINE_C,
+
+# Live mode: rows appended to data/quantity_stream.jsonl are added as they arrive.
+register_stream("quantity.xlsx", prepare=prepare_quantity, columns=QUANTITY_COLUMNS)
+
+
+def build_quantity_filters(df):
+    """Index the columns the Material Breakdown inputs filter on."""
+    return FilterEngine(
+        df,
+        range_columns=["time_to_complete_hrs", "order_size_units"],
+        category_columns=["material"],
     )
-    def _():
-        """Reactive effect to update the filtered dataframe when inputs change.
-        This is the only way to set a reactive value (after initialization).
-        It doesn't need a name, because no one calls it directly."""
 
-        # logger.info("UI inputs changed. Updating penguins reactive df")
 
-        df = original_df.copy()
+def get_quantity_filter_key(input_min, input_max, quantity_max, show_material_list):
+    """Return the filter inputs in one comparable form, for cache keys."""
+    return (
+        float(input_min),
+        float(input_max),
+        None if quantity_max is None else float(quantity_max),
+        tuple(sorted(show_material_list)),
+    )
+
+
+QUANTITY_DEFAULT_KEY = get_quantity_filter_key(
+    *DEFAULT_TIME_RANGE, DEFAULT_QUANTITY_MAX, QUANTITY_MATERIALS
+)
+
+
+def select_quantity_rows(filters, input_min, input_max, quantity_max, show_material_list):
+    """Return the row positions matching the inputs; all three predicates are checked together."""
+    return filters.select(
+        {
+            "time_to_complete_hrs": (input_min, input_max),
+            "order_size_units": (None, quantity_max),
+        },
+        {"material": show_material_list},
+    )
+
+
+def build_quantity_traces(view):
+    """Return (traces, dropped) for the Quantity chart; runs on the executor pool.
+    Large selections are binned, so the chart shows one marker per bin."""
+    df = view.frame(["order_size_units", "time_to_complete_hrs", "material"])
+    return build_scatter_traces(
+        df, x="order_size_units", y="time_to_complete_hrs", color="material"
+    )
 
-        # Body mass is a range
+
+def build_quantity_snapshot(df, filters):
+    """Select the default inputs, build the chart and render the first table
+    page, for every new session to reuse (see util_snapshots).
+    @param filters: the FilterEngine built for df.
+    Runs on the executor pool."""
+    rows = select_quantity_rows(
+        filters, *DEFAULT_TIME_RANGE, DEFAULT_QUANTITY_MAX, QUANTITY_MATERIALS
+    )
+    view = FilteredView(df, rows)
+    page_df, _, _ = get_page(view, *DEFAULT_TABLE_INPUTS)
+    return Snapshot(view, build_quantity_traces(view), render_page_html(page_df))
+
+
+# Reloading, streamed rows, the indexes, the rollup and the default snapshot are
+# done once per process, then every session is told the new version (see util_refresh).
+quantity_feed = DatasetFeed(
+    "quantity.xlsx",
+    prepare_quantity,
+    QUANTITY_COLUMNS,
+    artifacts={"filters": build_quantity_filters, "rollup": QuantityCube.from_frame},
+    snapshot=lambda state: build_quantity_snapshot(
+        state.frame(), state.artifacts["filters"]
+    ),
+)
+
+
+def get_quantity_server_functions(input, output, session):
+    """Define functions to create UI outputs."""
+
+    # Nothing below loads, filters or draws until the tab is first shown.
+    quantity_active = tab_active(input, "Material Breakdown")
+
+    # Shared across sessions; set again when quantity_feed has new data. The frame,
+    # version, indexes and rollup below all come from this one DatasetState.
+    quantity_state = quantity_feed.subscribe(session, quantity_active)
+
+    @reactive.Calc
+    def quantity_data():
+        req(quantity_state())
+        return quantity_state().frame()
+
+    # Create a reactive value to hold the filtered rows, as a view of the
+    # shared frame (see util_filters.FilteredView)
+    reactive_view = reactive.Value()
+
+    @rate_limit()
+    @reactive.Calc
+    def quantity_filter_inputs():
+        """Collect the filter inputs. While the slider is being dragged or the
+        order size typed, only the latest state is passed on (see util_reactive)."""
+
+        # Time to complete is a range
         input_range = input.TIME_RANGE()
         input_min = input_range[0]
         input_max = input_range[1]
-        body_mass_filter = (df["time_to_complete_hrs"] >= input_min) & (
-            df["time_to_complete_hrs"] <= input_max
-        )
-        df = df[body_mass_filter]
 
-        # Bill length is a max number
-        quantity_size_filter = df["order_size_units"] <= input.QUANTITY_MAX()
-        df = df[quantity_size_filter]
+        # Order size is a max number
+        quantity_max = input.QUANTITY_MAX()
 
         # Species is a list of checkboxes (a list of possible values)
         show_material_list = []
@@ -72,51 +174,228 @@ def get_quantity_server_functions(input, output, session):
             show_material_list.append("MedicineB")
         if input.MEDICINE_C():
             show_material_list.append("MedicineC")
-        show_material_list = show_material_list or ["MedicineA", "MedicineB", "MedicineC"]
-        material_filter = df["material"].isin(show_material_list)
-        df = df[material_filter]
+        show_material_list = show_material_list or QUANTITY_MATERIALS
+
+        return input_min, input_max, quantity_max, show_material_list
+
+    # Create a reactive effect to set the reactive value when inputs change
+    # List all the inputs that should trigger this update
+
+    # Filtering and chart building run off the event loop (see util_executor).
+    filter_job = OffloadedTask("quantity_filter_compute")
+    chart_job = OffloadedTask("quantity_chart_build")
+
+    @reactive.Effect
+    @reactive.event(quantity_filter_inputs, quantity_data)
+    @timed("quantity_filter")
+    def _():
+        """Reactive effect to update the filtered dataframe when inputs change.
+        This is the only way to set a reactive value (after initialization).
+        It doesn't need a name, because no one calls it directly."""
+
+        # logger.info("UI inputs changed. Updating penguins reactive df")
 
+        original_df = quantity_data()
+        # The indexes built for this very frame, not the latest shared ones.
+        filters = quantity_state().artifacts["filters"]
+        inputs = quantity_filter_inputs()
+        filter_key = get_quantity_filter_key(*inputs)
+        version = quantity_state().version
 
-        # logger.debug(f"filtered penguins df: {df}")
-        reactive_df.set(df)
+        # New sessions start at the default inputs: reuse their snapshot.
+        if filter_key == QUANTITY_DEFAULT_KEY:
+            snapshot = get_snapshot("quantity.xlsx", version=version)
+            if snapshot is not None:
+                filter_job.cancel()
+                reactive_view.set(snapshot.view)
+                return
+
+            def show_snapshot(snapshot):
+                put_snapshot("quantity.xlsx", version, snapshot)
+                reactive_view.set(snapshot.view)
+
+            filter_job.submit(
+                build_quantity_snapshot, original_df, filters,
+                then=show_snapshot, key=("quantity_snapshot", version),
+            )
+            return
+
+        # Sessions with the same inputs share the selected rows through filter_cache.
+        key = ("quantity.xlsx", version) + filter_key
+
+        rows = filter_cache.get(key)
+        if rows is not None:
+            filter_job.cancel()
+            reactive_view.set(FilteredView(original_df, rows, key=key))
+            return
+
+        def show_rows(rows):
+            filter_cache.put(key, rows)
+            # Nothing is copied here; each output builds only the rows it shows.
+            reactive_view.set(FilteredView(original_df, rows, key=key))
+
+        # Sessions with the same inputs share one run while it is in flight.
+        filter_job.submit(
+            select_quantity_rows, filters, *inputs,
+            then=show_rows, key=("quantity_filter", key),
+        )
+
+    @reactive.Calc
+    def quantity_rollup():
+        """Row counts by material, size bucket and hours, kept up to date as rows stream in."""
+        req(quantity_state())
+        return quantity_state().artifacts["rollup"]
+
+    @output
+    @render.ui
+    @timed
+    def quantity_kpis():
+        input_min, input_max, _, show_material_list = quantity_filter_inputs()
+        kpis = quantity_rollup().kpis(input_min, input_max, show_material_list)
+        items = [("Orders in time range", f"{kpis['orders']:,}")]
+        for material, hours in kpis["average_hours"].items():
+            items.append((f"{material} average hours", f"{hours:.1f}"))
+        return get_kpi_row(items)
 
     @output
     @render.text
+    @timed
     def quantity_record_count_string():
         # logger.debug("Triggered: penguins_filter_record_count_string")
-        filtered_count = len(reactive_df.get())
+        filtered_count = len(reactive_view.get())
+        total_count = len(quantity_data())
         message = f"Showing {filtered_count} of {total_count} records"
         # logger.debug(f"filter message: {message}")
         return message
 
+    register_table_pager(input, "QUANTITY", reactive_view)
+
+    # The filtered rows as a file, streamed in chunks (see util_exports).
+    @session.download(
+        filename=lambda: get_export_filename("quantity", input.QUANTITY_EXPORT_FORMAT()),
+        media_type=lambda: get_export_media_type(input.QUANTITY_EXPORT_FORMAT()),
+    )
+    def quantity_export():
+        chunks = iter_view_chunks(reactive_view.get(), QUANTITY_COLUMNS)
+        return stream_export(chunks, input.QUANTITY_EXPORT_FORMAT(), "quantity_export")
+
+    @reactive.Calc
+    def quantity_table_page():
+        """Sort (if asked) and cut out the page of rows the table shows."""
+        page, page_size, sort_by, descending = read_table_inputs(input, "QUANTITY")
+        return get_page(reactive_view.get(), page, page_size, sort_by, descending)
+
     @output
-    @render.table
-    def quantity_filtered_table():
-        filtered_df = reactive_df.get()
-        return filtered_df
+    @render.text
+    @timed
+    def quantity_table_page_string():
+        _, page, page_count = quantity_table_page()
+        return f"Page {page} of {page_count}"
 
     @output
-    @render_widget
-    def quantity_output_widget1():
-        df = reactive_df.get()
-        plotly_plot = px.scatter(
-            df,
+    @render.ui
+    @timed
+    def quantity_filtered_table():
+        snapshot = get_snapshot("quantity.xlsx", reactive_view.get())
+        if snapshot is not None and read_table_inputs(input, "QUANTITY") == DEFAULT_TABLE_INPUTS:
+            return ui.HTML(snapshot.table_html)
+        page_df, _, _ = quantity_table_page()
+        return ui.HTML(render_page_html(page_df))
+
+    # One widget for the whole session, built when first needed;
+    # filter changes only patch its traces.
+    labels = {
+        "order_size_units": "Order Size",
+        "time_to_complete_hrs": "Time to Complete (hrs)",
+    }
+    scatter_widget = lazy(
+        lambda: create_figure_widget(
             x="order_size_units",
             y="time_to_complete_hrs",
-            color="material",
-            title="Quantity Plot (Plotly Express))",
-            labels={
-                "order_size_units": "Order Size",
-                "time_to_complete_hrs": "Time to Complete (hrs)",
-            },
-            size_max=8,
+            labels=labels,
+            legend_title="material",
+        )
+    )
+
+    summary_widget = lazy(
+        lambda: create_figure_widget(
+            x="Order Size",
+            y="Orders",
+            legend_title="material",
+            barmode="stack",
         )
+    )
+
+    @reactive.Effect
+    @timed("quantity_summary_update")
+    def _():
+        """Redraw the summary from the rollup; no rows are touched."""
+        input_min, input_max, _, show_material_list = quantity_filter_inputs()
+        table = quantity_rollup().by_size_and_material(
+            input_min, input_max, show_material_list
+        )
+        update_figure(
+            summary_widget(),
+            build_bar_traces(table),
+            "Orders by Size and Material (all sizes)",
+        )
+
+    @reactive.Effect
+    @timed("quantity_chart_update")
+    def _():
+        """Patch the chart with the filtered rows in one batched update."""
+
+        def show_traces(result):
+            traces, dropped = result
+            update_figure(scatter_widget(), traces, "Quantity Plot (Plotly)", dropped)
+
+        view = reactive_view.get()
+        snapshot = get_snapshot("quantity.xlsx", view)
+        if snapshot is not None:
+            chart_job.cancel()
+            show_traces(snapshot.charts)
+            return
+        # Sessions showing the same rows share one build.
+        key = None if view.key is None else ("quantity_chart", view.key)
+        chart_job.submit(build_quantity_traces, view, then=show_traces, key=key)
+
+    @lazy
+    def register_chart_outputs():
+        """Define the widget output. Done on first render of quantity_charts so
+        shinywidgets (and ipywidgets/IPython) are not imported with the app."""
+        from shinywidgets import render_widget
+
+        @output(id="quantity_output_widget1")
+        @render_widget
+        @timed
+        def quantity_output_widget1():
+            return scatter_widget()
 
-        return plotly_plot
+        @output(id="quantity_output_widget2")
+        @render_widget
+        @timed
+        def quantity_output_widget2():
+            return summary_widget()
+
+        return quantity_output_widget1, quantity_output_widget2
+
+    @output
+    @render.ui
+    @timed
+    def quantity_charts():
+        from shinywidgets import output_widget
+
+        register_chart_outputs()
+        return ui.TagList(
+            output_widget("quantity_output_widget2"),
+            output_widget("quantity_output_widget1"),
+        )
 
     # return a list of function names for use in reactive outputs
     return [
+        quantity_kpis,
         quantity_record_count_string,
+        quantity_table_page_string,
         quantity_filtered_table,
-        quantity_output_widget1,
+        quantity_charts,
     ]
@@ -12,6 +12,10 @@ Preface IDs with the dataset name to avoid naming conflicts.
 
 from shiny import ui
 
+# The inputs every session starts with (see util_snapshots).
+DEFAULT_TIME_RANGE = (2, 10)
+DEFAULT_QUANTITY_MAX = 43000.0
+
 
 def get_quantity_inputs():
     return ui.panel_sidebar(
@@ -22,9 +26,9 @@ def get_quantity_inputs():
             "Time to complete (hrs)",
             min=1,
             max=10,
-            value=[2, 10],
+            value=list(DEFAULT_TIME_RANGE),
         ),
-        ui.input_numeric("QUANTITY_MAX", "Order Size", value=43000.0),
+        ui.input_numeric("QUANTITY_MAX", "Order Size", value=DEFAULT_QUANTITY_MAX),
         ui.input_checkbox("MEDICINE_A", "MedicineA", value=True),
         ui.input_checkbox("MEDICINE_B", "MedicineB", value=True),
         ui.input_checkbox("MEDICINE_C", "MedicineC", value=True),
@@ -2,10 +2,16 @@
 Purpose: Display output for Penguins dataset.
 
 @imports shiny.ui as ui
-@imports shinywidgets.output_widget for interactive charts
+
+The interactive chart is placed by the server (quantity_charts), so shinywidgets
+is only imported once a chart is first shown.
 """
 from shiny import ui
-from shinywidgets import output_widget
+
+from util_exports import get_export_controls
+from util_tables import get_scrollable_table, get_table_controls
+
+QUANTITY_TABLE_COLUMNS = ["material", "time_to_complete_hrs", "order_size_units"]
 
 
 def get_quantity_outputs():
@@ -13,12 +19,17 @@ def get_quantity_outputs():
         ui.h2("Materials Produced Overview"),
         ui.tags.hr(),
         ui.tags.section(
+            ui.h3("Quantity Summary"),
+            ui.output_ui("quantity_kpis"),
             ui.h3("Filtered Quantity: Charts"),
-            output_widget("quantity_output_widget1"),
+            ui.output_ui("quantity_charts"),
             ui.tags.hr(),
             ui.h3("Filtered Quantity Table"),
             ui.output_text("quantity_record_count_string"),
-            ui.output_table("quantity_filtered_table"),
+            get_table_controls("QUANTITY", QUANTITY_TABLE_COLUMNS),
+            ui.output_text("quantity_table_page_string"),
+            get_scrollable_table("quantity_filtered_table", "QUANTITY"),
+            get_export_controls("QUANTITY", "quantity_export"),
             ui.tags.hr(),
         ),
     )
@@ -0,0 +1,290 @@
+"""
+Purpose: Provide reactive output for the Records dataset.
+
+- Use inputs from the UI Sidebar to filter the error records.
+- Update reactive outputs in the UI Main Panel.
+
+Unlike the Orders and Material Breakdown tabs, the records are never loaded
+into pandas: the records history can be larger than memory. Each filter change
+becomes a SQL WHERE clause run by DuckDB over the Parquet copy of the data
+(see util_query.py). Only the aggregates and the one table page on screen come
+back to Python. Queries run on the executor pool (see util_executor.py).
+
+Set CINTEL_RECORDS_SOURCE to a Parquet file or glob pattern (for example
+/srv/records/*.parquet) to query a records history kept outside the data folder.
+
+Matching the IDs in the UI Sidebar and function/output names in the UI Main Panel
+to this server code is critical. They are case sensitive and must match exactly.
+
+"""
+import os
+
+from shiny import render, reactive, req, ui
+
+from util_cache import filter_cache
+from util_executor import OffloadedTask
+from util_exports import (
+    EXPORT_CHUNK_ROWS,
+    get_export_filename,
+    get_export_media_type,
+    stream_export,
+)
+from util_logger import setup_logger
+from util_metrics import timed
+from util_query import (
+    ROW_ORDER,
+    get_source_signature,
+    get_table_version,
+    iter_query,
+    run_query,
+)
+from util_reactive import rate_limit, tab_active
+from util_rollups import get_kpi_row
+from util_tables import get_page_count, read_table_inputs, register_table_pager
+
+logger, logname = setup_logger(__name__)
+
+RECORDS_SOURCE = os.environ.get("CINTEL_RECORDS_SOURCE")
+RECORDS_TABLE = "records"
+RECORDS_COLUMNS = ["Department", "Material", "Employee", "Errors"]
+VERSION_POLL_SECONDS = 5.0
+
+
+def get_records_version():
+    """Register the records table if needed; changes whenever the data files do."""
+    return get_table_version(RECORDS_TABLE, "records.xlsx", RECORDS_SOURCE)
+
+
+class RecordsSelection:
+    """The current filter as a SQL WHERE clause, and how many records match.
+    len() gives the match count, as the table pager expects (see util_tables)."""
+
+    def __init__(self, where, params, count):
+        self.where = where
+        self.params = params
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+
+def build_where(departments, materials, employee, errors_min):
+    """Return (WHERE clause, parameters) for the filter inputs.
+    Values are always passed as parameters, never pasted into the SQL."""
+    conditions = []
+    params = []
+    if departments:
+        conditions.append(f"Department IN ({', '.join('?' * len(departments))})")
+        params += list(departments)
+    if materials:
+        conditions.append(f"Material IN ({', '.join('?' * len(materials))})")
+        params += list(materials)
+    if employee:
+        conditions.append("Employee ILIKE ? ESCAPE '\\'")
+        params.append(employee.replace("%", r"\%").replace("_", r"\_") + "%")
+    if errors_min:
+        conditions.append("Errors >= ?")
+        params.append(errors_min)
+    where = " AND ".join(conditions) or "TRUE"
+    return where, params
+
+
+def get_records_choices():
+    """Return the distinct departments and materials, for the filter inputs."""
+    choices = run_query(
+        f"SELECT list(DISTINCT Department ORDER BY Department) AS departments, "
+        f"list(DISTINCT Material ORDER BY Material) AS materials FROM {RECORDS_TABLE}"
+    )
+    return list(choices["departments"][0]), list(choices["materials"][0])
+
+
+def summarize_records(where, params):
+    """Return the match count, headline numbers and errors by department and material."""
+    totals = run_query(
+        f"SELECT count(*) AS records, coalesce(sum(Errors), 0)::BIGINT AS errors, "
+        f"count(DISTINCT Employee) AS employees FROM {RECORDS_TABLE} WHERE {where}",
+        params,
+    )
+    by_group = run_query(
+        f"SELECT Department, Material, count(*) AS Records, "
+        f"sum(Errors)::BIGINT AS Errors FROM {RECORDS_TABLE} WHERE {where} "
+        f"GROUP BY ALL ORDER BY Errors DESC, Department, Material",
+        params,
+    )
+    return {
+        "records": int(totals["records"][0]),
+        "errors": int(totals["errors"][0]),
+        "employees": int(totals["employees"][0]),
+        "by_group": by_group,
+    }
+
+
+def get_records_page(selection, page, page_size, sort_by=None, descending=False):
+    """Return (page_df, page, page_count); only the rows on the page are read."""
+    page_count = get_page_count(len(selection), page_size)
+    page = min(max(int(page or 1), 1), page_count)
+    # Sort by a known column name only; everything else is a parameter. The row
+    # order breaks ties, so each page starts where the previous one ended.
+    order = f"ORDER BY {ROW_ORDER}"
+    if sort_by in RECORDS_COLUMNS:
+        order = f'ORDER BY "{sort_by}" {"DESC" if descending else "ASC"}, {ROW_ORDER}'
+    columns = ", ".join(f'"{column}"' for column in RECORDS_COLUMNS)
+    page_df = run_query(
+        f"SELECT {columns} FROM {RECORDS_TABLE} WHERE {selection.where} {order} "
+        f"LIMIT ? OFFSET ?",
+        selection.params + [page_size, (page - 1) * page_size],
+    )
+    return page_df, page, page_count
+
+
+def iter_records_chunks(selection):
+    """Yield every matching record, EXPORT_CHUNK_ROWS at a time, straight from DuckDB."""
+    columns = ", ".join(f'"{column}"' for column in RECORDS_COLUMNS)
+    return iter_query(
+        f"SELECT {columns} FROM {RECORDS_TABLE} WHERE {selection.where}",
+        selection.params,
+        EXPORT_CHUNK_ROWS,
+    )
+
+
+def get_records_server_functions(input, output, session):
+    """Define functions to create UI outputs."""
+
+    # Nothing below queries until the tab is first shown.
+    records_active = tab_active(input, "Records")
+
+    # Checking the signature only stats the files; the table is registered on first use.
+    @reactive.poll(
+        lambda: get_source_signature("records.xlsx", RECORDS_SOURCE), VERSION_POLL_SECONDS
+    )
+    def records_version():
+        req(records_active())
+        return get_records_version()
+
+    # The current filter (a RecordsSelection) and what was computed for it.
+    reactive_selection = reactive.Value()
+    reactive_summary = reactive.Value()
+    reactive_page = reactive.Value()
+
+    choices_job = OffloadedTask("records_choices_query")
+    summary_job = OffloadedTask("records_summary_query")
+    page_job = OffloadedTask("records_page_query")
+
+    @reactive.Effect
+    @reactive.event(records_version)
+    def _():
+        """Offer the departments and materials found in the data."""
+
+        def show_choices(choices):
+            departments, materials = choices
+            with reactive.isolate():
+                ui.update_selectize("RECORDS_DEPARTMENTS", choices=departments,
+                                    selected=input.RECORDS_DEPARTMENTS())
+                ui.update_selectize("RECORDS_MATERIALS", choices=materials,
+                                    selected=input.RECORDS_MATERIALS())
+
+        choices_job.submit(get_records_choices, then=show_choices)
+
+    @rate_limit()
+    @reactive.Calc
+    def records_filter_inputs():
+        """Collect the filter inputs; while typing, only the latest state is passed on."""
+        departments = tuple(sorted(input.RECORDS_DEPARTMENTS() or ()))
+        materials = tuple(sorted(input.RECORDS_MATERIALS() or ()))
+        employee = (input.RECORDS_EMPLOYEE() or "").strip()
+        errors_min = input.RECORDS_ERRORS_MIN() or 0
+        return departments, materials, employee, errors_min
+
+    @reactive.Effect
+    @reactive.event(records_filter_inputs, records_version)
+    @timed("records_filter")
+    def _():
+        """Turn the inputs into SQL and fetch the count and aggregates for them."""
+        inputs = records_filter_inputs()
+        where, params = build_where(*inputs)
+        # Sessions with the same inputs share the aggregates through filter_cache.
+        key = (RECORDS_TABLE, records_version(), inputs)
+
+        def show_summary(summary):
+            filter_cache.put(
+                key, summary, nbytes=int(summary["by_group"].memory_usage(deep=True).sum())
+            )
+            reactive_summary.set(summary)
+            reactive_selection.set(RecordsSelection(where, params, summary["records"]))
+
+        summary = filter_cache.get(key)
+        if summary is not None:
+            summary_job.cancel()
+            show_summary(summary)
+            return
+        summary_job.submit(summarize_records, where, params, then=show_summary)
+
+    register_table_pager(input, "RECORDS", reactive_selection)
+
+    # The matching records as a file, streamed in chunks (see util_exports).
+    @session.download(
+        filename=lambda: get_export_filename("records", input.RECORDS_EXPORT_FORMAT()),
+        media_type=lambda: get_export_media_type(input.RECORDS_EXPORT_FORMAT()),
+    )
+    def records_export():
+        chunks = iter_records_chunks(reactive_selection.get())
+        return stream_export(chunks, input.RECORDS_EXPORT_FORMAT(), "records_export")
+
+    @reactive.Effect
+    @timed("records_page")
+    def _():
+        """Fetch just the page of rows the table shows."""
+        selection = reactive_selection.get()
+        page, page_size, sort_by, descending = read_table_inputs(input, "RECORDS")
+        page_job.submit(
+            get_records_page, selection, page, page_size, sort_by, descending,
+            then=reactive_page.set,
+        )
+
+    @output
+    @render.ui
+    @timed
+    def records_kpis():
+        summary = reactive_summary.get()
+        return get_kpi_row([
+            ("Records", f"{summary['records']:,}"),
+            ("Errors", f"{summary['errors']:,}"),
+            ("Employees", f"{summary['employees']:,}"),
+            ("Errors per record",
+             f"{summary['errors'] / summary['records']:.1f}" if summary["records"] else "-"),
+        ])
+
+    @output
+    @render.table
+    @timed
+    def records_summary_table():
+        return reactive_summary.get()["by_group"]
+
+    @output
+    @render.text
+    @timed
+    def records_record_count_string():
+        return f"Showing {len(reactive_selection.get()):,} records"
+
+    @output
+    @render.text
+    @timed
+    def records_table_page_string():
+        _, page, page_count = reactive_page.get()
+        return f"Page {page} of {page_count}"
+
+    @output
+    @render.table
+    @timed
+    def records_filtered_table():
+        page_df, _, _ = reactive_page.get()
+        return page_df
+
+    # return a list of function names for use in reactive outputs
+    return [
+        records_kpis,
+        records_summary_table,
+        records_record_count_string,
+        records_table_page_string,
+        records_filtered_table,
+    ]
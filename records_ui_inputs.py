@@ -0,0 +1,37 @@
+"""
+Purpose: Provide user interaction options for the Records dataset.
+
+ - Leave a department or material list empty to include all of them.
+ - The department and material choices are filled in by the server from the data.
+
+IDs must be unique. They are capitalized in this app for clarity (not typical).
+The IDs are case-sensitive and must match the server code exactly.
+Preface IDs with the dataset name to avoid naming conflicts.
+
+"""
+
+from shiny import ui
+
+
+def get_records_inputs():
+    return ui.panel_sidebar(
+        ui.h2("Records Interaction"),
+        ui.tags.hr(),
+        ui.input_selectize(
+            "RECORDS_DEPARTMENTS",
+            "Departments (all if empty)",
+            choices=[],
+            multiple=True,
+        ),
+        ui.input_selectize(
+            "RECORDS_MATERIALS",
+            "Materials (all if empty)",
+            choices=[],
+            multiple=True,
+        ),
+        ui.input_text("RECORDS_EMPLOYEE", "Employee name starts with", placeholder="Name"),
+        ui.input_numeric("RECORDS_ERRORS_MIN", "Minimum errors", value=0, min=0),
+        ui.tags.hr(),
+        ui.p("🕒 Please be patient. Outputs may take a few seconds to load."),
+        ui.tags.hr(),
+    )
@@ -0,0 +1,33 @@
+"""
+Purpose: Display output for the Records dataset.
+
+@imports shiny.ui as ui
+
+"""
+
+from shiny import ui
+
+from util_exports import get_export_controls
+from util_tables import get_scrollable_table, get_table_controls
+
+RECORDS_TABLE_COLUMNS = ["Department", "Material", "Employee", "Errors"]
+
+def get_records_outputs():
+    return ui.panel_main(
+        ui.h2("Error Records"),
+        ui.tags.hr(),
+        ui.tags.section(
+            ui.h3("Records Summary"),
+            ui.output_ui("records_kpis"),
+            ui.h3("Errors by Department and Material"),
+            ui.output_table("records_summary_table"),
+            ui.tags.hr(),
+            ui.h3("Filtered Records Table"),
+            ui.output_text("records_record_count_string"),
+            get_table_controls("RECORDS", RECORDS_TABLE_COLUMNS),
+            ui.output_text("records_table_page_string"),
+            get_scrollable_table("records_filtered_table", "RECORDS"),
+            get_export_controls("RECORDS", "records_export"),
+            ui.tags.hr(),
+        ),
+    )
@@ -0,0 +1,12 @@
+"""
+Purpose: Make the app's top-level modules importable from the tests.
+
+Run from the repository root:
+
+    python -m pytest -q
+
+"""
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
@@ -0,0 +1,50 @@
+"""
+Purpose: Check the orders trend analytics (util_analytics.py).
+"""
+from datetime import date
+
+import pandas as pd
+
+from orders_server import prepare_orders
+from util_analytics import OrdersTrend
+from util_rollups import OrdersCube
+
+
+def make_orders():
+    """Three years of monthly orders for two departments."""
+    months = pd.date_range("2018-01-01", "2020-12-01", freq="MS")
+    rows = [
+        {"Year": day.year, "Month": day.strftime("%b"), "Department": department,
+         "Number of Orders": 100 + day.month + offset}
+        for day in months
+        for department, offset in (("EUCS", 0), ("Aerobes", 10))
+    ]
+    return prepare_orders(pd.DataFrame(rows))
+
+
+def test_reversed_range_selects_no_months():
+    df = make_orders()
+    trend = OrdersTrend.from_frame(df)
+    start, end = date(2020, 1, 1), date(2018, 1, 1)
+
+    frame = trend.frame(start, end)
+    assert len(frame) == 0
+    assert len(frame[frame["Anomaly"]]) == 0  # the anomaly table
+
+    seasonality = trend.seasonality(start, end)
+    assert len(seasonality) == 12
+    assert seasonality["Months"].sum() == 0
+
+    kpis = OrdersCube.from_frame(df).kpis(start, end)
+    assert kpis["total_orders"] == 0
+    assert kpis["busiest_month"] is None
+
+
+def test_frame_covers_the_range():
+    trend = OrdersTrend.from_frame(make_orders())
+    frame = trend.frame(date(2019, 1, 1), date(2019, 12, 31))
+    assert list(frame["Period"]) == [f"2019-{month}" for month in (
+        "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"
+    )]
+    # The same months a year earlier had the same orders.
+    assert (frame["YoY change"] == 0).all()
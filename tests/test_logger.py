@@ -0,0 +1,46 @@
+"""
+Purpose: Check that exceptions logged through the queue reach the log file.
+
+"""
+import json
+
+import util_logger
+
+
+def test_exception_reaches_the_json_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(util_logger, "LOG_FORMAT", "json")
+    logger, logname = util_logger.setup_logger("test_logger_json.py")
+    try:
+        try:
+            raise ValueError("bad row")
+        except ValueError:
+            logger.exception("Append failed for %s", "orders.xlsx")
+    finally:
+        util_logger.stop_logging()  # writes out the queue
+        util_logger._start_writer()
+
+    entries = [json.loads(line) for line in logname.read_text().splitlines()]
+    entry = entries[-1]
+    assert entry["message"] == "Append failed for orders.xlsx"
+    assert entry["level"] == "ERROR"
+    assert "Traceback" in entry["exception"]
+    assert "ValueError: bad row" in entry["exception"]
+
+
+def test_exception_reaches_the_text_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logger, logname = util_logger.setup_logger("test_logger_text.py")
+    try:
+        try:
+            raise KeyError("Month")
+        except KeyError:
+            logger.exception("Append failed")
+    finally:
+        util_logger.stop_logging()
+        util_logger._start_writer()
+
+    text = logname.read_text()
+    assert "Append failed" in text
+    assert text.count("Traceback") == 1
+    assert "KeyError: 'Month'" in text
@@ -0,0 +1,61 @@
+"""
+Purpose: Check that the rollup cubes (util_rollups.py) agree with the row filters.
+"""
+from datetime import date
+
+import pandas as pd
+
+from quantity_server import build_quantity_filters, select_quantity_rows
+from util_rollups import OrdersCube, QuantityCube
+
+from test_analytics import make_orders
+
+
+def make_quantity():
+    """Orders for two materials with fractional hours to complete."""
+    return pd.DataFrame({
+        "material": ["MedicineA", "MedicineA", "MedicineB", "MedicineB", "MedicineA"],
+        "time_to_complete_hrs": [2.0, 2.5, 2.75, 9.5, 10.0],
+        "order_size_units": [1_000.0, 12_000.0, 25_000.0, 30_000.0, 41_000.0],
+    })
+
+
+def test_quantity_kpis_match_the_table_filter():
+    df = make_quantity()
+    cube = QuantityCube.from_frame(df)
+    filters = build_quantity_filters(df)
+    materials = ["MedicineA", "MedicineB"]
+    for time_min, time_max in [(2, 10), (2.5, 9.5), (2.6, 10), (2, 2.4), (3, 9)]:
+        rows = select_quantity_rows(filters, time_min, time_max, None, materials)
+        kpis = cube.kpis(time_min, time_max, materials)
+        assert kpis["orders"] == len(rows)
+
+        selected = df.iloc[rows]
+        expected = selected.groupby("material")["time_to_complete_hrs"].mean()
+        assert kpis["average_hours"] == expected.to_dict()
+
+
+def test_quantity_with_rows_matches_a_rebuild():
+    df = make_quantity()
+    cube = QuantityCube.from_frame(df.iloc[:3]).with_rows(df.iloc[3:])
+    rebuilt = QuantityCube.from_frame(df)
+    assert cube.hours == rebuilt.hours
+    assert cube.kpis(2.5, 10, ["MedicineA", "MedicineB"]) == rebuilt.kpis(
+        2.5, 10, ["MedicineA", "MedicineB"]
+    )
+
+
+def test_yearly_table_is_empty_for_no_data():
+    departments = ["EUCS", "Aerobes"]
+    cube = OrdersCube.from_frame(make_orders())
+
+    for table in (
+        cube.by_year_and_department(date(2020, 1, 1), date(2018, 1, 1)),
+        cube.by_year_and_department(date(2030, 1, 1), date(2031, 1, 1)),
+    ):
+        assert len(table) == 0
+        assert sorted(table.columns) == sorted(departments)
+
+    empty = OrdersCube.from_frame(make_orders().iloc[:0])
+    table = empty.by_year_and_department(date(2018, 1, 1), date(2020, 1, 1))
+    assert len(table) == 0
@@ -0,0 +1,75 @@
+"""
+Purpose: Check that live mode keeps the good rows of a batch (util_streaming.py).
+"""
+import json
+
+import pytest
+
+import util_streaming
+from orders_server import ORDERS_COLUMNS, prepare_orders
+from util_datasets import clear_datasets, get_dataset, get_dataset_stats
+
+
+@pytest.fixture
+def orders_stream(tmp_path, monkeypatch):
+    """The orders dataset, loaded, with its drop files in a temporary folder."""
+    monkeypatch.setattr(util_streaming, "DATA_FOLDER", tmp_path)
+    monkeypatch.setattr(util_streaming, "_streams", {})
+    clear_datasets()
+    get_dataset("orders.xlsx", prepare_orders, ORDERS_COLUMNS)
+    util_streaming.register_stream(
+        "orders.xlsx", prepare=prepare_orders, sort_by="Date", columns=ORDERS_COLUMNS
+    )
+    yield tmp_path
+    clear_datasets()
+
+
+def row_count(file_name="orders.xlsx"):
+    return get_dataset_stats()["datasets"][file_name]
+
+
+def poll(file_name="orders.xlsx"):
+    util_streaming._streams[file_name]["checked"] = 0.0  # ignore the poll interval
+    util_streaming.poll_stream(file_name)
+
+
+def row(month, orders=5):
+    return {"Year": 2024, "Month": month, "Department": "EUCS", "Number of Orders": orders}
+
+
+def test_jsonl_batch_keeps_good_rows(orders_stream):
+    before = row_count()
+    lines = [json.dumps(row("Jan")), json.dumps(row("Smarch")), "{broken",
+             json.dumps({"Year": 2024}), json.dumps(row("Feb"))]
+    orders_stream.joinpath("orders_stream.jsonl").write_text("\n".join(lines) + "\n")
+    poll()
+    assert row_count() == before + 2
+
+    # The skipped lines are not read again.
+    poll()
+    assert row_count() == before + 2
+
+
+def test_csv_batch_keeps_good_rows(orders_stream):
+    before = row_count()
+    lines = ["Year,Month,Department,Number of Orders", "2024,Jan,EUCS,5",
+             "2024,Feb,EUCS,5,extra", "2024,Smarch,EUCS,5", "2024,Mar,EUCS,5"]
+    # Created after the stream was registered.
+    orders_stream.joinpath("orders_stream.csv").write_text("\n".join(lines) + "\n")
+    poll()
+    assert row_count() == before + 2
+
+
+def test_failed_append_reads_the_lines_again(orders_stream, monkeypatch):
+    before = row_count()
+    orders_stream.joinpath("orders_stream.jsonl").write_text(json.dumps(row("Jan")) + "\n")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(util_streaming, "append_rows", fail)
+        poll()
+    assert row_count() == before
+    poll()
+    assert row_count() == before + 1
@@ -0,0 +1,279 @@
+"""
+Purpose: Trend, year-over-year, seasonality and anomaly analytics for the orders series.
+
+Planners look at orders per month over time: the moving average, the change on
+the same month a year earlier, which months are usually busy, and which months
+stand out. OrdersTrend keeps the monthly series of Number of Orders together
+with what those questions need, and is updated as rows arrive rather than
+recomputed over the whole history:
+
+- a RollingWindow of the last TREND_WINDOW_MONTHS monthly totals, with running
+  sums, so the moving average and standard deviation cost O(1) per month
+- the mean and standard deviation of the window ending at each month
+- a running total per calendar month (Jan, Feb, ...), so the seasonality
+  profile of any date range costs 12 subtractions
+
+A new row adds to its month. The last month is updated, a later month first
+fills any gap with zero months, and each month is one O(1) step whatever the
+length of the history. Appending copies the monthly lists (months, not rows),
+so sessions still showing the previous version keep a consistent trend. Only a
+row for a month that already has later months (late data) recomputes the
+series, O(months).
+
+Queries slice the arrays: frame() returns one row per month in a date range,
+with:
+- the moving average;
+- the year-over-year change;
+- a z-score against the window that ended the month before.
+A month is flagged as an anomaly when its |z| is at least ANOMALY_Z.
+
+    state = get_dataset_state("orders.xlsx", {"trend": OrdersTrend.from_frame})
+    trend = state.artifacts["trend"]
+    trend.frame(start, end)
+    trend.seasonality(start, end)
+
+Settings (environment variables):
+    CINTEL_TREND_WINDOW_MONTHS=12   months in the moving window
+    CINTEL_ANOMALY_Z=2.5            |z-score| from which a month is flagged
+
+"""
+import collections
+import math
+import copy
+import os
+
+import numpy as np
+import pandas as pd
+
+from util_rollups import MONTH_NAMES
+
+TREND_WINDOW_MONTHS = int(os.environ.get("CINTEL_TREND_WINDOW_MONTHS", "12"))
+ANOMALY_Z = float(os.environ.get("CINTEL_ANOMALY_Z", "2.5"))
+
+# A z-score needs a window at least this full to mean anything.
+MIN_WINDOW_MONTHS = 3
+
+
+class RollingWindow:
+    """Mean and standard deviation of the last size values, updated in O(1)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = collections.deque()
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def push(self, value):
+        """Add a value, dropping the oldest once the window is full."""
+        self.values.append(value)
+        self.total += value
+        self.total_squares += value * value
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_squares -= old * old
+
+    def replace_last(self, value):
+        """Change the newest value, e.g. when more rows arrive for the current month."""
+        old = self.values[-1]
+        self.values[-1] = value
+        self.total += value - old
+        self.total_squares += value * value - old * old
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else math.nan
+
+    def std(self):
+        """Sample standard deviation (NaN for fewer than two values)."""
+        count = len(self.values)
+        if count < 2:
+            return math.nan
+        variance = (self.total_squares - self.total * self.total / count) / (count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+def _month_index(dates):
+    """Months since year 0 for each date: year * 12 + month - 1."""
+    dates = pd.DatetimeIndex(dates)
+    return dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+
+
+def _lagged(values, lo, hi, lag):
+    """Return values[lo - lag:hi - lag], with NaN for positions before the first."""
+    result = np.full(hi - lo, np.nan)
+    start = max(lo - lag, 0)
+    if hi - lag > start:
+        result[start - (lo - lag):] = values[start : hi - lag]
+    return result
+
+
+class OrdersTrend:
+    """The monthly orders series with its rolling, seasonal and anomaly statistics.
+
+    A util_datasets artifact: with_rows() returns an updated copy, so a
+    DatasetState never sees months added after it was published.
+    """
+
+    def __init__(self, window=TREND_WINDOW_MONTHS):
+        self.window = window
+        self.first_month = None  # month index of values[0]
+        self.values = []
+        self.means = []  # of the window ending at each month
+        self.stds = []
+        self.seasonal_totals = []  # running total of each calendar month up to here
+        self._rolling = RollingWindow(window)
+
+    @classmethod
+    def from_frame(cls, df, window=TREND_WINDOW_MONTHS):
+        """Build from a prepared orders frame (with the Date column)."""
+        trend = cls(window)
+        trend._add_rows(df)
+        return trend
+
+    def with_rows(self, rows):
+        """Return a trend that also counts the orders of rows (e.g. newly streamed ones)."""
+        if not len(rows):
+            return self
+        trend = copy.copy(self)
+        trend.values = list(self.values)
+        trend.means = list(self.means)
+        trend.stds = list(self.stds)
+        trend.seasonal_totals = list(self.seasonal_totals)
+        trend._rolling = copy.deepcopy(self._rolling)
+        trend._add_rows(rows)
+        return trend
+
+    def _add_rows(self, rows):
+        months, totals = np.unique(_month_index(rows["Date"]), return_inverse=True)
+        totals = np.bincount(totals, weights=rows["Number of Orders"].to_numpy(float))
+        for month, total in zip(months.tolist(), totals.tolist()):
+            self._add(month, total)
+
+    def _add(self, month, total):
+        if self.first_month is None:
+            self.first_month = month
+        position = month - self.first_month
+        last = len(self.values) - 1
+        if position < last:
+            # Late rows for a month that already has later months.
+            first_month = min(month, self.first_month)
+            values = [0.0] * (self.first_month - first_month) + self.values
+            values[month - first_month] += total
+            self._rebuild(first_month, values)
+        elif position == last:
+            self.values[-1] += total
+            self.seasonal_totals[-1] += total
+            self._rolling.replace_last(self.values[-1])
+            self.means[-1] = self._rolling.mean()
+            self.stds[-1] = self._rolling.std()
+        else:
+            for _ in range(position - last - 1):
+                self._push(0.0)  # no orders that month
+            self._push(total)
+
+    def _push(self, value):
+        self.values.append(value)
+        self._rolling.push(value)
+        self.means.append(self._rolling.mean())
+        self.stds.append(self._rolling.std())
+        year_ago = len(self.values) - 13
+        self.seasonal_totals.append(
+            value + (self.seasonal_totals[year_ago] if year_ago >= 0 else 0.0)
+        )
+
+    def _rebuild(self, first_month, values):
+        """Recompute every statistic from the monthly totals; only for late rows."""
+        self.first_month = first_month
+        self.values, self.means, self.stds, self.seasonal_totals = [], [], [], []
+        self._rolling = RollingWindow(self.window)
+        for value in values:
+            self._push(value)
+
+    def _bounds(self, start, end):
+        """Return (lo, hi) so months lo..hi-1 start within start..end (inclusive),
+        the same months the Date filter keeps."""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        lo = start.year * 12 + start.month - 1 - self.first_month
+        if start.day > 1:
+            lo += 1  # that month began before start
+        hi = end.year * 12 + end.month - self.first_month
+        count = len(self.values)
+        lo, hi = min(max(lo, 0), count), min(max(hi, 0), count)
+        return lo, max(hi, lo)  # a reversed range selects no months
+
+    def frame(self, start, end):
+        """Return one row per month from start to end: Period, Orders, Moving average,
+        Moving std, YoY change, YoY %, Z-score and Anomaly."""
+        columns = ["Period", "Orders", "Moving average", "Moving std",
+                   "YoY change", "YoY %", "Z-score", "Anomaly"]
+        if self.first_month is None:
+            return pd.DataFrame(columns=columns)
+        lo, hi = self._bounds(start, end)
+        # Only the months shown, plus the year before them for YoY.
+        base = max(lo - 12, 0)
+        values = np.array(self.values[base:hi], dtype=float)
+        means = np.array(self.means[base:hi], dtype=float)
+        stds = np.array(self.stds[base:hi], dtype=float)
+        first_month = self.first_month
+
+        lo_in, hi_in = lo - base, hi - base
+        current = values[lo_in:hi_in]
+        year_ago = _lagged(values, lo_in, hi_in, 12)
+        # Each month is compared with the window that ended the month before.
+        previous_mean = _lagged(means, lo_in, hi_in, 1)
+        previous_std = _lagged(stds, lo_in, hi_in, 1)
+
+        # Months without a full enough window get no z-score.
+        positions = np.arange(lo, hi)
+        window_size = np.minimum(positions, self.window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (current - previous_mean) / previous_std
+            yoy_pct = (current - year_ago) / year_ago * 100
+        z[(window_size < MIN_WINDOW_MONTHS) | ~np.isfinite(z)] = np.nan
+        yoy_pct[~np.isfinite(yoy_pct)] = np.nan
+
+        months = first_month + positions
+        return pd.DataFrame({
+            "Period": [f"{month // 12}-{MONTH_NAMES[month % 12]}" for month in months],
+            "Orders": current,
+            "Moving average": means[lo_in:hi_in],
+            "Moving std": stds[lo_in:hi_in],
+            "YoY change": current - year_ago,
+            "YoY %": yoy_pct,
+            "Z-score": z,
+            "Anomaly": np.abs(z) >= ANOMALY_Z,
+        })
+
+    def seasonality(self, start, end):
+        """Return the average orders per calendar month from start to end and its
+        seasonal index (1.0 is an average month), from the running totals."""
+        totals = np.zeros(12)
+        counts = np.zeros(12)
+        if self.first_month is not None:
+            lo, hi = self._bounds(start, end)
+            for position in range(max(hi - 12, lo), hi):
+                # The running total of a calendar month, minus where it stood before lo.
+                before = position - 12 * ((position - lo) // 12 + 1)
+                calendar_month = (self.first_month + position) % 12
+                totals[calendar_month] = self.seasonal_totals[position] - (
+                    self.seasonal_totals[before] if before >= 0 else 0.0
+                )
+                counts[calendar_month] = (position - lo) // 12 + 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            averages = totals / counts
+        overall = totals.sum() / counts.sum() if counts.sum() else np.nan
+        return pd.DataFrame({
+            "Month": MONTH_NAMES,
+            "Months": counts.astype(int),
+            "Average orders": averages,
+            "Seasonal index": averages / overall,
+        })
+
+
+def format_change(change, percent):
+    """Return e.g. "+120 (+8.5%)", or "-" when there is nothing to compare with."""
+    if pd.isna(change):
+        return "-"
+    if pd.isna(percent):
+        return f"{change:+,.0f}"
+    return f"{change:+,.0f} ({percent:+.1f}%)"
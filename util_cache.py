@@ -0,0 +1,99 @@
+"""
+Purpose: Remember recent filter results so repeat queries skip pandas entirely.
+
+Most operators open the Orders and Material Breakdown tabs with the default
+inputs or one of a few common presets. Every session used to compute the same
+filtered rows again. filter_cache is shared by all sessions in the process.
+Keys are (dataset, dataset version, normalized inputs) and values are the
+selected row positions, which are much smaller than the filtered frames.
+
+The cache is bounded by entry count and by total bytes, evicting the least
+recently used entries first, and keeps hit/miss counters.
+
+"""
+import collections
+import threading
+
+import numpy as np
+
+
+def estimate_nbytes(value):
+    """Rough memory size of a cached value; numpy arrays report their own size."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return 64 + sum(estimate_nbytes(item) for item in value)
+    return 64
+
+
+class LRUCache:
+    """A thread-safe least-recently-used cache bounded by entries and bytes."""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = collections.OrderedDict()  # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key (marking it recently used) or default."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, nbytes=None):
+        """Store value under key, evicting old entries to stay within bounds."""
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        if nbytes > self.max_bytes:
+            return  # never worth evicting everything for one entry
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, nbytes)
+            self._bytes += nbytes
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._items.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return entry count, bytes used and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by every session in this process.
+filter_cache = LRUCache()
@@ -0,0 +1,241 @@
+"""
+Purpose: Build Plotly charts that stay interactive at production data volumes.
+
+px.scatter / px.line put every filtered row into the figure. Past tens of
+thousands of points both the JSON and the browser fall over. The builders here:
+
+- switch to WebGL traces (Scattergl) above WEBGL_THRESHOLD points
+- downsample line charts with Largest-Triangle-Three-Buckets (LTTB), which keeps
+  the peaks and dips that a plain stride would miss
+- aggregate large scatter plots into a grid of bins, one marker per non-empty
+  bin, sized by the number of rows it stands for
+
+Each trace builder returns (traces, dropped), where dropped is how many points
+were summarized away; update_figure() shows the count in the chart title.
+
+Create a FigureWidget once per session with create_figure_widget() and call
+update_figure() on each change. It patches the trace arrays and title of the
+existing widget in one batched update, so the layout and Plotly.js setup are
+not rebuilt and re-sent every time.
+
+Plotly is imported on first use (see _go) so importing app.py stays fast.
+
+"""
+import numpy as np
+import pandas as pd
+
+WEBGL_THRESHOLD = 5000
+LINE_MAX_POINTS = 2000
+SCATTER_MAX_POINTS = 5000
+SCATTER_BINS = 80
+
+
+def lttb(x, y, threshold):
+    """Return the positions of the points LTTB keeps when reducing to threshold.
+    x must be numeric and ascending; y numeric.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # The first and last points are always kept; the rest is split into buckets.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick
+        # and the average of the next bucket.
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def bin_points(x, y, bins=SCATTER_BINS):
+    """Aggregate points into a bins x bins grid.
+    @returns: (mean x, mean y, count) for each non-empty bin.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_edges = np.linspace(x.min(), x.max(), bins + 1)
+    y_edges = np.linspace(y.min(), y.max(), bins + 1)
+    x_bin = np.clip(np.searchsorted(x_edges, x, side="right") - 1, 0, bins - 1)
+    y_bin = np.clip(np.searchsorted(y_edges, y, side="right") - 1, 0, bins - 1)
+    cell = x_bin * bins + y_bin
+
+    cells, inverse, counts = np.unique(cell, return_inverse=True, return_counts=True)
+    mean_x = np.bincount(inverse, weights=x) / counts
+    mean_y = np.bincount(inverse, weights=y) / counts
+    return mean_x, mean_y, counts
+
+
+def _go():
+    """Import plotly.graph_objects only when a chart is first built."""
+    import plotly.graph_objects as go
+
+    return go
+
+
+def _trace_class(point_count):
+    go = _go()
+    return go.Scattergl if point_count > WEBGL_THRESHOLD else go.Scatter
+
+
+def _with_dropped(title, shown, dropped):
+    if not dropped:
+        return title
+    return f"{title}<br><sup>Showing {shown:,} of {shown + dropped:,} points</sup>"
+
+
+def _layout(title, x, y, labels, legend_title=None):
+    labels = labels or {}
+    return dict(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+        legend_title_text=labels.get(legend_title, legend_title),
+    )
+
+
+def build_scatter_traces(df, x, y, color=None, max_points=SCATTER_MAX_POINTS):
+    """Return (traces, dropped) for a scatter plot, one trace per color group."""
+    groups = [(None, df)] if color is None else [
+        (value, df[df[color] == value]) for value in pd.unique(df[color])
+    ]
+    trace_class = _trace_class(len(df))
+    aggregate = len(df) > max_points
+
+    traces = []
+    dropped = 0
+    for name, group in groups:
+        if aggregate and len(group):
+            gx, gy, counts = bin_points(group[x].to_numpy(), group[y].to_numpy())
+            dropped += len(group) - len(counts)
+            marker = dict(
+                size=np.clip(4 + 2 * np.log2(counts), 4, 16),
+                opacity=0.8,
+            )
+            traces.append(
+                trace_class(
+                    x=gx,
+                    y=gy,
+                    name=str(name),
+                    mode="markers",
+                    marker=marker,
+                    customdata=counts,
+                    hovertemplate="%{x}, %{y}<br>%{customdata} rows<extra></extra>",
+                )
+            )
+        else:
+            traces.append(
+                trace_class(
+                    x=group[x].to_numpy(),
+                    y=group[y].to_numpy(),
+                    name=None if name is None else str(name),
+                    mode="markers",
+                    showlegend=name is not None,
+                )
+            )
+    return traces, dropped
+
+
+def build_line_traces(df, x, y, max_points=LINE_MAX_POINTS):
+    """Return (traces, dropped) for a line chart of rows already in x order."""
+    y_values = df[y].to_numpy()
+    x_values = df[x].to_numpy()
+    if pd.api.types.is_numeric_dtype(df[x]) or pd.api.types.is_datetime64_any_dtype(
+        df[x]
+    ):
+        x_numeric = x_values.astype("int64") if x_values.dtype.kind == "M" else x_values
+    else:
+        # Labels like "2015-Jan": the rows are in order, so use their position.
+        x_numeric = np.arange(len(df))
+
+    keep = lttb(x_numeric, y_values, max_points)
+    trace = _trace_class(len(keep))(
+        x=x_values[keep], y=y_values[keep], mode="lines", showlegend=False
+    )
+    return [trace], len(df) - len(keep)
+
+
+def build_bar_traces(table):
+    """Return one Bar trace per column of a wide table, with its index on the x axis.
+    Used for the summary charts, which read from util_rollups rather than rows."""
+    go = _go()
+    x_values = table.index.to_numpy()
+    return [
+        go.Bar(x=x_values, y=table[column].to_numpy(), name=str(column))
+        for column in table.columns
+    ]
+
+
+def build_trend_traces(df, x, y, average, flags):
+    """Return a series, its moving average, and markers on the rows flagged in
+    the boolean column flags (see util_analytics.OrdersTrend.frame)."""
+    trace_class = _trace_class(len(df))
+    x_values = df[x].to_numpy()
+    flagged = df[df[flags].to_numpy(bool)]
+    return [
+        trace_class(x=x_values, y=df[y].to_numpy(), mode="lines", name=y),
+        trace_class(
+            x=x_values, y=df[average].to_numpy(), mode="lines", name=average,
+            line=dict(dash="dash"),
+        ),
+        trace_class(
+            x=flagged[x].to_numpy(), y=flagged[y].to_numpy(), mode="markers",
+            name="Anomaly", marker=dict(size=11, symbol="x", color="crimson"),
+        ),
+    ]
+
+
+def create_figure_widget(x, y, labels=None, legend_title=None, barmode=None):
+    """Return an empty FigureWidget with the axis titles set; fill it with update_figure()."""
+    fig = _go().FigureWidget()
+    fig.update_layout(**_layout(None, x, y, labels, legend_title))
+    if barmode:
+        fig.update_layout(barmode=barmode)
+    return fig
+
+
+def _trace_signature(trace):
+    """Traces with the same signature can be patched in place."""
+    keys = set(trace.to_plotly_json()) - {"uid"}
+    return (trace.type, trace.name, tuple(sorted(keys)))
+
+
+def update_figure(fig, traces, title=None, dropped=0):
+    """Show traces in an existing FigureWidget using a single batched update.
+    If only the data changed, the existing traces are patched in place;
+    otherwise (e.g. a switch to WebGL or a new color group) they are replaced.
+    """
+    shown = sum(len(trace.x) for trace in traces)
+    same_shape = len(fig.data) == len(traces) and all(
+        _trace_signature(current) == _trace_signature(new)
+        for current, new in zip(fig.data, traces)
+    )
+    with fig.batch_update():
+        if same_shape:
+            for current, new in zip(fig.data, traces):
+                properties = new.to_plotly_json()
+                properties.pop("type")
+                current.update(properties, overwrite=True)
+        else:
+            fig.data = ()
+            fig.add_traces(traces)
+        fig.layout.title = _with_dropped(title, shown, dropped)
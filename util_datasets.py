@@ -0,0 +1,324 @@
+"""
+Purpose: Load each dataset once per process and share it across sessions.
+
+Reading an Excel workbook with openpyxl is the slowest part of starting a session.
+Every browser tab used to parse data/orders.xlsx and data/quantity.xlsx again.
+This module parses each workbook once, keeps the result until the file's
+modification time or size changes, and hands each session a shallow copy it can
+add columns to without affecting anyone else. Rows that arrive later (see
+util_streaming.py) are appended with append_rows() instead of rereading the file.
+
+Prepare functions end with compact_frame(), so the one shared copy uses
+categoricals for repeated strings and the smallest numeric dtypes.
+
+If data/app_data.py has converted a workbook to Arrow (data/columnar/<name>.arrow)
+since it last changed, the Arrow file is memory-mapped instead of parsing the
+workbook, and only the columns a server asks for are read. Without pyarrow, or
+with an out-of-date conversion, the workbook is read as before.
+
+In multi-worker mode (util_workers.py) the parent process loads each dataset and
+shares it; workers map the shared frame (util_shared.attach) instead of loading.
+
+Usage:
+    df = get_dataset("orders.xlsx")
+    state = get_dataset_state("orders.xlsx", {"filters": build_engine})  # see util_refresh
+    engine = state.artifacts["filters"]
+    stats = get_dataset_stats()
+
+"""
+import pathlib
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from util_logger import setup_logger
+from util_shared import attach
+
+logger, logname = setup_logger(__name__)
+
+# Sessions get shallow copies of one shared frame. With copy-on-write (always on
+# from pandas 3) writing to a copy can never change the shared data.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+DATA_FOLDER = pathlib.Path(__file__).parent.joinpath("data")
+COLUMNAR_FOLDER = DATA_FOLDER.joinpath("columnar")
+
+# One entry per file name: the loaded frame plus the file signature it came from.
+_entries = {}
+# hits: get_dataset() calls served from the cache; checks: polls by
+# refresh_dataset() (util_refresh) that found the file unchanged.
+_stats = {"hits": 0, "misses": 0, "checks": 0, "loads": 0, "load_seconds": 0.0}
+_lock = threading.Lock()
+# file name -> Event set when the load in progress finishes. Loads run outside
+# _lock, so loading one dataset never holds up lookups of the others.
+_loading = {}
+
+
+def compact_frame(df, category_columns=()):
+    """Shrink a frame for sharing: repeated strings become categoricals and numbers
+    use the smallest dtype that holds them (floats only when nothing is lost).
+    Call it at the end of a prepare function.
+    """
+    for column in df.columns:
+        values = df[column]
+        if column in category_columns:
+            df[column] = values.astype("category")
+        elif pd.api.types.is_bool_dtype(values):
+            continue
+        elif pd.api.types.is_integer_dtype(values):
+            df[column] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            smaller = values.astype("float32")
+            if np.array_equal(smaller.to_numpy(), values.to_numpy(), equal_nan=True):
+                df[column] = smaller
+    return df
+
+
+def _match_dtypes(rows, like):
+    """Give appended rows the dtypes of the shared frame, so concat keeps them
+    compact. Categories are merged; a number that does not fit upcasts the column."""
+    rows = rows.copy()
+    for column in rows.columns.intersection(like.columns):
+        dtype = like[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            merged = union_categoricals(
+                [like[column].array, pd.Categorical(rows[column])], sort_categories=True
+            )
+            like[column] = pd.Categorical(like[column], categories=merged.categories)
+            rows[column] = pd.Categorical(rows[column], categories=merged.categories)
+        elif pd.api.types.is_integer_dtype(dtype) and pd.api.types.is_integer_dtype(
+            rows[column]
+        ):
+            info = np.iinfo(dtype)
+            if len(rows) and info.min <= rows[column].min() and rows[column].max() <= info.max:
+                rows[column] = rows[column].astype(dtype)
+    return rows
+
+
+def get_file_signature(path):
+    """Return (name, mtime_ns, size) for a file; changes whenever the file is rewritten."""
+    path = pathlib.Path(path)
+    stat = path.stat()
+    return (path.name, stat.st_mtime_ns, stat.st_size)
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_source_path(file_name):
+    """Return the file a dataset is loaded from: its Arrow conversion when that is
+    at least as new as the workbook, otherwise the workbook itself."""
+    path = DATA_FOLDER.joinpath(file_name)
+    columnar = COLUMNAR_FOLDER.joinpath(pathlib.Path(file_name).stem + ".arrow")
+    try:
+        columnar_mtime = columnar.stat().st_mtime_ns
+    except FileNotFoundError:
+        return path
+    if path.exists() and columnar_mtime < path.stat().st_mtime_ns:
+        return path
+    return columnar if _has_pyarrow() else path
+
+
+def read_data_file(path, columns=None):
+    """Read a data file into a DataFrame, optionally only some of its columns.
+    Arrow files are memory-mapped: columns that are not asked for are never read."""
+    path = pathlib.Path(path)
+    if path.suffix == ".arrow":
+        import pyarrow as pa
+
+        table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas(split_blocks=True)
+    if path.suffix == ".csv":
+        return pd.read_csv(path, usecols=columns)
+    return pd.read_excel(path, usecols=columns)
+
+
+def _load_entry(file_name, path, signature, prepare, columns):
+    """Read a data file and apply the optional prepare step, or map the frame
+    the parent process shared (already prepared) if there is one."""
+    start = time.perf_counter()
+    df = attach(file_name, signature)
+    source = "shared memory" if df is not None else path.name
+    if df is None:
+        df = read_data_file(path, columns)
+        if prepare is not None:
+            df = prepare(df)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Loaded {file_name} from {source} ({len(df)} rows) in {elapsed:.3f}s")
+    entry = {
+        "df": df,
+        "signature": signature,
+        "appended": 0,
+        "version": (signature, 0),
+        "artifacts": {},
+    }
+    return entry, elapsed
+
+
+def _ensure_loaded(file_name, prepare, columns):
+    """Return (entry, True) if the cached dataset is current, or load it and
+    return (entry, False). Only one thread loads a given dataset at a time;
+    others asking for it wait for that load instead of starting their own."""
+    path = get_source_path(file_name)
+    signature = get_file_signature(path)
+    while True:
+        with _lock:
+            entry = _entries.get(file_name)
+            if entry is not None and entry["signature"] == signature:
+                return entry, True
+            loading = _loading.get(file_name)
+            if loading is None:
+                loading = _loading[file_name] = threading.Event()
+                break
+        loading.wait()
+
+    try:
+        entry, elapsed = _load_entry(file_name, path, signature, prepare, columns)
+        with _lock:
+            _entries[file_name] = entry
+            _stats["misses"] += 1
+            _stats["loads"] += 1
+            _stats["load_seconds"] += elapsed
+        return entry, False
+    finally:
+        with _lock:
+            del _loading[file_name]
+        loading.set()
+
+
+def get_dataset(file_name, prepare=None, columns=None):
+    """Return a session-safe view of a dataset in the data folder.
+    @param file_name: the file name inside the data folder, e.g. "orders.xlsx".
+    @param prepare: optional function applied once to the freshly loaded frame.
+    @param columns: optional list of the columns to load (default: all).
+    @returns: a shallow copy of the shared DataFrame.
+    """
+    entry, current = _ensure_loaded(file_name, prepare, columns)
+    with _lock:
+        if current:
+            _stats["hits"] += 1
+        # Shallow copy: sessions share the column data but new columns stay private.
+        return entry["df"].copy(deep=False)
+
+
+def refresh_dataset(file_name, prepare=None, columns=None):
+    """Load a dataset, or reload it if its file changed, without handing out a
+    copy. For util_refresh, which polls every few seconds: an unchanged file
+    counts as a check, not as a cache hit.
+    @returns: True if the dataset was (re)loaded.
+    """
+    _, current = _ensure_loaded(file_name, prepare, columns)
+    if current:
+        with _lock:
+            _stats["checks"] += 1
+    return not current
+
+
+class DatasetState:
+    """One version of a dataset together with the artifacts built from that frame.
+    Nothing in it changes once it is returned, so a session can keep filtering
+    with it while a newer version is being prepared."""
+
+    def __init__(self, file_name, version, df, artifacts):
+        self.file_name = file_name
+        self.version = version
+        self.df = df
+        self.artifacts = artifacts
+
+    def frame(self):
+        """Return a session-safe view of the frame (a shallow copy)."""
+        return self.df.copy(deep=False)
+
+
+def get_dataset_state(file_name, builders=None):
+    """Return the dataset as last loaded or appended to, without checking its
+    file, as a DatasetState. For sessions that util_refresh tells when the data
+    has changed.
+    @param builders: optional {key: builder} for objects derived from the
+    dataset (an index, a rollup, ...). Each builder is called with the shared
+    frame once per dataset version, so the artifacts all match the frame and
+    version. On reload they are dropped; on append_rows() an artifact with a
+    with_rows(rows) method is given just the new rows instead of being built
+    again. with_rows() must return a new object (or self when nothing changes),
+    as older DatasetStates keep theirs.
+    """
+    with _lock:
+        entry = _entries.get(file_name)
+        if entry is None:
+            raise KeyError(f"{file_name} has not been loaded yet")
+        artifacts = entry["artifacts"]
+        for key, builder in (builders or {}).items():
+            if key not in artifacts:
+                artifacts[key] = builder(entry["df"])
+        return DatasetState(file_name, entry["version"], entry["df"], dict(artifacts))
+
+
+def append_rows(file_name, rows, sort_by=None):
+    """Append already-prepared rows to a cached dataset without rereading the file.
+    @param sort_by: optional column the dataset is kept sorted by; the rows are
+    only re-sorted when the new ones arrive out of order.
+    @returns: the new dataset version.
+    """
+    with _lock:
+        entry = _entries[file_name]
+        old_df = entry["df"].copy(deep=False)
+        rows = _match_dtypes(rows, old_df)
+        df = pd.concat([old_df, rows], ignore_index=True)
+        if sort_by and len(old_df) and rows[sort_by].min() < old_df[sort_by].iloc[-1]:
+            df = df.sort_values(sort_by, kind="stable", ignore_index=True)
+
+        entry["df"] = df
+        entry["appended"] += len(rows)
+        entry["version"] = (entry["signature"], entry["appended"])
+        # Artifacts that can take new rows (rollups) are updated from just those
+        # rows; anything else (e.g. indexes) is rebuilt on next use.
+        entry["artifacts"] = {
+            key: artifact.with_rows(rows)
+            for key, artifact in entry["artifacts"].items()
+            if hasattr(artifact, "with_rows")
+        }
+        logger.info(f"Appended {len(rows)} rows to {file_name} ({len(df)} rows)")
+        return entry["version"]
+
+
+def get_dataset_version(file_name):
+    """Return a token that changes whenever the cached dataset is reloaded or
+    appended to. For a dataset that is not loaded yet, this is the version it
+    will have once loaded, so checking it never triggers a load."""
+    with _lock:
+        entry = _entries.get(file_name)
+        if entry is not None:
+            return entry["version"]
+    return (get_file_signature(get_source_path(file_name)), 0)
+
+
+def is_dataset_loaded(file_name):
+    with _lock:
+        return file_name in _entries
+
+
+def get_dataset_stats():
+    """Return a snapshot of cache hit/miss counts and total load time."""
+    with _lock:
+        stats = dict(_stats)
+        stats["datasets"] = {
+            name: len(entry["df"]) for name, entry in _entries.items()
+        }
+    return stats
+
+
+def clear_datasets():
+    """Forget every cached dataset so the next request reloads from disk."""
+    with _lock:
+        _entries.clear()
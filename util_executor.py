@@ -0,0 +1,188 @@
+"""
+Purpose: Run heavy filtering and chart building off the Shiny event loop.
+
+Shiny runs every session's reactive flush on one asyncio event loop, holding a
+single process-wide reactive lock. A slow effect in one session therefore stalls
+every other session, even if the effect awaits. An OffloadedTask moves the work
+out of the flush:
+
+    quantity_job = OffloadedTask("quantity_filter")
+
+    @reactive.Effect
+    def _():
+        ...  # read inputs as usual
+        quantity_job.submit(filters.select, ranges, categories, then=show_rows)
+
+submit() returns at once, so the flush (and the lock) is released. The function
+runs on a shared thread or process pool. When it finishes, then(result) is called
+back on the event loop under reactive.lock(), followed by reactive.flush(), so
+outputs that read what then() set are re-rendered and sent.
+
+- Superseded work is dropped: each task runs at most one job at a time, and a
+  job that is still waiting when a newer one is submitted never starts. Only
+  the latest result is ever passed to then().
+- Backpressure: at most EXECUTOR_MAX_PENDING jobs run in the pool at once
+  across all sessions. The rest wait on the event loop, where waiting is free
+  and a superseded job can simply be skipped.
+- Single flight: jobs submitted with the same key (by any session) while one
+  is running share that one run and its result, so when new data arrives and
+  every session asks for the same rows or traces, they are computed once:
+
+      quantity_job.submit(filters.select, ranges, categories, then=show_rows,
+                          key=("quantity_filter", version, inputs))
+
+Settings (environment variables):
+    CINTEL_EXECUTOR=thread        thread (default), process, or inline (run in the flush)
+    CINTEL_EXECUTOR_WORKERS=4     pool size (default: CPU count)
+    CINTEL_EXECUTOR_MAX_PENDING=8 jobs in the pool at once (default: 2 x workers)
+
+Threads suit numpy and pandas work, which releases the GIL for most of its time.
+In process mode the function and its arguments are pickled to a worker process,
+so it must be a module-level function or a method of a picklable object, and
+copying large frames can cost more than it saves.
+
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+from shiny import reactive
+
+from util_logger import setup_logger
+from util_metrics import current_session_id, record
+
+logger, logname = setup_logger(__name__)
+
+EXECUTOR_MODE = os.environ.get("CINTEL_EXECUTOR", "thread")
+EXECUTOR_WORKERS = int(os.environ.get("CINTEL_EXECUTOR_WORKERS", os.cpu_count() or 1))
+EXECUTOR_MAX_PENDING = int(
+    os.environ.get("CINTEL_EXECUTOR_MAX_PENDING", str(2 * EXECUTOR_WORKERS))
+)
+
+_pool = None
+_slots = None
+_in_flight = {}  # single-flight key -> asyncio.Future of the shared run
+
+
+def get_pool():
+    """Create the shared pool on first use."""
+    global _pool
+    if _pool is None:
+        if EXECUTOR_MODE == "process":
+            # spawn: forking a process that already runs threads is not safe.
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                EXECUTOR_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                EXECUTOR_WORKERS, thread_name_prefix="cintel-worker"
+            )
+        atexit.register(shutdown_pool)
+        logger.info(f"Started {EXECUTOR_MODE} pool with {EXECUTOR_WORKERS} workers")
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _get_slots():
+    # Created lazily so it belongs to the running event loop.
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(EXECUTOR_MAX_PENDING)
+    return _slots
+
+
+async def run_offloaded(fn, *args):
+    """Await fn(*args) on the pool, waiting for a free slot first."""
+    async with _get_slots():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_pool(), fn, *args)
+
+
+async def run_shared(key, fn, *args):
+    """Await fn(*args) on the pool, sharing one run between all callers that
+    pass the same key while it is in flight. A key must stand for the result,
+    e.g. (what is computed, dataset version, inputs)."""
+    future = _in_flight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(run_offloaded(fn, *args))
+        _in_flight[key] = future
+
+        def forget(done):
+            if _in_flight.get(key) is done:
+                del _in_flight[key]
+
+        future.add_done_callback(forget)
+    # A caller that gives up must not cancel the run the others wait for.
+    return await asyncio.shield(future)
+
+
+class OffloadedTask:
+    """One kind of background job for one session (e.g. its quantity filter)."""
+
+    def __init__(self, name):
+        self.name = name
+        self._generation = 0
+        self._running = None  # asyncio.Lock, created on first submit
+        self._tasks = set()
+
+    def submit(self, fn, *args, then, key=None):
+        """Start fn(*args) in the background and pass its result to then().
+        Any job submitted earlier that has not started yet is dropped.
+        @param key: optional single-flight key (see run_shared); jobs with the
+        same key share one run.
+        """
+        self._generation += 1
+        if EXECUTOR_MODE == "inline":
+            then(self._timed(fn, args, current_session_id()))
+            return
+        if self._running is None:
+            self._running = asyncio.Lock()
+        # The task copies the current context, so then() runs in this session.
+        task = asyncio.create_task(self._run(self._generation, fn, args, then, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def cancel(self):
+        """Drop any job not yet shown, e.g. when a cached result was used instead."""
+        self._generation += 1
+
+    def _timed(self, fn, args, session_id):
+        start = time.perf_counter()
+        result = fn(*args)
+        record(self.name, session_id, time.perf_counter() - start, 0)
+        return result
+
+    async def _run(self, generation, fn, args, then, key):
+        session_id = current_session_id()
+        async with self._running:
+            if generation != self._generation:
+                return  # a newer job was submitted while this one waited
+            start = time.perf_counter()
+            try:
+                if key is None:
+                    result = await run_offloaded(fn, *args)
+                else:
+                    result = await run_shared(key, fn, *args)
+            except Exception:
+                record(self.name, session_id, time.perf_counter() - start, 0, True)
+                logger.exception(f"{self.name} failed")
+                return
+            record(self.name, session_id, time.perf_counter() - start, 0)
+
+        async with reactive.lock():
+            if generation != self._generation:
+                return  # finished, but a newer job will replace it
+            try:
+                then(result)
+            except Exception:
+                logger.exception(f"{self.name} could not show its result")
+            await reactive.flush()
@@ -0,0 +1,209 @@
+"""
+Purpose: Download the filtered rows of a tab as CSV, Excel or Parquet.
+
+The export is streamed: rows are read EXPORT_CHUNK_ROWS at a time, each chunk
+is encoded and sent, and only then is the next one read. Server memory stays
+at about one chunk per download however many rows match, and the client
+starts receiving data at once. Reading and encoding run on a worker thread
+between chunks, so a large export doesn't hold up other sessions.
+
+    CSV      the header, then each chunk's lines
+    Parquet  one row group per chunk, then the footer
+    Excel    rows go to an openpyxl write-only workbook, which keeps them in
+             a temporary file rather than in memory. An xlsx file is a zip
+             archive, which can only be sent once it is complete, so it is
+             sent in chunks from disk at the end. A sheet holds at most
+             EXCEL_MAX_ROWS rows; more rows continue on further sheets.
+
+UI (in the *_ui_outputs.py modules):
+    get_export_controls("ORDERS", "orders_export")
+
+Server (in the *_server.py modules):
+    @session.download(filename=..., media_type=...)
+    def orders_export():
+        return stream_export(iter_view_chunks(reactive_view.get()), format, "orders_export")
+
+Settings (environment variables):
+    CINTEL_EXPORT_CHUNK_ROWS=50000   rows read and encoded at a time
+
+"""
+import asyncio
+import datetime
+import io
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+from shiny import ui
+
+from util_metrics import current_session_id, record
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("CINTEL_EXPORT_CHUNK_ROWS", "50000"))
+EXCEL_MAX_ROWS = 1_048_575  # plus the header row
+FILE_CHUNK_BYTES = 1024 * 1024
+
+# format -> (label, media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv", ".csv"),
+    "xlsx": (
+        "Excel",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".xlsx",
+    ),
+    "parquet": ("Parquet", "application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def get_export_controls(prefix, download_id):
+    """Return the format choice and download button for a tab's filtered rows."""
+    return ui.row(
+        ui.column(
+            4,
+            ui.input_select(
+                f"{prefix}_EXPORT_FORMAT",
+                "Export format",
+                choices={key: label for key, (label, _, _) in EXPORT_FORMATS.items()},
+            ),
+        ),
+        ui.column(
+            8,
+            ui.download_button(download_id, "Download filtered rows"),
+            style="padding-top: 32px;",
+        ),
+    )
+
+
+def get_export_filename(name, export_format):
+    """Return e.g. orders-20231231-1530.csv."""
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M")
+    return f"{name}-{stamp}{EXPORT_FORMATS[export_format][2]}"
+
+
+def get_export_media_type(export_format):
+    return EXPORT_FORMATS[export_format][1]
+
+
+def iter_view_chunks(view, columns=None, chunk_rows=None):
+    """Yield the rows of a FilteredView as DataFrames of at most chunk_rows rows."""
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    for start in range(0, max(len(view), 1), chunk_rows):
+        yield view.take(slice(start, min(start + chunk_rows, len(view))), columns)
+
+
+def _encode_csv(chunks):
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands over what was written since the last take()."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def take(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _encode_parquet(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+        writer.write_table(table)
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+    yield sink.take()
+
+
+def _encode_xlsx(chunks):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = EXCEL_MAX_ROWS
+    for chunk in chunks:
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows == EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Sheet{len(workbook.worksheets) + 1}")
+                sheet.append(list(chunk.columns))
+                sheet_rows = 0
+            sheet.append([_excel_value(value) for value in row])
+            sheet_rows += 1
+        yield b""  # give other work a turn between chunks
+    if sheet is None:
+        workbook.create_sheet("Sheet1")
+
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        for data in iter(lambda: file.read(FILE_CHUNK_BYTES), b""):
+            yield data
+
+
+def _excel_value(value):
+    """openpyxl writes numbers, strings and datetimes; numpy scalars become Python
+    ones and missing values (NaN, NaT) become empty cells."""
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+ENCODERS = {"csv": _encode_csv, "xlsx": _encode_xlsx, "parquet": _encode_parquet}
+
+
+async def stream_export(chunks, export_format, output_id="export"):
+    """Encode DataFrame chunks into a file, yielding the bytes as they are ready.
+    Each step runs on a worker thread; the event loop only sends the bytes."""
+    encoder = ENCODERS[export_format](chunks)
+    # If the client goes away, the step in flight keeps running on its thread;
+    # the lock makes close() wait for it there instead of failing here.
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(encoder, None)
+
+    def close():
+        with lock:
+            encoder.close()
+
+    session_id = current_session_id()
+    start = time.perf_counter()
+    sent = 0
+    failed = True
+    try:
+        while True:
+            data = await asyncio.to_thread(step)
+            if data is None:
+                break
+            if data:
+                sent += len(data)
+                yield data
+        failed = False
+    finally:
+        try:
+            asyncio.get_running_loop().run_in_executor(None, close)
+        finally:
+            record(output_id, session_id, time.perf_counter() - start, sent, failed)
@@ -0,0 +1,169 @@
+"""
+Purpose: Filter a shared DataFrame on several columns at once.
+
+Chaining boolean masks (df[mask1] then df[mask2] ...) builds an intermediate
+DataFrame for every step and compares every row each time. A FilterEngine is
+built once per dataset version and holds:
+
+- a sorted copy of each range column, so a range is two binary searches
+- a boolean bitmap (and the row positions) for each category value
+
+A query starts from the most selective predicate, checks the remaining
+predicates only on those candidate rows in one vectorized pass, and returns
+the matching row positions. Only the caller decides when to build a frame
+from them, using materialize(), or keeps them in a FilteredView so each output
+builds just the rows and columns it shows.
+
+Range columns can be any numeric or datetime64 column, so the same engine works
+for the Material Breakdown filters and the Orders date range.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+class FilterEngine:
+    """Precomputed indexes for fast multi-column filtering of one DataFrame."""
+
+    def __init__(self, df, range_columns=(), category_columns=()):
+        self.row_count = len(df)
+
+        # column -> (sort order, sorted values, values in row order)
+        self._ranges = {}
+        for column in range_columns:
+            values = df[column].to_numpy()
+            order = np.argsort(values, kind="stable")
+            self._ranges[column] = (order, values[order], values)
+
+        # column -> {category value: (bitmap, row positions)}
+        self._categories = {}
+        for column in category_columns:
+            codes, uniques = pd.factorize(df[column])
+            self._categories[column] = {}
+            for code, value in enumerate(uniques):
+                bitmap = codes == code
+                self._categories[column][value] = (bitmap, np.flatnonzero(bitmap))
+
+    def select(self, ranges=None, categories=None):
+        """Return the sorted row positions matching every predicate.
+        @param ranges: {column: (min, max)}; either bound may be None. Inclusive.
+        @param categories: {column: values to keep}.
+        @returns: a numpy array of row positions.
+        """
+        ranges = ranges or {}
+        categories = categories or {}
+
+        # Turn each predicate into a candidate set we can size cheaply.
+        seeds = []
+        for column, (low, high) in ranges.items():
+            order, sorted_values, _ = self._ranges[column]
+            lo = 0 if low is None else sorted_values.searchsorted(low, side="left")
+            hi = (
+                len(sorted_values)
+                if high is None
+                else sorted_values.searchsorted(high, side="right")
+            )
+            seeds.append((max(hi - lo, 0), "range", column, (order, lo, hi)))
+        for column, values in categories.items():
+            known = self._categories[column]
+            size = sum(len(known[v][1]) for v in values if v in known)
+            seeds.append((size, "category", column, None))
+
+        if not seeds:
+            return np.arange(self.row_count)
+
+        # Start from the smallest candidate set ...
+        seeds.sort(key=lambda seed: seed[0])
+        _, kind, column, detail = seeds[0]
+        if kind == "range":
+            order, lo, hi = detail
+            candidates = order[lo:hi]
+        else:
+            known = self._categories[column]
+            parts = [known[v][1] for v in categories[column] if v in known]
+            candidates = np.concatenate(parts) if parts else np.empty(0, np.intp)
+
+        # ... and test the rest only on those rows, in a single combined mask.
+        mask = np.ones(len(candidates), dtype=bool)
+        for _, kind, column, _ in seeds[1:]:
+            if kind == "range":
+                low, high = ranges[column]
+                values = self._ranges[column][2][candidates]
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+            else:
+                known = self._categories[column]
+                allowed = np.zeros(len(candidates), dtype=bool)
+                for value in categories[column]:
+                    if value in known:
+                        allowed |= known[value][0][candidates]
+                mask &= allowed
+
+        rows = np.sort(candidates[mask])
+        # Half the memory for the positions every session and cache entry holds.
+        return rows.astype(np.int32) if self.row_count < 2**31 else rows
+
+
+def materialize(df, rows, columns=None):
+    """Build a DataFrame from row positions returned by FilterEngine.select(),
+    or from a slice of positions."""
+    if columns is not None:
+        df = df[columns]
+    if isinstance(rows, slice):
+        return df.iloc[rows]  # a view, nothing is copied
+    return df.take(rows)
+
+
+class FilteredView:
+    """The result of a filter: the shared frame plus the selected row positions.
+
+    Sessions keep one of these instead of a filtered copy. Each output builds
+    only what it shows, e.g. one table page or the three columns a chart plots:
+
+        view = FilteredView(df, filters.select(...))
+        len(view)
+        view.frame(["material", "order_size_units"])
+        view.take(page_positions)
+
+    key optionally names the selection (e.g. its filter_cache key): views with
+    the same key hold the same rows, so work on them can be shared.
+    """
+
+    def __init__(self, df, rows=None, key=None):
+        self.df = df
+        # None: every row. A slice stays a slice, so a range costs no memory.
+        self.rows = slice(0, len(df)) if rows is None else rows
+        self.key = key
+
+    def __len__(self):
+        if isinstance(self.rows, slice):
+            return len(range(*self.rows.indices(len(self.df))))
+        return len(self.rows)
+
+    def positions(self):
+        """Return the selected rows as an array of positions in the shared frame."""
+        if isinstance(self.rows, slice):
+            return np.arange(*self.rows.indices(len(self.df)))
+        return self.rows
+
+    def column(self, name):
+        """Return the selected values of one column as a numpy array."""
+        return self.df[name].to_numpy()[self.rows]
+
+    def frame(self, columns=None):
+        """Build a DataFrame of the selected rows (and only the given columns)."""
+        return materialize(self.df, self.rows, columns)
+
+    def take(self, positions, columns=None):
+        """Build a DataFrame of some of the selected rows, by position in this view.
+        positions can be an array or a slice (e.g. an unsorted table page)."""
+        if isinstance(self.rows, slice):
+            start = self.rows.indices(len(self.df))[0]
+            if isinstance(positions, slice):
+                rows = slice(start + positions.start, start + positions.stop)
+            else:
+                rows = start + np.asarray(positions)
+            return materialize(self.df, rows, columns)
+        return materialize(self.df, self.rows[positions], columns)
@@ -1,21 +1,142 @@
 """
-Purpose: Set up logging once and reuse it. 
+Purpose: Set up logging once and reuse it.
 
 Author: Denise Case
 
-This file automatically records your work so you don't have to. 
+This file automatically records your work so you don't have to.
 Analysts and data scientists will work hard once, to be lazy later.
 You should be able to reuse this code without modification.
-You're also welcome to use it as a template for your own logging. 
+You're also welcome to use it as a template for your own logging.
+
+Loggers never write to disk themselves. Records go onto a queue, and a single
+background thread writes them, so logging from a reactive effect never stalls
+the Shiny event loop. Log files rotate by size (or daily) instead of being
+truncated on every start, and calling setup_logger twice for the same file
+does not add a second set of handlers.
+
+Settings (environment variables):
+    CINTEL_LOG_FORMAT=json        one JSON object per line instead of plain text
+    CINTEL_LOG_ROTATE=time        rotate at midnight instead of by size
+    CINTEL_LOG_MAX_BYTES=1048576  size limit per file when rotating by size
+    CINTEL_LOG_BACKUP_COUNT=5     rotated files to keep
 
 """
 
+import atexit
+import copy
+import datetime
+import functools
+import json
 import logging
+import logging.handlers
 import pathlib
 import platform
+import queue
 import sys
 import os
-import datetime
+
+LOG_FORMAT = os.environ.get("CINTEL_LOG_FORMAT", "text")
+LOG_ROTATE = os.environ.get("CINTEL_LOG_ROTATE", "size")
+LOG_MAX_BYTES = int(os.environ.get("CINTEL_LOG_MAX_BYTES", str(1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("CINTEL_LOG_BACKUP_COUNT", "5"))
+
+# Attributes every LogRecord has; anything else came from `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as one JSON object, including any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records with the traceback kept apart from the message.
+
+    The stock prepare() formats the record with a plain Formatter, folding
+    the traceback into `msg` and dropping `exc_info`, so the formatter on the
+    writer thread never sees the exception. Here the arguments are merged
+    into the message as before, but the traceback is kept in `exc_text`,
+    which both the text and the JSON formatters know how to write.
+    """
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _DispatchHandler(logging.Handler):
+    """Runs on the writer thread and hands each record to its logger's handlers."""
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+
+    def handle(self, record):
+        for handler in self.handlers.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+_queue = queue.SimpleQueue()
+_dispatcher = _DispatchHandler()
+_listener = None
+
+
+def _start_writer():
+    """Start the background writer thread (once per process)."""
+    global _listener
+    if _listener is None:
+        _listener = logging.handlers.QueueListener(_queue, _dispatcher)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out everything still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for handlers in _dispatcher.handlers.values():
+            for handler in handlers:
+                try:
+                    handler.flush()
+                except ValueError:
+                    pass  # the stream was already closed (e.g. by a test runner)
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment_lines():
+    """Describe the platform once per process rather than once per logger."""
+    return [
+        f"This file is running on: {os.name} {platform.system()} {platform.release()}",
+        f"The Python version is: {platform.python_version()}",
+        f"The active environment path is:   {sys.prefix}",
+        f"The current working directory is: {os.getcwd()}",
+    ]
 
 
 def get_source_directory_path(current_file):
@@ -24,6 +145,16 @@ def get_source_directory_path(current_file):
     return dir
 
 
+def _make_file_handler(log_file_name):
+    if LOG_ROTATE == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file_name, when="midnight", backupCount=LOG_BACKUP_COUNT
+        )
+    return logging.handlers.RotatingFileHandler(
+        log_file_name, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+    )
+
+
 def setup_logger(current_file):
     """Setup a logger to automatically log useful information.
     @param current_file: the name of the file requesting a logger.
@@ -36,10 +167,13 @@ def setup_logger(current_file):
     log_file_name = logs_dir.joinpath(module_name + ".log")
 
     logger = logging.getLogger(module_name)
+    if module_name in _dispatcher.handlers:
+        return logger, log_file_name  # already set up; don't add handlers twice
+
     logger.setLevel(logging.DEBUG)  # Set the root logger level.
 
     # Create file handler which logs even debug messages.
-    file_handler = logging.FileHandler(log_file_name, "w")
+    file_handler = _make_file_handler(log_file_name)
     file_handler.setLevel(logging.DEBUG)
 
     # Create console handler with a higher log level.
@@ -47,26 +181,25 @@ def setup_logger(current_file):
     console_handler.setLevel(logging.INFO)
 
     # Create formatter and add it to the handlers.
-    formatter = logging.Formatter("%(asctime)s.%(name)s.%(levelname)s %(message)s")
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s.%(name)s.%(levelname)s %(message)s")
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Add the handlers to the logger.
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # The handlers run on the writer thread; the logger only enqueues.
+    _dispatcher.handlers[module_name] = [file_handler, console_handler]
+    logger.addHandler(_QueueHandler(_queue))
+    _start_writer()
 
     divider_string = "============================================================="
-    python_version_string = platform.python_version()
     today = datetime.date.today()
 
     logger.info(divider_string)
     logger.info(f"Today is {today} at {datetime.datetime.now().strftime('%I:%M %p')}")
-    logger.info(
-        f"This file is running on: {os.name} {platform.system()} {platform.release()}"
-    )
-    logger.info(f"The Python version is: {python_version_string}")
-    logger.info(f"The active environment path is:   {sys.prefix}")
-    logger.info(f"The current working directory is: {os.getcwd()}")
+    for line in get_environment_lines():
+        logger.info(line)
     logger.info(divider_string)
 
     return logger, log_file_name
@@ -77,6 +210,7 @@ if __name__ == "__main__":
     logger.info("Starting util_logger.py")
     logger.info(f"Information is logged to: logs/{logname}")
     logger.info("Ending util_logger.py")
+    stop_logging()
 
     # Use built-in open() function to read log file and print it to the terminal
     with open(logname, "r") as file_wrapper:
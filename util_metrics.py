@@ -0,0 +1,207 @@
+"""
+Purpose: Record how long each reactive output takes, and serve it at /metrics.
+
+Wrap the function under each @render.* / @render_widget decorator, and each
+@reactive.Effect, with @timed. Every call records compute time, approximate
+payload size and invocation count per output ID and per session:
+
+    @output
+    @render.table
+    @timed
+    def orders_filtered_table():
+        ...
+
+    @reactive.Effect
+    @reactive.event(input.ORDERS_DATE_RANGE)
+    @timed("orders_filter")
+    def _():
+        ...
+
+app.py mounts metrics_endpoint next to the Shiny App, so the numbers can be
+scraped in the Prometheus text format:
+
+    curl http://127.0.0.1:8000/metrics
+
+Per-session series are dropped when the session ends; the per-output totals
+are kept for the life of the process.
+
+"""
+import functools
+import inspect
+import threading
+import time
+
+from util_cache import filter_cache
+from util_datasets import get_dataset_stats
+from util_snapshots import get_snapshot_stats
+
+_lock = threading.Lock()
+
+# (output id, session id or "all") -> counters
+_series = {}
+_tracked_sessions = set()
+
+
+def _new_counters():
+    return {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0}
+
+
+def estimate_payload_bytes(value):
+    """Approximate size of what an output returns (before Shiny serializes it)."""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):  # DataFrame
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, "get_html_string"):  # htmltools Tag / TagList
+        return len(value.get_html_string())
+    return 0
+
+
+def _is_silent(error):
+    """req() and unset inputs stop an output on purpose; that is not a failure."""
+    from shiny.types import SilentCancelOutputException, SilentException
+
+    return isinstance(error, (SilentException, SilentCancelOutputException))
+
+
+def current_session_id():
+    from shiny.session import get_current_session
+
+    session = get_current_session()
+    if session is None:
+        return None
+    if session.id not in _tracked_sessions:
+        _tracked_sessions.add(session.id)
+        session.on_ended(functools.partial(_forget_session, session.id))
+    return session.id
+
+
+def _forget_session(session_id):
+    with _lock:
+        _tracked_sessions.discard(session_id)
+        for key in [key for key in _series if key[1] == session_id]:
+            del _series[key]
+
+
+def record(output_id, session_id, seconds, payload_bytes, failed=False):
+    """Add one invocation to the per-session and per-output counters."""
+    with _lock:
+        for key in ((output_id, "all"), (output_id, session_id)):
+            if key[1] is None:
+                continue
+            counters = _series.setdefault(key, _new_counters())
+            counters["calls"] += 1
+            counters["errors"] += int(failed)
+            counters["seconds"] += seconds
+            counters["max_seconds"] = max(counters["max_seconds"], seconds)
+            counters["bytes"] += payload_bytes
+
+
+def timed(output_id=None):
+    """Decorator that records each call; use as @timed or @timed("name")."""
+    if callable(output_id):
+        return timed()(output_id)
+
+    def wrapper(fn):
+        name = output_id or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_timed(*args, **kwargs):
+                session_id = current_session_id()
+                start = time.perf_counter()
+                value, failed = None, False
+                try:
+                    value = await fn(*args, **kwargs)
+                    return value
+                except Exception as e:
+                    failed = not _is_silent(e)
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - start
+                    record(name, session_id, elapsed, estimate_payload_bytes(value), failed)
+
+            return async_timed
+
+        @functools.wraps(fn)
+        def sync_timed(*args, **kwargs):
+            session_id = current_session_id()
+            start = time.perf_counter()
+            value, failed = None, False
+            try:
+                value = fn(*args, **kwargs)
+                return value
+            except Exception as e:
+                failed = not _is_silent(e)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                record(name, session_id, elapsed, estimate_payload_bytes(value), failed)
+
+        return sync_timed
+
+    return wrapper
+
+
+def get_metrics():
+    """Return a copy of all counters keyed by (output id, session id)."""
+    with _lock:
+        return {key: dict(counters) for key, counters in _series.items()}
+
+
+def render_prometheus():
+    """Return all metrics in the Prometheus text exposition format."""
+    lines = []
+    metrics = get_metrics()
+
+    def family(name, kind, help_text, field):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (output_id, session_id), counters in sorted(metrics.items()):
+            labels = f'output="{output_id}",session="{session_id}"'
+            lines.append(f"{name}{{{labels}}} {counters[field]}")
+
+    family("cintel_output_calls_total", "counter", "Output invocations.", "calls")
+    family("cintel_output_errors_total", "counter", "Failed output invocations.", "errors")
+    family("cintel_output_seconds_total", "counter", "Compute time.", "seconds")
+    family("cintel_output_seconds_max", "gauge", "Slowest single call.", "max_seconds")
+    family("cintel_output_payload_bytes_total", "counter", "Approx. payload.", "bytes")
+
+    lines.append("# TYPE cintel_sessions gauge")
+    lines.append(f"cintel_sessions {len(_tracked_sessions)}")
+
+    datasets = get_dataset_stats()
+    lines.append("# TYPE cintel_dataset_cache_hits_total counter")
+    lines.append(f"cintel_dataset_cache_hits_total {datasets['hits']}")
+    lines.append("# TYPE cintel_dataset_cache_misses_total counter")
+    lines.append(f"cintel_dataset_cache_misses_total {datasets['misses']}")
+    lines.append("# TYPE cintel_dataset_checks_total counter")
+    lines.append(f"cintel_dataset_checks_total {datasets['checks']}")
+    lines.append("# TYPE cintel_dataset_load_seconds_total counter")
+    lines.append(f"cintel_dataset_load_seconds_total {datasets['load_seconds']}")
+    lines.append("# TYPE cintel_dataset_rows gauge")
+    for name, rows in sorted(datasets["datasets"].items()):
+        lines.append(f'cintel_dataset_rows{{dataset="{name}"}} {rows}')
+
+    filters = filter_cache.stats()
+    for field in ("entries", "bytes", "hits", "misses", "evictions"):
+        lines.append(f"# TYPE cintel_filter_cache_{field} gauge")
+        lines.append(f"cintel_filter_cache_{field} {filters[field]}")
+
+    snapshots = get_snapshot_stats()
+    for field in ("hits", "misses", "builds"):
+        lines.append(f"# TYPE cintel_snapshot_{field}_total counter")
+        lines.append(f"cintel_snapshot_{field}_total {snapshots[field]}")
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_endpoint(request):
+    """Starlette route handler for /metrics."""
+    from starlette.responses import PlainTextResponse
+
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
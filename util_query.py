@@ -0,0 +1,169 @@
+"""
+Purpose: Query large datasets with SQL instead of loading them into pandas.
+
+The Orders and Material Breakdown tabs load their whole dataset into memory once
+per process (util_datasets). A dataset too large for that is queried in place:
+an embedded DuckDB database reads the Parquet copy written by data/app_data.py.
+Filters go into the WHERE clause, and DuckDB skips row groups whose min/max
+statistics rule them out and reads only the columns a query names. Only the
+result (one table page, a few aggregates) comes back as a DataFrame.
+
+    version = get_table_version("records", "records.xlsx")  # registers the table
+    df = run_query("SELECT count(*) AS n FROM records WHERE Errors >= ?", [10])
+    for chunk in iter_query("SELECT * FROM records", chunk_rows=50_000): ...
+
+DuckDB holds at most CINTEL_QUERY_MEMORY_LIMIT and spills larger sorts and
+aggregations to CINTEL_QUERY_TEMP, so a dataset larger than memory can still be
+queried. Queries release the GIL; run them on the executor pool
+(util_executor.OffloadedTask) so a slow one doesn't hold up other sessions.
+
+If there is no current Parquet copy, the workbook is read into memory and
+queried the same way, which is fine for the small sample workbooks.
+
+Settings (environment variables):
+    CINTEL_QUERY_MEMORY_LIMIT=512MB   memory DuckDB may use before spilling to disk
+    CINTEL_QUERY_THREADS=2            threads per query
+    CINTEL_QUERY_TEMP=/tmp/cintel-duckdb  where spilled data goes
+
+"""
+import glob
+import os
+import pathlib
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from util_datasets import COLUMNAR_FOLDER, DATA_FOLDER, get_file_signature
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__name__)
+
+QUERY_MEMORY_LIMIT = os.environ.get("CINTEL_QUERY_MEMORY_LIMIT", "512MB")
+QUERY_THREADS = int(os.environ.get("CINTEL_QUERY_THREADS", "2"))
+QUERY_TEMP = os.environ.get(
+    "CINTEL_QUERY_TEMP", os.path.join(tempfile.gettempdir(), "cintel-duckdb")
+)
+
+# Every registered table also has these columns, which order its rows uniquely
+# (source file, then row within it). Paged queries end their ORDER BY with
+# them, so LIMIT/OFFSET pages never repeat or skip rows.
+ROW_ORDER = "filename, file_row_number"
+
+_connection = None
+_tables = {}  # table name -> signature of the files it reads
+_lock = threading.Lock()
+
+
+def get_connection():
+    """Open the process-wide in-memory DuckDB database on first use."""
+    global _connection
+    if _connection is None:
+        import duckdb
+
+        _connection = duckdb.connect(
+            ":memory:",
+            config={
+                "memory_limit": QUERY_MEMORY_LIMIT,
+                "threads": QUERY_THREADS,
+                "temp_directory": QUERY_TEMP,
+            },
+        )
+        logger.info(f"Opened DuckDB {duckdb.__version__} (memory limit {QUERY_MEMORY_LIMIT})")
+    return _connection
+
+
+def get_query_source(file_name):
+    """Return the Parquet copy of a data file if it is current, else the file itself."""
+    path = DATA_FOLDER.joinpath(file_name)
+    parquet = COLUMNAR_FOLDER.joinpath(pathlib.Path(file_name).stem + ".parquet")
+    try:
+        parquet_mtime = parquet.stat().st_mtime_ns
+    except FileNotFoundError:
+        return path
+    if path.exists() and parquet_mtime < path.stat().st_mtime_ns:
+        return path
+    return parquet
+
+
+def _get_signature(source):
+    """Signature of a file, or of every file matching a glob pattern."""
+    paths = sorted(glob.glob(str(source))) or [source]
+    return tuple(get_file_signature(path) for path in paths)
+
+
+def _sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _register(name, source):
+    connection = get_connection()
+    connection.execute(f'DROP VIEW IF EXISTS "{name}"')
+    connection.execute(f'DROP TABLE IF EXISTS "{name}"')
+    if str(source).endswith(".parquet"):
+        # A view, not a copy: every query scans the files as they are now.
+        connection.execute(
+            f'CREATE VIEW "{name}" AS SELECT * FROM read_parquet('
+            f"{_sql_string(source)}, filename = true, file_row_number = true)"
+        )
+    else:
+        if str(source).endswith(".csv"):
+            df = pd.read_csv(source)
+        else:
+            df = pd.read_excel(source)
+        df = df.drop(columns=["Unnamed: 0"], errors="ignore")
+        df["filename"] = str(source)
+        df["file_row_number"] = np.arange(len(df))
+        connection.register("_source_frame", df)
+        connection.execute(f'CREATE TABLE "{name}" AS SELECT * FROM _source_frame')
+        connection.unregister("_source_frame")
+    logger.info(f"Registered table {name} on {source}")
+
+
+def get_source_signature(file_name, source=None):
+    """Return a token that changes whenever the files a table reads change.
+    Cheap: it only looks at file modification times and sizes."""
+    source = source or get_query_source(file_name)
+    return (str(source), _get_signature(source))
+
+
+def get_table_version(name, file_name, source=None):
+    """Make the table name query the data file (re-registering it if the file
+    changed) and return a token that changes whenever the data does.
+    @param source: optional Parquet file or glob pattern to query instead, for
+    data kept outside the data folder (e.g. one file per month).
+    """
+    source = source or get_query_source(file_name)
+    signature = get_source_signature(file_name, source)
+    with _lock:
+        if _tables.get(name) != signature:
+            _register(name, source)
+            _tables[name] = signature
+    return signature
+
+
+def run_query(sql, params=None):
+    """Run a query and return its result as a DataFrame. Safe to call from any thread."""
+    cursor = get_connection().cursor()
+    try:
+        return cursor.execute(sql, params or []).df()
+    finally:
+        cursor.close()
+
+
+def iter_query(sql, params=None, chunk_rows=100_000):
+    """Yield the result of a query as DataFrames of at most chunk_rows rows,
+    fetching each only when the previous one has been used (e.g. for exports)."""
+    cursor = get_connection().cursor()
+    try:
+        reader = cursor.execute(sql, params or []).fetch_record_batch(chunk_rows)
+        empty = True
+        for batch in reader:
+            empty = False
+            yield batch.to_pandas()
+        if empty:
+            # Still yield the columns, e.g. for the header of an export.
+            yield reader.schema.empty_table().to_pandas()
+    finally:
+        cursor.close()
@@ -0,0 +1,186 @@
+"""
+Purpose: Reactive helpers shared by the server modules.
+
+Dragging a slider or typing into a numeric input sends a new value for every
+intermediate position. Without rate limiting, each one runs a full refilter and
+re-renders every table and chart in turn, and the server falls behind the user.
+
+- debounce(secs): wait until the input has been still for secs, then fire once
+  with the latest value
+- throttle(secs): fire at most once every secs, always ending on the latest value
+- rate_limit(): whichever of the two FILTER_RATE_MODE selects, with
+  FILTER_DELAY_SECONDS
+
+Superseded values are dropped before any work starts, so only the latest input
+state is ever filtered and rendered. Both wrap a reactive.Calc:
+
+    @rate_limit()
+    @reactive.Calc
+    def quantity_filter_inputs():
+        return (input.TIME_RANGE(), input.QUANTITY_MAX())
+
+Based on the debounce/throttle recipes in the Shiny for Python docs.
+
+Most sessions land on the Home tab. tab_active() lets a server module wait until
+its navbar tab is first shown before loading, filtering or building widgets:
+
+    orders_active = tab_active(input, "Orders")
+    ...
+    req(orders_active())
+
+With SUSPEND_HIDDEN_TABS the work also pauses whenever the tab is hidden again.
+lazy() defers building an object (such as a chart widget) until first use.
+
+"""
+import os
+import time
+
+from shiny import reactive
+
+FILTER_RATE_MODE = os.environ.get("CINTEL_FILTER_RATE_MODE", "debounce")
+FILTER_DELAY_SECONDS = float(os.environ.get("CINTEL_FILTER_DELAY_SECONDS", "0.3"))
+SUSPEND_HIDDEN_TABS = os.environ.get("CINTEL_SUSPEND_HIDDEN_TABS", "0") == "1"
+
+# The id given to ui.page_navbar in app.py.
+NAV_ID = "NAV_TAB"
+
+
+def debounce(delay_secs):
+    """Only pass a value on after it has stopped changing for delay_secs."""
+
+    def wrapper(calc):
+        when = reactive.Value(None)
+        trigger = reactive.Value(0)
+        primed = [False]
+
+        @reactive.Calc
+        def cached():
+            return calc()
+
+        @reactive.Effect(priority=102)
+        def primer():
+            try:
+                cached()
+            except Exception:
+                # Errors (and missing inputs) surface when the value is read.
+                if primed[0]:
+                    when.set(time.time() + delay_secs)
+                return
+            if primed[0]:
+                # Every change pushes the deadline back.
+                when.set(time.time() + delay_secs)
+            else:
+                # The first complete value goes straight through.
+                primed[0] = True
+                with reactive.isolate():
+                    trigger.set(trigger() + 1)
+
+        @reactive.Effect(priority=101)
+        def timer():
+            deadline = when()
+            if deadline is None:
+                return
+            time_left = deadline - time.time()
+            if time_left <= 0:
+                with reactive.isolate():
+                    when.set(None)
+                    trigger.set(trigger() + 1)
+            else:
+                reactive.invalidate_later(time_left)
+
+        @reactive.Calc
+        @reactive.event(trigger, ignore_none=False)
+        def debounced():
+            return cached()
+
+        return debounced
+
+    return wrapper
+
+
+def throttle(delay_secs):
+    """Pass values on at most once per delay_secs, ending with the latest one."""
+
+    def wrapper(calc):
+        pending = reactive.Value(False)
+        trigger = reactive.Value(0)
+        last_fired = [0.0]
+
+        @reactive.Calc
+        def cached():
+            return calc()
+
+        @reactive.Effect(priority=102)
+        def primer():
+            try:
+                cached()
+            except Exception:
+                pass
+            finally:
+                pending.set(True)
+
+        @reactive.Effect(priority=101)
+        def timer():
+            if not pending():
+                return
+            time_left = last_fired[0] + delay_secs - time.time()
+            if time_left <= 0:
+                last_fired[0] = time.time()
+                with reactive.isolate():
+                    pending.set(False)
+                    trigger.set(trigger() + 1)
+            else:
+                reactive.invalidate_later(time_left)
+
+        @reactive.Calc
+        @reactive.event(trigger, ignore_none=False)
+        def throttled():
+            return cached()
+
+        return throttled
+
+    return wrapper
+
+
+def rate_limit(delay_secs=None, mode=None):
+    """Return debounce or throttle as configured for the filter inputs."""
+    delay_secs = FILTER_DELAY_SECONDS if delay_secs is None else delay_secs
+    mode = mode or FILTER_RATE_MODE
+    if delay_secs <= 0:
+        return lambda calc: calc
+    return throttle(delay_secs) if mode == "throttle" else debounce(delay_secs)
+
+
+def tab_active(input, tab, suspend_when_hidden=None):
+    """Return a reactive.Calc that is True once tab has been shown.
+    With suspend_when_hidden it is only True while tab is the selected one.
+    """
+    if suspend_when_hidden is None:
+        suspend_when_hidden = SUSPEND_HIDDEN_TABS
+    shown = reactive.Value(False)
+
+    @reactive.Effect(priority=200)
+    def _():
+        if input[NAV_ID]() == tab:
+            shown.set(True)
+
+    @reactive.Calc
+    def active():
+        if suspend_when_hidden:
+            return input[NAV_ID]() == tab
+        return shown()
+
+    return active
+
+
+def lazy(factory):
+    """Return a function that calls factory() once, on first use, and then
+    keeps returning that same object."""
+    made = []
+
+    def get():
+        if not made:
+            made.append(factory())
+        return made[0]
+
+    return get
@@ -0,0 +1,132 @@
+"""
+Purpose: Refresh each dataset once per process and tell every session when it changed.
+
+Each session used to watch the data files itself. When a workbook changed or
+rows were streamed in, every open session noticed at the same moment and ran
+the whole pipeline, load, reindex and rollups included, at once. A DatasetFeed
+does the work every session shares, once per process:
+
+1. every STREAM_POLL_SECONDS, on a worker thread, reload the file if it
+   changed and append any streamed rows (util_datasets, util_streaming);
+2. build the artifacts the tabs use (filter indexes, rollups) and the default
+   snapshot (util_snapshots) for the new version;
+3. publish the new version to the subscribed sessions, all in one reactive flush.
+
+A session subscribes once its tab is shown and gets a reactive.Value holding a
+util_datasets.DatasetState: the frame, its version and the artifacts built from
+that frame. A session uses only what its state holds (never the latest shared
+artifacts), so rows appended before the next publish cannot mix with the frame
+it is showing. Only its own filters, which depend on its inputs, run when the
+value changes, and identical filters in different sessions share one run
+(single flight, see util_executor.run_shared).
+
+    orders_feed = DatasetFeed("orders.xlsx", prepare_orders, ORDERS_COLUMNS,
+                              artifacts={"rollup": OrdersCube.from_frame})
+
+    orders_state = orders_feed.subscribe(session, orders_active)
+
+    @reactive.Calc
+    def orders_data():
+        req(orders_state())  # None until the first load
+        return orders_state().frame()
+
+The refresh loop runs only while some session is subscribed.
+
+"""
+import asyncio
+import time
+
+from shiny import reactive
+
+from util_datasets import get_dataset_state, refresh_dataset
+from util_logger import setup_logger
+from util_metrics import record
+from util_snapshots import get_snapshot, put_snapshot
+from util_streaming import STREAM_POLL_SECONDS, poll_stream
+
+logger, logname = setup_logger(__name__)
+
+
+class DatasetFeed:
+    """One dataset's refresh loop and the sessions subscribed to it."""
+
+    def __init__(self, file_name, prepare=None, columns=None, artifacts=None, snapshot=None):
+        """
+        @param prepare, columns: as passed to util_datasets.get_dataset().
+        @param artifacts: {key: builder} for get_dataset_state(), built in order.
+        @param snapshot: optional function building the default-state snapshot
+        from a DatasetState.
+        """
+        self.file_name = file_name
+        self.prepare = prepare
+        self.columns = columns
+        self.artifacts = artifacts or {}
+        self.snapshot = snapshot
+        self.state = None
+        self._subscribers = set()  # one reactive.Value per subscribed session
+        self._task = None
+
+    def refresh(self):
+        """Bring the dataset, its artifacts and its snapshot up to date and
+        return its DatasetState. Runs on a worker thread, since the shared frame
+        lives in this process (even with CINTEL_EXECUTOR=process)."""
+        refresh_dataset(self.file_name, self.prepare, self.columns)
+        poll_stream(self.file_name)
+        state = get_dataset_state(self.file_name, self.artifacts)
+        if self.snapshot is not None and (
+            get_snapshot(self.file_name, version=state.version) is None
+        ):
+            put_snapshot(self.file_name, state.version, self.snapshot(state))
+        return state
+
+    def subscribe(self, session, active=None):
+        """Return a reactive.Value holding the DatasetState (None until loaded),
+        set again whenever the data changes.
+        @param active: optional reactive function (e.g. from util_reactive.tab_active);
+        the session is subscribed only while it returns True.
+        """
+        value = reactive.Value(None)
+
+        @reactive.Effect
+        def _():
+            if active is not None and not active():
+                self._subscribers.discard(value)
+                return
+            self._subscribers.add(value)
+            if self.state is not None:
+                value.set(self.state)
+            self._start()
+
+        session.on_ended(lambda: self._subscribers.discard(value))
+        return value
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        name = self.file_name.rsplit(".", 1)[0]
+        while self._subscribers:
+            start = time.perf_counter()
+            try:
+                state = await asyncio.to_thread(self.refresh)
+            except Exception:
+                record(f"{name}_refresh", None, time.perf_counter() - start, 0, True)
+                logger.exception(f"Could not refresh {self.file_name}")
+            else:
+                if self.state is None or state.version != self.state.version:
+                    record(f"{name}_refresh", None, time.perf_counter() - start, 0)
+                    self.state = state
+                    await self._publish(state)
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    async def _publish(self, state):
+        """Tell every subscribed session, then run their updates in one flush."""
+        async with reactive.lock():
+            for value in list(self._subscribers):
+                value.set(state)
+            await reactive.flush()
+        logger.info(
+            f"Published {self.file_name} version {state.version} "
+            f"to {len(self._subscribers)} sessions"
+        )
@@ -0,0 +1,247 @@
+"""
+Purpose: Answer summary questions from small pre-aggregated cubes, not rows.
+
+Most management questions are totals: orders per month, year or department,
+or how long each material takes to complete by order size. Each cube is built
+once per dataset version (as a util_datasets artifact), holds one dense numpy array of
+buckets, and answers range and group-by queries by slicing and summing that
+array. The cost depends on the number of buckets, not on the number of rows.
+
+    OrdersCube    Number of Orders (and row count) by month x Department
+    QuantityCube  row count by material x order size bucket x hours to complete
+                  (each distinct hours value is its own bucket, so a time range
+                  keeps exactly the rows the table filter keeps)
+
+When rows are streamed in (util_datasets.append_rows), the cube is updated
+with with_rows() from just the new rows instead of being rebuilt.
+
+Usage:
+    state = get_dataset_state("orders.xlsx", {"rollup": OrdersCube.from_frame})
+    cube = state.artifacts["rollup"]
+    cube.by_department(start_date, end_date)
+    get_kpi_row([("Total orders", f"{cube.kpis(start, end)['total_orders']:,}")])
+
+"""
+import numpy as np
+import pandas as pd
+from shiny import ui
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+               "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+SIZE_BUCKET_UNITS = 10_000
+
+
+def _union(first, second):
+    """Keep the order of first and add anything new from second."""
+    return list(first) + [value for value in second if value not in set(first)]
+
+
+def _embed(array, axes, new_axes):
+    """Place array (indexed by axes) into a zero array indexed by new_axes."""
+    result = np.zeros(tuple(len(axis) for axis in new_axes) + array.shape[len(axes):],
+                      dtype=array.dtype)
+    positions = []
+    for axis, new_axis in zip(axes, new_axes):
+        index = {value: i for i, value in enumerate(new_axis)}
+        positions.append([index[value] for value in axis])
+    result[np.ix_(*positions)] = array
+    return result
+
+
+class OrdersCube:
+    """Orders summed by calendar month (rows) and department (columns)."""
+
+    def __init__(self, first_year, years, departments, totals, counts):
+        self.first_year = first_year
+        self.years = years
+        self.departments = departments
+        self.totals = totals  # shape (years * 12, departments)
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from a prepared orders frame (with the Date column)."""
+        if not len(df):
+            return cls(0, 0, [], np.zeros((0, 0), np.int64), np.zeros((0, 0), np.int64))
+        years = df["Date"].dt.year.to_numpy()
+        first_year = int(years.min())
+        year_count = int(years.max()) - first_year + 1
+        months = (years - first_year) * 12 + df["Date"].dt.month.to_numpy() - 1
+        department_codes, departments = pd.factorize(df["Department"])
+
+        totals = np.zeros((year_count * 12, len(departments)), dtype=np.int64)
+        counts = np.zeros_like(totals)
+        np.add.at(totals, (months, department_codes), df["Number of Orders"].to_numpy())
+        np.add.at(counts, (months, department_codes), 1)
+        return cls(first_year, year_count, list(departments), totals, counts)
+
+    def with_rows(self, rows):
+        """Return a new cube that also counts rows (e.g. newly streamed ones)."""
+        other = OrdersCube.from_frame(rows)
+        if not self.years:
+            return other
+        if not other.years:
+            return self
+        first_year = min(self.first_year, other.first_year)
+        last_year = max(self.first_year + self.years, other.first_year + other.years)
+        departments = _union(self.departments, other.departments)
+        months = range(first_year * 12, last_year * 12)
+
+        def combined(name):
+            arrays = []
+            for cube in (self, other):
+                cube_months = range(cube.first_year * 12, (cube.first_year + cube.years) * 12)
+                arrays.append(
+                    _embed(getattr(cube, name), [cube_months, cube.departments],
+                           [months, departments])
+                )
+            return arrays[0] + arrays[1]
+
+        return OrdersCube(first_year, last_year - first_year, departments,
+                          combined("totals"), combined("counts"))
+
+    def _month_bounds(self, start, end):
+        """Return (lo, hi) so months lo..hi-1 start within start..end (inclusive),
+        the same months the Date filter keeps."""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        lo = (start.year - self.first_year) * 12 + start.month - 1
+        if start.day > 1:
+            lo += 1  # that month began before start
+        hi = (end.year - self.first_year) * 12 + end.month
+        return min(max(lo, 0), len(self.totals)), min(max(hi, 0), len(self.totals))
+
+    def monthly_totals(self, start, end):
+        """Return a Series of orders per month, indexed by labels like "2015-Jan"."""
+        lo, hi = self._month_bounds(start, end)
+        labels = [
+            f"{self.first_year + month // 12}-{MONTH_NAMES[month % 12]}"
+            for month in range(lo, max(lo, hi))
+        ]
+        return pd.Series(self.totals[lo:hi].sum(axis=1), index=labels)
+
+    def by_year_and_department(self, start, end):
+        """Return a frame of orders with one row per year and one column per department."""
+        lo, hi = self._month_bounds(start, end)
+        if not self.years or lo >= hi:
+            return pd.DataFrame(columns=self.departments, dtype=np.int64)
+        selected = np.zeros_like(self.totals)
+        selected[lo:hi] = self.totals[lo:hi]
+        yearly = selected.reshape(self.years, 12, -1).sum(axis=1)
+        table = pd.DataFrame(
+            yearly,
+            index=range(self.first_year, self.first_year + self.years),
+            columns=self.departments,
+        )
+        return table[table.sum(axis=1) > 0]
+
+    def by_department(self, start, end):
+        lo, hi = self._month_bounds(start, end)
+        return pd.Series(self.totals[lo:hi].sum(axis=0), index=self.departments)
+
+    def kpis(self, start, end):
+        """Return headline numbers for the date range."""
+        monthly = self.monthly_totals(start, end)
+        departments = self.by_department(start, end)
+        total = int(monthly.sum())
+        return {
+            "total_orders": total,
+            "months": len(monthly),
+            "average_per_month": total / len(monthly) if len(monthly) else 0.0,
+            "busiest_month": monthly.idxmax() if total else None,
+            "top_department": departments.idxmax() if total else None,
+        }
+
+
+class QuantityCube:
+    """Row counts by material x order size bucket x hours to complete."""
+
+    def __init__(self, materials, size_buckets, hours, counts):
+        self.materials = materials
+        self.size_buckets = size_buckets  # lower edge of each bucket, in units
+        self.hours = hours  # the distinct hours values, ascending
+        self.counts = counts  # shape (materials, size buckets, hours)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from a quantity frame."""
+        material_codes, materials = pd.factorize(df["material"])
+        size_codes = (df["order_size_units"].to_numpy() // SIZE_BUCKET_UNITS).astype(int)
+        if not len(df):
+            return cls([], [], [], np.zeros((0, 0, 0), np.int64))
+        hours, hour_codes = np.unique(
+            df["time_to_complete_hrs"].to_numpy(dtype=float), return_inverse=True
+        )
+
+        size_low = int(size_codes.min())
+        counts = np.zeros(
+            (len(materials), int(size_codes.max()) - size_low + 1, len(hours)),
+            dtype=np.int64,
+        )
+        np.add.at(counts, (material_codes, size_codes - size_low, hour_codes), 1)
+        size_buckets = [
+            (size_low + i) * SIZE_BUCKET_UNITS for i in range(counts.shape[1])
+        ]
+        return cls(list(materials), size_buckets, hours.tolist(), counts)
+
+    def with_rows(self, rows):
+        """Return a new cube that also counts rows (e.g. newly streamed ones)."""
+        other = QuantityCube.from_frame(rows)
+        if not self.materials:
+            return other
+        if not other.materials:
+            return self
+        materials = _union(self.materials, other.materials)
+        size_buckets = sorted(set(self.size_buckets) | set(other.size_buckets))
+        size_buckets = list(range(size_buckets[0], size_buckets[-1] + 1, SIZE_BUCKET_UNITS))
+        hours = sorted(set(self.hours) | set(other.hours))
+        axes = [materials, size_buckets, hours]
+        counts = sum(
+            _embed(cube.counts, [cube.materials, cube.size_buckets, cube.hours], axes)
+            for cube in (self, other)
+        )
+        return QuantityCube(materials, size_buckets, hours, counts)
+
+    def _select(self, time_min, time_max, materials):
+        """Counts for the chosen materials with time_min <= hours <= time_max."""
+        hours = np.asarray(self.hours)
+        keep_hours = (hours >= time_min) & (hours <= time_max)
+        keep_materials = [i for i, m in enumerate(self.materials) if m in set(materials)]
+        return self.counts[keep_materials][:, :, keep_hours], hours[keep_hours], keep_materials
+
+    def by_size_and_material(self, time_min, time_max, materials):
+        """Return a frame of row counts: one row per size bucket, one column per material."""
+        counts, _, keep = self._select(time_min, time_max, materials)
+        table = pd.DataFrame(
+            counts.sum(axis=2).T,
+            index=[f"{low // 1000}k-{(low + SIZE_BUCKET_UNITS) // 1000}k"
+                   for low in self.size_buckets],
+            columns=[self.materials[i] for i in keep],
+        )
+        return table
+
+    def kpis(self, time_min, time_max, materials):
+        """Return the row count and average hours to complete per material."""
+        counts, hours, keep = self._select(time_min, time_max, materials)
+        by_hours = counts.sum(axis=1)  # (materials, hours)
+        rows = by_hours.sum(axis=1)
+        average_hours = {
+            self.materials[i]: float((by_hours[j] * hours).sum() / rows[j])
+            for j, i in enumerate(keep)
+            if rows[j]
+        }
+        return {"orders": int(rows.sum()), "average_hours": average_hours}
+
+
+def get_kpi_row(items):
+    """Return a row of headline numbers; items is a list of (label, value text)."""
+    return ui.row(
+        *[
+            ui.column(
+                12 // max(len(items), 1),
+                ui.h4(value),
+                ui.p(label, class_="text-muted"),
+            )
+            for label, value in items
+        ]
+    )
@@ -0,0 +1,175 @@
+"""
+Purpose: Share prepared datasets between worker processes through shared memory.
+
+In multi-worker mode (see util_workers.py) the parent process loads and
+prepares each dataset once, then copies its column buffers into one shared
+memory block per dataset with publish(). It writes a small JSON manifest
+describing the block and its columns, and passes the manifest's path to the
+workers in CINTEL_SHARED_DATA. In a worker, util_datasets calls attach() instead
+of reading the data file. attach() builds a DataFrame whose columns point
+straight into the shared block, so N workers hold one copy of the data rather
+than N.
+
+Supported columns are numbers, booleans, dates and categoricals (codes are
+shared; the categories, which are few, are stored in the manifest). That covers
+everything compact_frame() produces. Any other column is shared as a
+categorical.
+
+Attached frames are read-only. Copy-on-write pandas (see util_datasets) copies a
+column before anything writes to it, and rows appended in live mode go into a
+new frame local to that worker.
+
+The parent's publish() owns the blocks and removes them with unlink_all() on
+shutdown. Workers only map them.
+
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from multiprocessing import resource_tracker, shared_memory
+
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__name__)
+
+SHARED_DATA_ENV = "CINTEL_SHARED_DATA"
+ALIGNMENT = 64
+
+# Blocks this process created (parent) or mapped (worker), by block name.
+_blocks = {}
+_manifest = None
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _describe(series):
+    """Return (column description, numpy array to copy into the block)."""
+    values = series.array
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        description = {
+            "kind": "categorical",
+            "categories": [
+                value.isoformat() if hasattr(value, "isoformat") else value
+                for value in categories.tolist()
+            ],
+            "categories_dtype": str(categories.dtype),
+            "ordered": bool(series.cat.ordered),
+        }
+        return description, np.asarray(series.cat.codes)
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        array = np.asarray(values)
+        return {"kind": "datetime", "dtype": str(array.dtype)}, array.view("int64")
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf":
+        return {"kind": "numeric", "dtype": str(series.dtype)}, np.asarray(values)
+    return _describe(series.astype("category"))
+
+
+def publish(file_name, df, signature):
+    """Copy a prepared frame into a new shared memory block.
+    @param signature: the signature of the data file df was loaded from.
+    @returns: the manifest entry describing the block.
+    """
+    columns = []
+    arrays = []
+    offset = 0
+    for name in df.columns:
+        description, array = _describe(df[name])
+        array = np.ascontiguousarray(array)
+        description.update(
+            name=name, offset=offset, array_dtype=str(array.dtype), nbytes=array.nbytes
+        )
+        columns.append(description)
+        arrays.append(array)
+        offset = _aligned(offset + array.nbytes)
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for description, array in zip(columns, arrays):
+        target = np.ndarray(
+            array.shape, array.dtype, buffer=block.buf, offset=description["offset"]
+        )
+        target[:] = array
+    _blocks[block.name] = block
+    logger.info(f"Published {file_name} ({len(df)} rows, {offset} bytes) as {block.name}")
+    return {
+        "block": block.name,
+        "rows": len(df),
+        "signature": list(signature),
+        "columns": columns,
+    }
+
+
+def write_manifest(entries, path):
+    """Write the manifest workers read; entries map file name to publish() results."""
+    with open(path, "w") as file:
+        json.dump(entries, file)
+
+
+def unlink_all():
+    """Remove every block this process published."""
+    for block in _blocks.values():
+        try:
+            block.close()
+            block.unlink()
+        except (BufferError, FileNotFoundError):
+            pass
+    _blocks.clear()
+
+
+def get_manifest():
+    """Return the manifest named in CINTEL_SHARED_DATA, or {} when not a worker."""
+    global _manifest
+    if _manifest is None:
+        path = os.environ.get(SHARED_DATA_ENV)
+        _manifest = {}
+        if path:
+            with open(path) as file:
+                _manifest = json.load(file)
+    return _manifest
+
+
+def _open_block(name):
+    """Map an existing block without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        # Otherwise this process's resource tracker would remove the block when
+        # the worker exits, while the parent and other workers still use it.
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+def _column(block, rows, description):
+    array = np.ndarray(
+        (rows,), np.dtype(description["array_dtype"]), buffer=block.buf,
+        offset=description["offset"],
+    )
+    array.flags.writeable = False
+    if description["kind"] == "categorical":
+        categories = pd.Index(description["categories"], dtype=description["categories_dtype"])
+        dtype = pd.CategoricalDtype(categories, ordered=description["ordered"])
+        return pd.Categorical.from_codes(array, dtype=dtype, validate=False)
+    if description["kind"] == "datetime":
+        return array.view(description["dtype"])
+    return array
+
+
+def attach(file_name, signature):
+    """Return the shared frame for a dataset, or None if it is not shared
+    or the data file has changed since it was published."""
+    entry = get_manifest().get(file_name)
+    if entry is None or tuple(entry["signature"]) != tuple(signature):
+        return None
+    block = _blocks.get(entry["block"])
+    if block is None:
+        block = _blocks[entry["block"]] = _open_block(entry["block"])
+    columns = {
+        description["name"]: _column(block, entry["rows"], description)
+        for description in entry["columns"]
+    }
+    return pd.DataFrame(columns, copy=False)
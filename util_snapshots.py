@@ -0,0 +1,90 @@
+"""
+Purpose: Compute the default state of a tab once per dataset version and reuse it.
+
+Every session opens the Orders and Material Breakdown tabs with the inputs set
+in orders_ui_inputs.py and quantity_ui_inputs.py. Each one used to select the
+same rows, build the same chart traces and render the same first table page.
+A snapshot holds those results for one dataset version:
+
+- view: the selected rows (a util_filters.FilteredView of the shared frame)
+- charts: what the chart builders returned for them, ready for update_figure()
+- table_html: the first table page, rendered with the default page size
+
+The first session at the default inputs builds it on the executor pool; every
+later session gets it from this process-wide store, so its first chart and
+table are a dictionary lookup. The store keeps one snapshot per dataset and
+drops it when the dataset version changes (the file was reloaded or rows were
+streamed in), so the next session builds it again from the new data.
+
+    snapshot = get_snapshot("orders.xlsx", version=version)  # None until built
+    put_snapshot("orders.xlsx", version, build_orders_snapshot(df))
+    snapshot = get_snapshot("orders.xlsx", view)  # only if view is its view
+
+Snapshots are shared, so nothing in one may be changed after it is stored.
+
+"""
+import threading
+
+from util_datasets import get_dataset_version
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__name__)
+
+# One entry per file name: (dataset version, snapshot).
+_snapshots = {}
+_stats = {"hits": 0, "misses": 0, "builds": 0}
+_lock = threading.Lock()
+
+
+class Snapshot:
+    """The results a new session shows for the default inputs of one tab."""
+
+    def __init__(self, view, charts, table_html):
+        self.view = view
+        self.charts = charts
+        self.table_html = table_html
+
+
+def get_snapshot(file_name, view=None, version=None):
+    """Return the snapshot for the current version of a dataset, or None.
+    @param view: if given, return the snapshot only when view is the one it
+    holds, i.e. when the session still shows the default state.
+    @param version: if given, the version the snapshot must be built from
+    (e.g. the one a session is showing) instead of the current one.
+    """
+    if version is None:
+        version = get_dataset_version(file_name)
+    with _lock:
+        entry = _snapshots.get(file_name)
+        if entry is None or entry[0] != version:
+            _stats["misses"] += 1
+            return None
+        snapshot = entry[1]
+        if view is not None and view is not snapshot.view:
+            return None
+        _stats["hits"] += 1
+        return snapshot
+
+
+def put_snapshot(file_name, version, snapshot):
+    """Store a snapshot built from the given dataset version.
+    It is dropped if the dataset has changed since, as it would be stale already."""
+    with _lock:
+        if version != get_dataset_version(file_name):
+            return  # the data changed while it was built
+        _snapshots[file_name] = (version, snapshot)
+        _stats["builds"] += 1
+    logger.info(f"Stored the default snapshot of {file_name}")
+
+
+def get_snapshot_stats():
+    """Return hit/miss counts and the datasets that have a snapshot."""
+    with _lock:
+        stats = dict(_stats)
+        stats["datasets"] = sorted(_snapshots)
+    return stats
+
+
+def clear_snapshots():
+    with _lock:
+        _snapshots.clear()
@@ -0,0 +1,88 @@
+"""
+Purpose: Measure how long the app takes to cold start.
+
+On autoscaled hosts the time to import app.py and have an App ready is the
+scale-up latency, so keep an eye on it:
+
+    python util_startup.py --profile          # per-module import cost, slowest first
+    python util_startup.py --check            # exit 1 if over STARTUP_BUDGET_SECONDS
+    python util_startup.py --check --budget 2
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+The check takes the best of a few runs so one slow run on a busy machine
+doesn't fail the build. The deploy workflow runs it before deploying.
+
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+STARTUP_BUDGET_SECONDS = float(os.environ.get("CINTEL_STARTUP_BUDGET_SECONDS", "1.5"))
+
+APP_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+_TIME_TO_APP = (
+    "import time; start = time.perf_counter(); import app; "
+    "assert app.app is not None; print(time.perf_counter() - start)"
+)
+
+
+def _run_python(args):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=APP_FOLDER,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def time_to_app():
+    """Seconds for a fresh interpreter to import app.py and build the App."""
+    result = _run_python(["-c", _TIME_TO_APP])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def profile_imports():
+    """Return [(cumulative seconds, self seconds, module)] for importing app.py."""
+    result = _run_python(["-X", "importtime", "-c", "import app"])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append(
+            (int(cumulative_us) / 1e6, int(self_us) / 1e6, module.rstrip())
+        )
+    return rows
+
+
+def print_profile(top=30):
+    rows = profile_imports()
+    print(f"{'cumulative':>10}  {'self':>8}  module")
+    # Indentation in the module name shows which import pulled it in.
+    for cumulative, own, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative:>9.3f}s  {own:>7.3f}s  {module}")
+
+
+def check_budget(budget, runs=3):
+    """Return True if the best of runs cold starts is within budget."""
+    best = min(time_to_app() for _ in range(runs))
+    status = "OK" if best <= budget else "OVER BUDGET"
+    print(f"Time to ready App: {best:.3f}s (budget {budget:.3f}s) {status}")
+    return best <= budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start profiling for app.py")
+    parser.add_argument("--profile", action="store_true", help="per-module import cost")
+    parser.add_argument("--top", type=int, default=30, help="modules to show")
+    parser.add_argument("--check", action="store_true", help="enforce the budget")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    if args.profile or not args.check:
+        print_profile(args.top)
+    if args.check and not check_budget(args.budget):
+        sys.exit(1)
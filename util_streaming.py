@@ -0,0 +1,277 @@
+"""
+Purpose: Live mode - pick up new production rows without restarting the app.
+
+Each dataset can have append-only drop files in the data folder:
+data/orders_stream.jsonl (one JSON object per line) and/or
+data/orders_stream.csv (a header line, then one row per line). Whatever writes
+the data only ever appends to them.
+
+poll_stream() remembers how far into each drop file it has read, parses only the
+complete lines added since then, and appends them to the shared in-memory
+dataset (util_datasets.append_rows). The workbook is never reread. Each
+dataset's DatasetFeed (util_refresh.py) calls it once every STREAM_POLL_SECONDS
+for the whole process and tells the sessions, so filters and charts update on
+their own:
+
+    register_stream("orders.xlsx", prepare=prepare_orders, sort_by="Date")
+    version = poll_stream("orders.xlsx")
+
+Each drop file is read at most once per interval. A line that cannot be
+parsed, or a row the prepare function rejects, is logged and skipped; the
+other rows in the batch are still appended. Lines count as read only once
+their rows have been appended.
+
+A socket stand-in for a real message feed writes into the same drop files. It
+only accepts the datasets it was started for, and only JSON objects:
+
+    python util_streaming.py --listen 9009 --datasets orders.xlsx quantity.xlsx
+    echo 'orders.xlsx {"Year": 2024, "Month": "Jan", ...}' | nc localhost 9009
+
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import socketserver
+import threading
+import time
+
+import pandas as pd
+
+from util_datasets import (
+    DATA_FOLDER,
+    append_rows,
+    get_dataset_version,
+    is_dataset_loaded,
+)
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__name__)
+
+STREAM_POLL_SECONDS = float(os.environ.get("CINTEL_STREAM_POLL_SECONDS", "2"))
+
+# dataset file name -> stream state (see register_stream)
+_streams = {}
+
+
+class AppendOnlyTail:
+    """Read only the complete lines appended to a file since the last commit()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def reset(self):
+        self.offset = 0
+        self.header = None
+
+    def read_new_rows(self):
+        """Return (rows, offset): a DataFrame of the well-formed rows appended since
+        the last commit() (None if there are none), and the offset to commit()
+        once they have been appended. Malformed lines are logged and skipped."""
+        if not self.path.exists():
+            return None, self.offset
+        if self.path.stat().st_size < self.offset:
+            # The file was replaced or truncated; start again from the top.
+            self.reset()
+
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read()
+        # Leave a partly written last line for the next call.
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return None, self.offset
+        lines = data[:end].decode("utf-8", errors="replace").splitlines()
+
+        if self.path.suffix == ".csv":
+            if self.offset == 0:
+                self.header, lines = lines[0], lines[1:]
+            return self._parse_csv(lines), self.offset + end
+        return self._parse_json(lines), self.offset + end
+
+    def commit(self, offset):
+        """Mark the lines before offset as done, so they are not read again."""
+        self.offset = offset
+
+    def _skip(self, line):
+        logger.warning(f"Skipped a malformed line in {self.path.name}: {line[:200]}")
+
+    def _parse_json(self, lines):
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                self._skip(line)
+                continue
+            records.append(record)
+        return pd.DataFrame.from_records(records) if records else None
+
+    def _parse_csv(self, lines):
+        width = len(next(csv.reader([self.header])))
+        good = []
+        for line in lines:
+            if not line.strip():
+                continue
+            if len(next(csv.reader([line]))) != width:
+                self._skip(line)
+                continue
+            good.append(line)
+        if not good:
+            return None
+        return pd.read_csv(io.StringIO("\n".join([self.header] + good)))
+
+
+def register_stream(file_name, prepare=None, sort_by=None, columns=None):
+    """Enable live mode for a dataset.
+    The drop files are data/<stem>_stream.jsonl and data/<stem>_stream.csv;
+    both are checked on every poll, so either may be created at any time.
+    @param prepare: the same prepare function the dataset is loaded with;
+    it is applied to each batch of new rows.
+    @param sort_by: column the dataset is kept sorted by, if any.
+    @param columns: columns every row must have a value for; rows missing one
+    are logged and skipped.
+    """
+    stem = file_name.rsplit(".", 1)[0]
+    _streams[file_name] = {
+        "tails": [
+            AppendOnlyTail(DATA_FOLDER.joinpath(f"{stem}_stream.jsonl")),
+            AppendOnlyTail(DATA_FOLDER.joinpath(f"{stem}_stream.csv")),
+        ],
+        "prepare": prepare,
+        "sort_by": sort_by,
+        "columns": columns or [],
+        "signature": None,
+        "checked": 0.0,
+        "lock": threading.Lock(),
+    }
+
+
+def _drop_incomplete(file_name, rows, columns):
+    """Return the rows that have a value for every one of columns, logging the rest."""
+    rows = rows.reindex(columns=rows.columns.union(columns, sort=False))
+    complete = rows[columns].notna().all(axis=1)
+    for record in rows[~complete].to_dict("records"):
+        logger.warning(f"Skipped a row for {file_name} with a missing value: {record}")
+    return rows[complete].reset_index(drop=True) if complete.any() else None
+
+
+def _prepare_rows(file_name, rows, prepare):
+    """Apply prepare to a batch of rows. If that fails, prepare each row on its
+    own and drop (and log) only the rows that fail."""
+    try:
+        return prepare(rows)
+    except Exception:
+        pass
+    prepared = []
+    for position in range(len(rows)):
+        row = rows.iloc[[position]].reset_index(drop=True)
+        try:
+            prepared.append(prepare(row))
+        except Exception as error:
+            logger.warning(
+                f"Skipped a row for {file_name} that could not be prepared "
+                f"({error!r}): {row.to_dict('records')[0]}"
+            )
+    return pd.concat(prepared, ignore_index=True) if prepared else None
+
+
+def poll_stream(file_name):
+    """Append any new rows for a dataset and return its current version.
+    Called by the dataset's DatasetFeed (util_refresh), once per interval for
+    the whole process.
+    """
+    stream = _streams.get(file_name)
+    if stream is None:
+        return get_dataset_version(file_name)
+
+    # Lets the first caller in each interval do the work; the rest just read the version.
+    if not stream["lock"].acquire(blocking=False):
+        return get_dataset_version(file_name)
+    try:
+        now = time.monotonic()
+        if now - stream["checked"] < STREAM_POLL_SECONDS / 2:
+            return get_dataset_version(file_name)
+        stream["checked"] = now
+
+        if not is_dataset_loaded(file_name):
+            # Nobody has asked for this dataset yet; don't load it here.
+            return get_dataset_version(file_name)
+        signature = get_dataset_version(file_name)[0]
+        if stream["signature"] != signature:
+            # The workbook itself was reloaded, so replay the drop files onto it.
+            for tail in stream["tails"]:
+                tail.reset()
+            stream["signature"] = signature
+
+        for tail in stream["tails"]:
+            rows, offset = tail.read_new_rows()
+            if rows is not None:
+                rows = _drop_incomplete(file_name, rows, stream["columns"])
+            if rows is not None and stream["prepare"] is not None:
+                rows = _prepare_rows(file_name, rows, stream["prepare"])
+            if rows is not None and len(rows):
+                append_rows(file_name, rows, sort_by=stream["sort_by"])
+            # Only now are the lines done; if anything above failed they are read again.
+            tail.commit(offset)
+    except Exception:
+        logger.exception(f"Could not read new rows for {file_name}")
+    finally:
+        stream["lock"].release()
+    return get_dataset_version(file_name)
+
+
+class _StreamLineHandler(socketserver.StreamRequestHandler):
+    """Each line is '<dataset file name> <json object>'; append it to the drop file
+    of that registered stream. Anything else is logged and skipped."""
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            file_name, _, record = line.partition(" ")
+            stream = _streams.get(file_name)
+            if stream is None:
+                logger.warning(f"Skipped a row for an unknown stream: {file_name[:100]}")
+                continue
+            try:
+                row = json.loads(record)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                logger.warning(f"Skipped a malformed row for {file_name}: {record[:200]}")
+                continue
+            # One line per row, whatever whitespace the sender used.
+            jsonl_path = stream["tails"][0].path
+            with open(jsonl_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(row) + "\n")
+
+
+def serve_stream_socket(port, host="127.0.0.1"):
+    """Accept rows over a local TCP socket (a stand-in for a real message feed)."""
+    server = socketserver.ThreadingTCPServer((host, port), _StreamLineHandler)
+    logger.info(f"Listening for streamed rows on {host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for a live data feed.")
+    parser.add_argument("--listen", type=int, required=True, help="TCP port")
+    parser.add_argument(
+        "--datasets",
+        nargs="+",
+        default=["orders.xlsx", "quantity.xlsx"],
+        help="datasets to accept rows for",
+    )
+    args = parser.parse_args()
+    for file_name in args.datasets:
+        register_stream(file_name)
+    serve_stream_socket(args.listen)
@@ -0,0 +1,168 @@
+"""
+Purpose: Show large filtered tables one page at a time.
+
+@render.table turns the whole DataFrame into one HTML string and sends it over
+the websocket on every filter change. With these helpers the server sorts
+(if asked) and renders only the visible page, so the payload size stays the
+same no matter how many rows match.
+
+UI (in the *_ui_outputs.py modules):
+    get_table_controls("ORDERS", columns) - page, page size and sort inputs
+    get_scrollable_table("orders_filtered_table", "ORDERS") - the table itself;
+        scrolling past the bottom (or top) of it fetches the next (or previous) page
+
+Server (in the *_server.py modules):
+    register_table_pager(input, "ORDERS", reactive_view)
+    page_df, page, page_count = get_page(view, page, page_size, sort_by, descending)
+    @render.ui returning ui.HTML(render_page_html(page_df)) - the same markup as
+        @render.table, but the HTML can also come ready-made (see util_snapshots)
+
+Input IDs are the prefix plus _TABLE_PAGE, _TABLE_PAGE_SIZE, _TABLE_SORT,
+_TABLE_DESC and _TABLE_SCROLL.
+
+"""
+import math
+
+import pandas as pd
+from shiny import reactive, ui
+
+from util_filters import FilteredView
+from util_metrics import timed
+
+PAGE_SIZE_CHOICES = ["25", "50", "100", "250"]
+DEFAULT_PAGE_SIZE = "50"
+# What read_table_inputs() returns before the user touches the table.
+DEFAULT_TABLE_INPUTS = (1, int(DEFAULT_PAGE_SIZE), None, False)
+
+# Sends <PREFIX>_TABLE_SCROLL when the user scrolls past either end of the table,
+# then keeps the new page from immediately triggering another fetch.
+_SCROLL_SCRIPT = """
+(function() {
+  var box = document.getElementById("%(box_id)s");
+  var last = null;
+  box.addEventListener("scroll", function() {
+    var atEnd = box.scrollTop + box.clientHeight >= box.scrollHeight - 2;
+    var atStart = box.scrollTop <= 0;
+    if (atEnd || atStart) {
+      last = atEnd ? "next" : "previous";
+      Shiny.setInputValue("%(input_id)s", {direction: last, nonce: Date.now()});
+    }
+  });
+  $(document).on("shiny:value", function(event) {
+    if (event.name !== "%(output_id)s" || last === null) return;
+    setTimeout(function() {
+      box.scrollTop = last === "next" ? 1 : box.scrollHeight - box.clientHeight - 3;
+      last = null;
+    }, 0);
+  });
+})();
+"""
+
+
+def get_table_controls(prefix, columns):
+    """Return the page/sort inputs for a paginated table."""
+    sort_choices = {"": "Original order"}
+    sort_choices.update({column: column for column in columns})
+    return ui.row(
+        ui.column(
+            3, ui.input_numeric(f"{prefix}_TABLE_PAGE", "Page", value=1, min=1)
+        ),
+        ui.column(
+            3,
+            ui.input_select(
+                f"{prefix}_TABLE_PAGE_SIZE",
+                "Rows per page",
+                choices=PAGE_SIZE_CHOICES,
+                selected=DEFAULT_PAGE_SIZE,
+            ),
+        ),
+        ui.column(
+            4, ui.input_select(f"{prefix}_TABLE_SORT", "Sort by", choices=sort_choices)
+        ),
+        ui.column(2, ui.input_checkbox(f"{prefix}_TABLE_DESC", "Descending")),
+    )
+
+
+def get_scrollable_table(output_id, prefix, height="420px"):
+    """Return a fixed-height table output that fetches pages as it is scrolled."""
+    box_id = f"{output_id}_scroll_box"
+    script = _SCROLL_SCRIPT % {
+        "box_id": box_id,
+        "input_id": f"{prefix}_TABLE_SCROLL",
+        "output_id": output_id,
+    }
+    return ui.div(
+        ui.div(
+            ui.output_table(output_id),
+            id=box_id,
+            style=f"max-height: {height}; overflow-y: auto;",
+        ),
+        ui.tags.script(script),
+    )
+
+
+def get_page_count(row_count, page_size):
+    return max(1, math.ceil(row_count / page_size))
+
+
+def get_page(view, page, page_size, sort_by=None, descending=False):
+    """Return (page_df, page, page_count) for one page of a FilteredView (or DataFrame).
+    Only the sort column is sorted; only the rows on the page are copied.
+    """
+    if not isinstance(view, FilteredView):
+        view = FilteredView(view)
+    page_count = get_page_count(len(view), page_size)
+    page = min(max(int(page or 1), 1), page_count)
+    start = (page - 1) * page_size
+    stop = min(start + page_size, len(view))
+
+    if sort_by:
+        order = (
+            pd.Series(view.column(sort_by))
+            .sort_values(ascending=not descending, kind="stable")
+            .index.to_numpy()
+        )
+        positions = order[start:stop]
+    else:
+        positions = slice(start, stop)
+    return view.take(positions), page, page_count
+
+
+def render_page_html(page_df):
+    """Return a page as the HTML @render.table would send for it."""
+    return page_df.to_html(index=False, classes="table shiny-table w-auto", border=0)
+
+
+def read_table_inputs(input, prefix):
+    """Return (page, page_size, sort_by, descending) from a table's inputs."""
+    page = input[f"{prefix}_TABLE_PAGE"]()
+    page_size = int(input[f"{prefix}_TABLE_PAGE_SIZE"]() or DEFAULT_PAGE_SIZE)
+    sort_by = input[f"{prefix}_TABLE_SORT"]() or None
+    descending = bool(input[f"{prefix}_TABLE_DESC"]())
+    return page, page_size, sort_by, descending
+
+
+def register_table_pager(input, prefix, reactive_view):
+    """Keep a table's page input in step with new data and with scrolling.
+    Call once per session from the server function that owns the table.
+    """
+    page_id = f"{prefix}_TABLE_PAGE"
+
+    @reactive.Effect
+    @reactive.event(reactive_view)
+    @timed(f"{prefix.lower()}_table_page_reset")
+    def _():
+        """Go back to the first page whenever the filtered rows change."""
+        ui.update_numeric(page_id, value=1)
+
+    @reactive.Effect
+    @reactive.event(input[f"{prefix}_TABLE_SCROLL"])
+    @timed(f"{prefix.lower()}_table_scroll")
+    def _():
+        """Move one page forward or back when the table is scrolled past an end."""
+        page, page_size, _, _ = read_table_inputs(input, prefix)
+        page_count = get_page_count(len(reactive_view.get()), page_size)
+        step = 1 if input[f"{prefix}_TABLE_SCROLL"]()["direction"] == "next" else -1
+        new_page = min(max(int(page or 1) + step, 1), page_count)
+        if new_page != page:
+            ui.update_numeric(page_id, value=new_page)
@@ -0,0 +1,258 @@
+"""
+Purpose: Serve the app from several worker processes that share one copy of the data.
+
+One process runs every session on one event loop, so it uses one core. Starting
+uvicorn with --workers uses more cores, but every worker loads its own copy of
+each dataset, so memory grows with the number of workers. This module:
+
+1. loads and prepares each dataset once, in this (parent) process;
+2. publishes the column buffers through shared memory (util_shared.publish);
+3. starts WORKERS uvicorn processes on localhost ports. Each maps the shared
+   frames instead of loading its own (util_datasets / util_shared.attach);
+4. listens on the public port and forwards each connection to a worker.
+
+Shiny keeps a session's state in the worker that served its page, so the page,
+its websocket and its downloads must all reach the same worker. The proxy pins
+each client to a worker by hashing the client address (the first
+X-Forwarded-For entry when behind a load balancer), so every connection from
+one browser goes to the same worker. A worker that exits is restarted on the
+same port, and its clients come back to it.
+
+    python util_workers.py                        # one worker per CPU on port 8000
+    python util_workers.py --workers 4 --port 8080 --host 0.0.0.0
+
+Settings (environment variables):
+    CINTEL_WORKERS=4    worker processes (default: CPU count)
+
+Data files that change while serving are loaded by each worker on its own (the
+shared copy only matches the file it was published from); restart to share
+them again.
+
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from util_datasets import get_dataset, get_dataset_version
+from util_logger import setup_logger
+from util_shared import SHARED_DATA_ENV, publish, unlink_all, write_manifest
+
+logger, logname = setup_logger(__name__)
+
+WORKERS = int(os.environ.get("CINTEL_WORKERS", os.cpu_count() or 1))
+
+APP_FOLDER = os.path.dirname(os.path.abspath(__file__))
+RESTART_DELAY_SECONDS = 1.0
+START_TIMEOUT_SECONDS = 60.0
+HEAD_LIMIT_BYTES = 64 * 1024
+BUFFER_BYTES = 64 * 1024
+
+
+def get_shared_datasets():
+    """Return (file name, prepare function, columns) for each dataset to share,
+    matching what the servers pass to get_dataset()."""
+    from orders_server import ORDERS_COLUMNS, prepare_orders
+    from quantity_server import QUANTITY_COLUMNS, prepare_quantity
+
+    return [
+        ("orders.xlsx", prepare_orders, ORDERS_COLUMNS),
+        ("quantity.xlsx", prepare_quantity, QUANTITY_COLUMNS),
+    ]
+
+
+def publish_datasets(manifest_path):
+    """Load every shared dataset and publish it; write the manifest for the workers."""
+    entries = {}
+    for file_name, prepare, columns in get_shared_datasets():
+        df = get_dataset(file_name, prepare, columns)
+        signature, _ = get_dataset_version(file_name)
+        entries[file_name] = publish(file_name, df, signature)
+    write_manifest(entries, manifest_path)
+    return entries
+
+
+def get_client_key(head, peername):
+    """Return what a connection is pinned by: the first X-Forwarded-For address,
+    or else the address of the connecting client."""
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"x-forwarded-for" and value.strip():
+            return value.split(b",")[0].strip()
+    return (peername[0] if peername else "").encode()
+
+
+def pick_worker(key, count):
+    """Map a client key to a worker index, the same way in every run."""
+    return zlib.crc32(key) % count
+
+
+class Worker:
+    """One uvicorn process serving app.py on a localhost port."""
+
+    def __init__(self, index, port, env):
+        self.index = index
+        self.port = port
+        self.env = env
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=APP_FOLDER,
+            env=self.env,
+        )
+        logger.info(f"Started worker {self.index} on port {self.port} (pid {self.process.pid})")
+
+    async def wait_until_ready(self):
+        """Wait until the worker accepts connections."""
+        deadline = time.monotonic() + START_TIMEOUT_SECONDS
+        while time.monotonic() < deadline and self.process.poll() is None:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            except OSError:
+                await asyncio.sleep(0.2)
+                continue
+            await _close(writer)
+            return
+        raise RuntimeError(f"worker {self.index} did not start on port {self.port}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+async def _pipe(reader, writer):
+    """Copy one direction of a connection until it ends."""
+    try:
+        while True:
+            data = await reader.read(BUFFER_BYTES)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+
+
+def make_proxy_handler(workers):
+    """Return the connection handler that forwards each client to its worker."""
+
+    async def handle(client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            await _close(client_writer)
+            return
+        key = get_client_key(head, client_writer.get_extra_info("peername"))
+        worker = workers[pick_worker(key, len(workers))]
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                "127.0.0.1", worker.port
+            )
+        except OSError:
+            # The worker is restarting; the browser will reconnect.
+            client_writer.write(
+                b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+            await _close(client_writer)
+            return
+        upstream_writer.write(head)
+        await asyncio.gather(
+            _pipe(client_reader, upstream_writer),
+            _pipe(upstream_reader, client_writer),
+        )
+        await _close(upstream_writer)
+        await _close(client_writer)
+
+    return handle
+
+
+async def _watch(workers, stopping):
+    """Restart any worker that exits."""
+    while not stopping.is_set():
+        for worker in workers:
+            if worker.process.poll() is not None:
+                logger.warning(
+                    f"Worker {worker.index} exited with {worker.process.returncode}; restarting"
+                )
+                worker.start()
+        try:
+            await asyncio.wait_for(stopping.wait(), RESTART_DELAY_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def serve(workers, host, port):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    # Listen only once every worker answers, so no client is turned away at startup.
+    await asyncio.gather(*(worker.wait_until_ready() for worker in workers))
+    server = await asyncio.start_server(
+        make_proxy_handler(workers), host, port, limit=HEAD_LIMIT_BYTES
+    )
+    logger.info(f"Serving on http://{host}:{port} with {len(workers)} workers")
+    async with server:
+        watcher = asyncio.create_task(_watch(workers, stopping))
+        await stopping.wait()
+        await watcher
+
+
+def run(worker_count=WORKERS, host="127.0.0.1", port=8000):
+    """Publish the datasets, start the workers and proxy until interrupted."""
+    manifest_folder = tempfile.mkdtemp(prefix="cintel-shared-")
+    manifest_path = os.path.join(manifest_folder, "manifest.json")
+    workers = []
+    try:
+        publish_datasets(manifest_path)
+        env = {**os.environ, SHARED_DATA_ENV: manifest_path}
+        workers = [Worker(i, port + 1 + i, env) for i in range(worker_count)]
+        for worker in workers:
+            worker.start()
+        asyncio.run(serve(workers, host, port))
+    finally:
+        for worker in workers:
+            worker.stop()
+        unlink_all()
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        os.rmdir(manifest_folder)
+        logger.info("Stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the app from several workers.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="public port; workers use the next --workers ports")
+    args = parser.parse_args(argv)
+    run(args.workers, args.host, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())